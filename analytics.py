@@ -0,0 +1,263 @@
+"""Аналитика по дневным суммам на NumPy
+
+История из tasks один раз загружается в матрицу секунд (тип задачи x день),
+дальше все показатели считаются векторно по матрице и ее накопленным
+суммам: скользящие средние за 7 и 28 дней, средние по дням недели, серии
+дней с работой и прогноз на конец недели относительно лимитов из
+config.json. Новые пульсы добавляются в матрицу на месте, а накопленные
+суммы пересчитываются только начиная с измененного дня.
+
+Архивные месяцы (см. retention.py) в матрицу не попадают: разбивки по дням
+внутри них нет, и месяц выглядел бы одним днем с суммой за месяц. История
+начинается с первого дня после архива.
+
+Модуль требует numpy и не зависит от Qt.
+"""
+from datetime import date, timedelta
+
+import numpy as np
+
+from cache import InMemoryHistory
+from storage import current_day
+
+WEEKDAYS = ('Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс')
+
+
+class DailySeries(InMemoryHistory):
+    """Секунды по типам задач и дням в виде матрицы NumPy"""
+
+    def __init__(self, repository, heartbeat_writer=None, event_names=()):
+        """
+        Args:
+            event_names: типы задач, которые показываются даже без данных
+                (типы из config.json); остальное - как у InMemoryHistory
+        """
+        super().__init__(repository, heartbeat_writer)
+        self.known_names = list(event_names)
+
+        # Дата первого столбца матрицы
+        self.origin = None
+        self.event_names = []
+        self._rows = {}
+        # (типы задач, дни) секунд за день и их накопленные суммы по дням
+        self.values = np.zeros((0, 0), dtype=np.int64)
+        self._cumulative = None
+        # Первый столбец, с которого накопленные суммы устарели
+        self._dirty_from = 0
+        # Последний день матрицы при загрузке
+        self._today = None
+
+    def _read(self, unwritten):
+        """История по сегодняшний день, начиная с первого дня после архива"""
+        self._today = today = current_day()
+        first_day, _ = self.repository.get_date_bounds()
+        self.origin = min([today, *(day for _, day, _ in unwritten)])
+        if first_day is not None:
+            self.origin = min(date.fromisoformat(first_day), self.origin)
+        archived = self.repository.get_archived_months()
+        if archived:
+            last_month = date.fromisoformat(max(archived))
+            month = last_month.year * 12 + last_month.month
+            self.origin = min(max(self.origin, date(month // 12, month % 12 + 1, 1)), today)
+        return self.repository.get_days_rows(self.origin, today)
+
+    def _build(self, rows, unwritten):
+        today = self._today
+        rows = [tuple(row) for row in rows]
+        rows.extend((event_name, day.isoformat(), seconds)
+                    for event_name, day, seconds in unwritten if self.origin <= day <= today)
+        names, day_texts, seconds = zip(*rows) if rows else ((), (), ())
+
+        self.event_names = list(dict.fromkeys([*self.known_names, *sorted(set(names))]))
+        self._rows = {name: index for index, name in enumerate(self.event_names)}
+
+        self.values = np.zeros((len(self.event_names), (today - self.origin).days + 1), dtype=np.int64)
+        if rows:
+            row_index = np.fromiter((self._rows[name] for name in names), dtype=np.intp, count=len(names))
+            day_index = (np.array(day_texts, dtype='datetime64[D]') - np.datetime64(self.origin, 'D')).astype(np.intp)
+            np.add.at(self.values, (row_index, day_index),
+                      np.fromiter((value or 0 for value in seconds), dtype=np.int64, count=len(seconds)))
+
+        self._cumulative = None
+        self._dirty_from = 0
+
+    def add(self, event_name, seconds, day):
+        """Добавляет прирост секунд за день без перезагрузки истории"""
+        if not self._loaded or not seconds:
+            return
+        if day < self.origin:
+            self.invalidate()
+            return
+
+        row = self._rows.get(event_name)
+        if row is None:
+            row = self._rows[event_name] = len(self.event_names)
+            self.event_names.append(event_name)
+            self.values = np.vstack([self.values, np.zeros((1, self.values.shape[1]), dtype=np.int64)])
+            self._cumulative = None
+
+        column = (day - self.origin).days
+        self._extend_to(column)
+        self.values[row, column] += seconds
+        self._dirty_from = min(self._dirty_from, column)
+
+    @property
+    def last_day(self):
+        return self.origin + timedelta(days=self.values.shape[1] - 1)
+
+    def _extend_to(self, column):
+        """Добавляет нулевые столбцы по column включительно"""
+        missing = column + 1 - self.values.shape[1]
+        if missing > 0:
+            self.values = np.hstack([self.values, np.zeros((self.values.shape[0], missing), dtype=np.int64)])
+
+    def _ensure_fresh(self):
+        """Загружает историю и продлевает матрицу до сегодняшнего дня"""
+        if not self._loaded:
+            self.load()
+        else:
+            self._extend_to((current_day() - self.origin).days)
+
+    def cumulative(self):
+        """
+        Накопленные суммы по дням с нулевым столбцом в начале: сумма за
+        столбцы [i, j) равна cumulative[:, j] - cumulative[:, i]
+        """
+        self._ensure_fresh()
+        rows, columns = self.values.shape
+        if self._cumulative is None or self._cumulative.shape[0] != rows:
+            self._dirty_from = 0
+            self._cumulative = np.zeros((rows, columns + 1), dtype=np.int64)
+        elif self._cumulative.shape[1] < columns + 1:
+            self._dirty_from = min(self._dirty_from, self._cumulative.shape[1] - 1)
+            self._cumulative = np.hstack([
+                self._cumulative,
+                np.zeros((rows, columns + 1 - self._cumulative.shape[1]), dtype=np.int64),
+            ])
+
+        start = self._dirty_from
+        if start < columns:
+            self._cumulative[:, start + 1:] = (
+                self._cumulative[:, start:start + 1] + np.cumsum(self.values[:, start:], axis=1)
+            )
+        self._dirty_from = columns
+        return self._cumulative
+
+    def rolling_mean(self, window):
+        """
+        Скользящее среднее секунд в день за window дней по каждый день
+
+        В первые дни истории среднее берется по имеющимся дням.
+
+        Returns:
+            матрица (типы задач, дни)
+        """
+        cumulative = self.cumulative()
+        columns = self.values.shape[1]
+        ends = np.arange(1, columns + 1)
+        starts = np.maximum(ends - window, 0)
+        return (cumulative[:, ends] - cumulative[:, starts]) / (ends - starts)
+
+    def days(self):
+        """Даты столбцов матрицы"""
+        self._ensure_fresh()
+        return np.datetime64(self.origin, 'D') + np.arange(self.values.shape[1])
+
+    def weekday_heatmap(self, weeks=None):
+        """
+        Среднее число секунд по дням недели
+
+        Args:
+            weeks: учитывать только последние weeks недель (по умолчанию всю историю)
+
+        Returns:
+            матрица (типы задач, 7) с Пн в столбце 0
+        """
+        self._ensure_fresh()
+        values = self.values
+        weekdays = (self.origin.weekday() + np.arange(values.shape[1])) % 7
+        if weeks is not None:
+            values = values[:, -weeks * 7:]
+            weekdays = weekdays[-weeks * 7:]
+
+        totals = np.zeros((values.shape[0], 7), dtype=np.float64)
+        np.add.at(totals.T, weekdays, values.T)
+        counts = np.bincount(weekdays, minlength=7)
+        return totals / np.maximum(counts, 1)
+
+    def streaks(self):
+        """
+        Серии дней подряд с работой по типу задачи
+
+        Текущая серия заканчивается сегодня или вчера (если сегодня еще не работали).
+
+        Returns:
+            (текущие серии, самые длинные серии) - массивы по типам задач
+        """
+        self._ensure_fresh()
+        rows, columns = self.values.shape
+        active = np.zeros((rows, columns + 2), dtype=np.int8)
+        active[:, 1:-1] = self.values > 0
+        edges = np.diff(active, axis=1)
+        starts = np.argwhere(edges == 1)
+        ends = np.argwhere(edges == -1)
+        lengths = ends[:, 1] - starts[:, 1]
+
+        longest = np.zeros(rows, dtype=np.int64)
+        np.maximum.at(longest, starts[:, 0], lengths)
+        current = np.zeros(rows, dtype=np.int64)
+        recent = ends[:, 1] >= columns - 1
+        current[starts[recent, 0]] = lengths[recent]
+        return current, longest
+
+    def week_forecast(self, limits, rate_window=28):
+        """
+        Прогноз суммы на конец текущей недели (пн-вс)
+
+        К уже сделанному за неделю добавляется средний темп за rate_window
+        полных дней до сегодняшнего: за оставшиеся дни недели и остаток
+        сегодняшнего дня, если сегодня сделано меньше обычного.
+
+        Args:
+            limits: недельные лимиты в часах {тип задачи: часы}
+
+        Returns:
+            список словарей по типам задач
+        """
+        cumulative = self.cumulative()
+        today = current_day()
+        today_column = (today - self.origin).days
+        week_start_column = max(today_column - today.weekday(), 0)
+
+        done = cumulative[:, today_column + 1] - cumulative[:, week_start_column]
+        today_seconds = self.values[:, today_column]
+        rate_start = max(today_column - rate_window, 0)
+        rate_days = max(today_column - rate_start, 1)
+        rate = (cumulative[:, today_column] - cumulative[:, rate_start]) / rate_days
+
+        remaining_days = 6 - today.weekday()
+        forecast = done + rate * remaining_days + np.maximum(rate - today_seconds, 0)
+
+        # Скользящие средние нужны только за сегодня - без расчета всей матрицы
+        mean_7, mean_28 = (
+            (cumulative[:, today_column + 1] - cumulative[:, max(today_column + 1 - window, 0)])
+            / min(window, today_column + 1)
+            for window in (7, 28)
+        )
+        current, longest = self.streaks()
+
+        result = []
+        for row, name in enumerate(self.event_names):
+            limit_seconds = limits.get(name, 0) * 3600
+            result.append({
+                'event_name': name,
+                'week_seconds': int(done[row]),
+                'mean_7': float(mean_7[row]),
+                'mean_28': float(mean_28[row]),
+                'forecast_seconds': float(forecast[row]),
+                'limit_seconds': limit_seconds,
+                'forecast_percent': float(forecast[row] / limit_seconds * 100) if limit_seconds else None,
+                'streak': int(current[row]),
+                'longest_streak': int(longest[row]),
+            })
+        return result
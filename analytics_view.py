@@ -0,0 +1,187 @@
+"""Окно аналитики: прогноз недели, дни недели и тренды
+
+Показатели считает analytics.DailySeries; окно только раскладывает их по
+таблицам и графику. Модуль импортируется лениво при открытии окна, потому
+что требует numpy и QtCharts.
+"""
+from datetime import datetime, time as day_time, timezone
+
+from PyQt6 import QtCore, QtGui, QtWidgets
+from PyQt6.QtCharts import QChart, QChartView, QDateTimeAxis, QLineSeries, QValueAxis
+
+from analytics import WEEKDAYS
+
+
+def _hours(seconds):
+    return f"{seconds / 3600:.1f}"
+
+
+class AnalyticsWindow(QtWidgets.QWidget):
+    """Отдельное окно с аналитикой по истории"""
+
+    # Сколько последних недель учитывается в средних по дням недели
+    HEATMAP_WEEKS = 12
+    # Сколько последних дней показывает график тренда
+    TREND_DAYS = 180
+
+    FORECAST_COLUMNS = (
+        "Тип задачи", "За неделю, ч.", "Среднее 7 дн., ч./день", "Среднее 28 дн., ч./день",
+        "Прогноз, ч.", "Лимит, ч.", "Прогноз к лимиту", "Серия, дн.", "Рекорд серии, дн.",
+    )
+
+    def __init__(self, series, limits, parent=None):
+        """
+        Args:
+            series: analytics.DailySeries
+            limits: недельные лимиты в часах из config.json
+        """
+        super().__init__(parent, QtCore.Qt.WindowType.Window)
+        self.series = series
+        self.limits = limits
+        self.setWindowTitle("Аналитика")
+        self.resize(1000, 500)
+
+        layout = QtWidgets.QVBoxLayout(self)
+        self.tabs = QtWidgets.QTabWidget(self)
+        layout.addWidget(self.tabs)
+
+        self.forecast_table = QtWidgets.QTableWidget(self)
+        self.forecast_table.setColumnCount(len(self.FORECAST_COLUMNS))
+        self.forecast_table.setHorizontalHeaderLabels(self.FORECAST_COLUMNS)
+        self.forecast_table.setEditTriggers(QtWidgets.QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.forecast_table.verticalHeader().setVisible(False)
+        self.tabs.addTab(self.forecast_table, "Прогноз недели")
+
+        self.heatmap_table = QtWidgets.QTableWidget(self)
+        self.heatmap_table.setColumnCount(len(WEEKDAYS))
+        self.heatmap_table.setHorizontalHeaderLabels(WEEKDAYS)
+        self.heatmap_table.setEditTriggers(QtWidgets.QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.heatmap_table.setToolTip(f"Среднее число часов за день недели, последние {self.HEATMAP_WEEKS} недель")
+        self.tabs.addTab(self.heatmap_table, "Дни недели")
+
+        trend = QtWidgets.QWidget(self)
+        trend_layout = QtWidgets.QVBoxLayout(trend)
+        self.trend_combo = QtWidgets.QComboBox(trend)
+        trend_layout.addWidget(self.trend_combo)
+        self.trend_chart = QChart()
+        self.trend_chart.legend().setAlignment(QtCore.Qt.AlignmentFlag.AlignBottom)
+        self.trend_view = QChartView(self.trend_chart)
+        self.trend_view.setRenderHint(QtGui.QPainter.RenderHint.Antialiasing)
+        trend_layout.addWidget(self.trend_view)
+        self.tabs.addTab(trend, "Тренд")
+
+        self.trend_combo.currentIndexChanged.connect(self.update_trend)
+        self.tabs.currentChanged.connect(self.refresh)
+
+    def refresh(self):
+        """Пересчитывает показатели открытой вкладки"""
+        if not self.isVisible():
+            return
+        self.series.check_external_changes()
+        current = self.tabs.currentIndex()
+        if current == 0:
+            self.update_forecast()
+        elif current == 1:
+            self.update_heatmap()
+        else:
+            self.update_trend()
+
+    def update_forecast(self):
+        rows = self.series.week_forecast(self.limits)
+        self.forecast_table.setRowCount(len(rows))
+        for index, row in enumerate(rows):
+            percent = row['forecast_percent']
+            values = (
+                row['event_name'],
+                _hours(row['week_seconds']),
+                _hours(row['mean_7']),
+                _hours(row['mean_28']),
+                _hours(row['forecast_seconds']),
+                _hours(row['limit_seconds']) if row['limit_seconds'] else "-",
+                f"{percent:.0f}%" if percent is not None else "-",
+                str(row['streak']),
+                str(row['longest_streak']),
+            )
+            for column, value in enumerate(values):
+                item = self.forecast_table.item(index, column)
+                if item is None:
+                    item = QtWidgets.QTableWidgetItem()
+                    self.forecast_table.setItem(index, column, item)
+                item.setText(value)
+            if percent is not None and percent < 100:
+                # Прогноз не дотягивает до недельного лимита
+                self.forecast_table.item(index, 6).setForeground(QtGui.QColor(200, 60, 60))
+            else:
+                self.forecast_table.item(index, 6).setForeground(self.palette().text())
+        self.forecast_table.resizeColumnsToContents()
+
+    def update_heatmap(self):
+        heatmap = self.series.weekday_heatmap(self.HEATMAP_WEEKS)
+        names = self.series.event_names
+        self.heatmap_table.setRowCount(len(names))
+        self.heatmap_table.setVerticalHeaderLabels(names)
+
+        peak = heatmap.max() if heatmap.size else 0
+        for row in range(len(names)):
+            for column in range(len(WEEKDAYS)):
+                value = heatmap[row, column]
+                item = self.heatmap_table.item(row, column)
+                if item is None:
+                    item = QtWidgets.QTableWidgetItem()
+                    item.setTextAlignment(QtCore.Qt.AlignmentFlag.AlignCenter)
+                    self.heatmap_table.setItem(row, column, item)
+                item.setText(_hours(value))
+                # Чем больше часов, тем насыщеннее ячейка
+                intensity = value / peak if peak else 0
+                item.setBackground(QtGui.QColor.fromHsvF(0.33, 0.1 + 0.6 * intensity, 0.95))
+        self.heatmap_table.resizeColumnsToContents()
+
+    def update_trend(self):
+        names = self.series.event_names
+        if [self.trend_combo.itemText(i) for i in range(self.trend_combo.count())] != names:
+            selected = self.trend_combo.currentText()
+            self.trend_combo.blockSignals(True)
+            self.trend_combo.clear()
+            self.trend_combo.addItems(names)
+            if selected in names:
+                self.trend_combo.setCurrentText(selected)
+            self.trend_combo.blockSignals(False)
+
+        row = self.trend_combo.currentIndex()
+        if row < 0:
+            return
+
+        days = self.series.days()[-self.TREND_DAYS:]
+        timestamps = [
+            datetime.combine(day.item(), day_time(), timezone.utc).timestamp() * 1000 for day in days
+        ]
+
+        self.trend_chart.removeAllSeries()
+        for axis in self.trend_chart.axes():
+            self.trend_chart.removeAxis(axis)
+
+        x_axis = QDateTimeAxis()
+        x_axis.setFormat("dd.MM")
+        y_axis = QValueAxis()
+        y_axis.setTitleText("ч./день")
+        self.trend_chart.addAxis(x_axis, QtCore.Qt.AlignmentFlag.AlignBottom)
+        self.trend_chart.addAxis(y_axis, QtCore.Qt.AlignmentFlag.AlignLeft)
+
+        peak = 0
+        for window in (7, 28):
+            values = self.series.rolling_mean(window)[row, -self.TREND_DAYS:] / 3600
+            line = QLineSeries()
+            line.setName(f"Среднее за {window} дн.")
+            for timestamp, value in zip(timestamps, values.tolist()):
+                line.append(timestamp, value)
+            self.trend_chart.addSeries(line)
+            line.attachAxis(x_axis)
+            line.attachAxis(y_axis)
+            peak = max(peak, float(values.max()) if values.size else 0)
+
+        y_axis.setRange(0, max(peak * 1.1, 1))
+        self.trend_chart.setTitle(names[row])
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.refresh()
@@ -0,0 +1,205 @@
+"""Локальный JSON API для дашбордов
+
+Встроенный HTTP-сервер на asyncio работает в отдельном потоке и слушает
+только localhost. Он отдает готовый снимок состояния, который окно
+публикует после каждой записи (publish), поэтому клиенты не обращаются к
+БД и не конкурируют с записью пульсов, сколько бы их ни было.
+
+    GET /state                       - снимок состояния (JSON)
+    GET /state  If-None-Match: "N"   - 304, если снимок не изменился
+    GET /state?wait=30 + If-None-Match - long-poll: ответ придет, когда
+                                       снимок изменится, или 304 по таймауту
+
+Включается ключом api_port в config.json.
+"""
+import asyncio
+import json
+import logging
+import threading
+from datetime import datetime, timezone
+from urllib.parse import parse_qs, urlsplit
+
+logger = logging.getLogger(__name__)
+
+# Предел ожидания long-poll, секунд
+MAX_WAIT = 60
+MAX_HEADER_BYTES = 8192
+
+REASONS = {
+    200: 'OK',
+    304: 'Not Modified',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+}
+
+
+class SnapshotServer:
+    """HTTP-сервер, отдающий последний опубликованный снимок"""
+
+    def __init__(self, port, host='127.0.0.1'):
+        self.host = host
+        self.port = port
+        self.version = 0
+        # Содержимое последнего снимка без служебных полей - для сравнения
+        self._payload = None
+        self._body = b'{}'
+        self._etag = '"0"'
+
+        self._loop = None
+        self._server = None
+        self._changed = None
+        self._ready = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Запускает сервер в фоновом потоке и дожидается начала приема соединений"""
+        self._thread = threading.Thread(target=self._run, name="api-server", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        return self._server is not None
+
+    def stop(self):
+        """Останавливает сервер и дожидается завершения потока"""
+        if self._loop is not None and self._thread.is_alive():
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+
+    def publish(self, payload):
+        """
+        Публикует новый снимок; вызывается из GUI-потока
+
+        Снимок с тем же содержимым не меняет версию и не будит long-poll клиентов.
+
+        Returns:
+            True, если снимок изменился
+        """
+        if payload == self._payload:
+            return False
+        self._payload = payload
+        self.version += 1
+        body = json.dumps({
+            **payload,
+            'version': self.version,
+            'updated': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        }, ensure_ascii=False).encode('utf-8')
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            try:
+                loop.call_soon_threadsafe(self._set_snapshot, body, f'"{self.version}"')
+                return True
+            except RuntimeError:
+                # Цикл закрылся между проверкой и вызовом (остановка сервера)
+                pass
+        # Сервер не запущен, не смог занять порт или уже остановлен
+        self._body, self._etag = body, f'"{self.version}"'
+        return True
+
+    # --- Поток сервера ------------------------------------------------------
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._changed = asyncio.Condition()
+        try:
+            self._server = self._loop.run_until_complete(
+                asyncio.start_server(self._handle, self.host, self.port))
+        except OSError:
+            logger.exception("Не удалось запустить API на %s:%s", self.host, self.port)
+            self._loop.close()
+            self._loop = None
+            self._ready.set()
+            return
+
+        self._ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            self._server.close()
+            # Прерываем висящие long-poll запросы
+            tasks = asyncio.all_tasks(self._loop)
+            for task in tasks:
+                task.cancel()
+            self._loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            self._loop.run_until_complete(self._server.wait_closed())
+            self._loop.close()
+
+    def _set_snapshot(self, body, etag):
+        self._body = body
+        self._etag = etag
+        self._loop.create_task(self._notify())
+
+    async def _notify(self):
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def _handle(self, reader, writer):
+        try:
+            try:
+                head = await reader.readuntil(b'\r\n\r\n')
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                return
+            if len(head) > MAX_HEADER_BYTES:
+                await self._respond(writer, 400)
+                return
+
+            request_line, *header_lines = head.decode('latin-1').split('\r\n')
+            try:
+                method, target, _ = request_line.split(' ', 2)
+            except ValueError:
+                await self._respond(writer, 400)
+                return
+            headers = {}
+            for line in header_lines:
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+
+            url = urlsplit(target)
+            if url.path != '/state':
+                await self._respond(writer, 404)
+                return
+            if method not in ('GET', 'HEAD'):
+                await self._respond(writer, 405)
+                return
+
+            try:
+                wait = min(float(parse_qs(url.query).get('wait', ['0'])[0]), MAX_WAIT)
+            except ValueError:
+                await self._respond(writer, 400)
+                return
+
+            client_etag = headers.get('if-none-match')
+            if client_etag == self._etag and wait > 0:
+                # Long-poll: ждем следующего снимка
+                try:
+                    async with self._changed:
+                        await asyncio.wait_for(
+                            self._changed.wait_for(lambda: self._etag != client_etag), wait)
+                except asyncio.TimeoutError:
+                    pass
+
+            if client_etag == self._etag:
+                await self._respond(writer, 304)
+            else:
+                await self._respond(writer, 200, self._body, send_body=method != 'HEAD')
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer, status, body=b'', send_body=True):
+        headers = [
+            f"HTTP/1.1 {status} {REASONS[status]}",
+            f"ETag: {self._etag}",
+            "Cache-Control: no-cache",
+            "Access-Control-Allow-Origin: *",
+            "Access-Control-Expose-Headers: ETag",
+            "Connection: close",
+        ]
+        if body:
+            headers.append("Content-Type: application/json; charset=utf-8")
+        headers.append(f"Content-Length: {len(body)}")
+        writer.write(('\r\n'.join(headers) + '\r\n\r\n').encode('latin-1'))
+        if send_body:
+            writer.write(body)
+        await writer.drain()
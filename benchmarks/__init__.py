@@ -0,0 +1,6 @@
+"""Нагрузочные замеры приложения на синтетических базах
+
+Запуск из корня проекта:
+    python -m benchmarks --years 3 --events 50 --output bench.json
+    python -m benchmarks --baseline bench.json
+"""
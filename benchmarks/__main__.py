@@ -0,0 +1,190 @@
+"""Запуск замеров и сравнение с базовой линией"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.synthetic import generate_workdir  # noqa: E402
+
+PERIODS = ('День', 'Неделя', 'Месяц')
+
+# Холодный старт в отдельном процессе: импорты, миграции, окно, первая отрисовка
+COLD_START_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+sys.path.insert(0, {root!r})
+from PyQt6 import QtWidgets
+import main
+app = QtWidgets.QApplication(sys.argv)
+repository = main.TaskRepository('main.db')
+repository.migrate()
+window = main.MainWindow(repository)
+window.show()
+first_paint = time.perf_counter() - start
+while not window.startup_finished:
+    app.processEvents()
+print(first_paint, time.perf_counter() - start)
+window.close()
+"""
+
+
+def measure(func, repeat):
+    """Выполняет func repeat раз и возвращает статистику в миллисекундах"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return summarize(timings)
+
+
+def summarize(timings):
+    timings = sorted(timings)
+    return {
+        'n': len(timings),
+        'min_ms': timings[0],
+        'median_ms': statistics.median(timings),
+        'mean_ms': statistics.fmean(timings),
+        'p90_ms': timings[min(len(timings) - 1, int(len(timings) * 0.9))],
+        'max_ms': timings[-1],
+    }
+
+
+def measure_cold_start(workdir, repeat):
+    """
+    Returns:
+        статистика до первой отрисовки окна и до полной загрузки
+    """
+    first_paint, ready = [], []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, '-c', COLD_START_SCRIPT.format(root=ROOT)],
+            cwd=workdir, capture_output=True, text=True, check=True,
+        ).stdout
+        paint_seconds, ready_seconds = output.strip().splitlines()[-1].split()
+        first_paint.append(float(paint_seconds) * 1000)
+        ready.append(float(ready_seconds) * 1000)
+    return summarize(first_paint), summarize(ready)
+
+
+def run_benchmarks(workdir, repeat, cold_repeat):
+    from PyQt6 import QtWidgets
+    import main
+
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv)
+
+    results = {}
+    previous_cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        start = time.perf_counter()
+        window = main.MainWindow(main.TaskRepository('main.db'))
+        window.show()
+        while not window.startup_finished:
+            app.processEvents()
+        results['window_init'] = summarize([(time.perf_counter() - start) * 1000])
+
+        for period in PERIODS:
+            results[f'get_period_data[{period}]'] = measure(lambda: window.get_period_data(period), repeat)
+
+        for index, period in enumerate(PERIODS):
+            window.ui.chart_period_combo.setCurrentIndex(index)
+            results[f'update_chart[{period}]'] = measure(window.update_chart, repeat)
+
+        window.open_session(window.ui.type_combo_box.currentText())
+        results['extend_session'] = measure(window.extend_session, repeat)
+        results['extend_session+flush'] = measure(
+            lambda: (window.extend_session(), window.heartbeat_writer.flush()), repeat)
+        window.extend_session(closed=True)
+        results['change_current_type_event'] = measure(window.change_current_type_event, repeat)
+
+        window.close()
+        app.processEvents()
+
+        results['cold_start_first_paint'], results['cold_start'] = measure_cold_start(workdir, cold_repeat)
+    finally:
+        os.chdir(previous_cwd)
+
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Сравнивает медианы с базовой линией
+
+    Returns:
+        список строк отчета и признак регрессии
+    """
+    lines = []
+    regressed = False
+    for name, stats in results.items():
+        base = baseline.get(name)
+        if base is None:
+            lines.append(f"{name:40s} {stats['median_ms']:10.3f} ms  (нет в базовой линии)")
+            continue
+        ratio = stats['median_ms'] / base['median_ms'] if base['median_ms'] else float('inf')
+        mark = ''
+        if ratio > threshold:
+            mark = '  РЕГРЕССИЯ'
+            regressed = True
+        lines.append(f"{name:40s} {stats['median_ms']:10.3f} ms  x{ratio:.2f}{mark}")
+    return lines, regressed
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Замеры производительности на синтетической базе")
+    parser.add_argument('--years', type=float, default=1, help="лет истории в базе")
+    parser.add_argument('--events', type=int, default=8, help="количество типов задач")
+    parser.add_argument('--repeat', type=int, default=20, help="повторов для каждого замера")
+    parser.add_argument('--cold-repeat', type=int, default=3, help="повторов холодного старта")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workdir', help="каталог для синтетической базы (по умолчанию временный)")
+    parser.add_argument('--output', help="файл для результатов в JSON")
+    parser.add_argument('--baseline', help="JSON с результатами для сравнения")
+    parser.add_argument('--threshold', type=float, default=1.2,
+                        help="во сколько раз медиана может превысить базовую без регрессии")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='time_track_bench_')
+    dataset = generate_workdir(workdir, args.years, args.events,
+                               base_config_path=os.path.join(ROOT, 'config.json'), seed=args.seed)
+    results = run_benchmarks(workdir, args.repeat, args.cold_repeat)
+
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'dataset': dataset,
+            'repeat': args.repeat,
+        },
+        'results': results,
+    }
+
+    if args.output:
+        with open(args.output, mode='w') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, mode='r') as f:
+            baseline = json.load(f)['results']
+        lines, regressed = compare(results, baseline, args.threshold)
+        print('\n'.join(lines))
+        return 1 if regressed else 0
+
+    for name, stats in results.items():
+        print(f"{name:40s} {stats['median_ms']:10.3f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main_cli())
@@ -0,0 +1,81 @@
+"""Генерация синтетических main.db и config.json"""
+import json
+import os
+import random
+from datetime import timedelta
+
+from storage import TaskRepository, current_day
+
+
+def make_event_types(count, base_types):
+    """
+    Возвращает словарь {тип задачи: недельный лимит в часах}
+
+    Первые типы берутся из config.json, остальные дополняются синтетическими.
+    """
+    event_types = dict(list(base_types.items())[:count])
+    index = 1
+    while len(event_types) < count:
+        event_types[f"Синтетический тип {index}"] = 1 + index % 10
+        index += 1
+    return event_types
+
+
+def generate_rows(event_types, years, end=None, seed=0, fill_rate=0.6):
+    """
+    Генерирует строки tasks: (event_name, date_day, complite_sec, hour_week_limit)
+
+    Args:
+        event_types: словарь {тип задачи: недельный лимит в часах}
+        years: сколько лет истории сгенерировать
+        end: последний день истории (по умолчанию - сегодня)
+        seed: зерно генератора случайных чисел
+        fill_rate: доля дней, в которые по типу задачи была работа
+    """
+    rng = random.Random(seed)
+    end = end or current_day()
+    start = end - timedelta(days=int(365 * years) - 1)
+
+    day = start
+    while day <= end:
+        date_day = day.isoformat()
+        for event_name, hour_week_limit in event_types.items():
+            if rng.random() < fill_rate:
+                # В среднем около дневной нормы с разбросом
+                daily_seconds = hour_week_limit * 3600 / 7
+                yield event_name, date_day, int(rng.uniform(0.2, 1.8) * daily_seconds), hour_week_limit
+        day += timedelta(days=1)
+
+
+def generate_workdir(path, years, events, base_config_path='config.json', seed=0):
+    """
+    Создает в каталоге path main.db и config.json с синтетическими данными
+
+    Returns:
+        словарь с параметрами сгенерированной базы
+    """
+    os.makedirs(path, exist_ok=True)
+    with open(base_config_path, mode='r') as f:
+        base_types = json.load(f)['type_events']
+
+    event_types = make_event_types(events, base_types)
+    with open(os.path.join(path, 'config.json'), mode='w') as f:
+        json.dump({'type_events': event_types}, f, ensure_ascii=False, indent=4)
+
+    db_path = os.path.join(path, 'main.db')
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+
+    repository = TaskRepository(db_path)
+    repository.migrate()
+    rows = list(generate_rows(event_types, years, seed=seed))
+    repository.update_days(rows)
+    repository.close()
+
+    return {
+        'years': years,
+        'events': len(event_types),
+        'rows': len(rows),
+        'db_size_bytes': os.path.getsize(db_path),
+    }
@@ -0,0 +1,206 @@
+"""Кэш дневных и недельных сумм для прогресс-баров
+
+Приложение - единственный писатель в main.db, поэтому суммы загружаются
+один раз и дальше обновляются при каждой записи (write-through). Кэш
+перечитывается только при смене дня (окно "последних 7 дней" сдвигается)
+или если базу изменило другое приложение.
+
+InMemoryHistory - общая основа загрузки для таких структур в памяти: кроме
+кэша от нее наследуются префиксные суммы (ranges.py) и аналитика
+(analytics.py).
+"""
+from datetime import timedelta
+
+from sessions import parse_time, split_by_day
+from storage import current_day
+
+
+class ExternalChangeDetector:
+    """
+    Определяет, что базу изменило другое приложение
+
+    Коммиты собственного HeartbeatWriter тоже меняют PRAGMA data_version.
+    Писатель запоминает data_version соединения GUI сразу после каждого
+    своего коммита и перед коммитом проверяет, не сдвинулась ли она с тех
+    пор (см. HeartbeatWriter.external_changes). Поэтому смена версии
+    считается своей, только если версия равна запомненной писателем и чужих
+    коммитов перед его записями не было. Не распознается лишь внешний
+    коммит, пришедшийся на время самой транзакции пульса (миллисекунды);
+    он будет подхвачен при следующей перезагрузке данных.
+    """
+
+    def __init__(self, repository, heartbeat_writer=None):
+        self.repository = repository
+        self.heartbeat_writer = heartbeat_writer
+        self._data_version = None
+        self._external_changes = 0
+
+    def reset(self):
+        """Запоминает текущее состояние базы как уже учтенное"""
+        self._data_version = self.repository.data_version()
+        self._external_changes = self._get_external_changes()
+
+    def unwritten_days(self):
+        """
+        Приросты дневных сумм из очереди пульсов, еще не записанные в БД
+
+        Записанный конец интервала читается из sessions, которая обновляется
+        одной транзакцией с tasks. Поэтому при вызове в той же транзакции
+        чтения, что и загрузка (TaskRepository.read_transaction), каждая
+        секунда учитывается ровно один раз, и ждать запись не нужно.
+
+        Returns:
+            список (event_name, date, секунды)
+        """
+        if self.heartbeat_writer is None:
+            return []
+        result = []
+        for (event_name, start), end in self.heartbeat_writer.queued_sessions().items():
+            written_end = self.repository.get_session_end(event_name, start)
+            written_end = max(start, parse_time(written_end)) if written_end is not None else start
+            for day, seconds in split_by_day(written_end, end):
+                result.append((event_name, day, seconds))
+        return result
+
+    def changed(self):
+        """Возвращает True, если с прошлой проверки были внешние коммиты"""
+        data_version = self.repository.data_version()
+        if data_version == self._data_version:
+            return False
+
+        if (self.heartbeat_writer is None or data_version != self.heartbeat_writer.data_version
+                or self._get_external_changes() != self._external_changes):
+            return True
+
+        # С прошлой проверки базу меняли только свои коммиты
+        self._data_version = data_version
+        return False
+
+    def _get_external_changes(self):
+        return self.heartbeat_writer.external_changes if self.heartbeat_writer is not None else 0
+
+
+class InMemoryHistory:
+    """
+    Основа структур в памяти, загружаемых из БД и обновляемых пульсами
+
+    load() читает базу в одной транзакции чтения вместе с еще не записанными
+    приростами из очереди HeartbeatWriter (см. ExternalChangeDetector.unwritten_days),
+    поэтому запись ждать не нужно. Подкласс реализует _read (запросы к БД
+    внутри транзакции) и _build (заполнение структуры).
+    """
+
+    def __init__(self, repository, heartbeat_writer=None):
+        """
+        Args:
+            repository: TaskRepository для загрузки истории
+            heartbeat_writer: HeartbeatWriter, чьи коммиты не считаются внешними
+        """
+        self.repository = repository
+        self.change_detector = ExternalChangeDetector(repository, heartbeat_writer)
+        self._loaded = False
+        self.loads = 0
+
+    def load(self):
+        """Загружает данные из БД вместе с пульсами из очереди записи"""
+        with self.repository.read_transaction():
+            unwritten = self.change_detector.unwritten_days()
+            rows = self._read(unwritten)
+        self._build(rows, unwritten)
+
+        self.change_detector.reset()
+        self._loaded = True
+        self.loads += 1
+
+    def invalidate(self):
+        """Сбрасывает данные; они будут загружены при следующем обращении"""
+        self._loaded = False
+
+    def check_external_changes(self):
+        """Сбрасывает данные, если базу изменило другое приложение"""
+        if self._loaded and self.change_detector.changed():
+            self.invalidate()
+
+    def _read(self, unwritten):
+        """
+        Читает строки из БД (вызывается внутри транзакции чтения)
+
+        Args:
+            unwritten: список (event_name, date, секунды) из очереди записи
+        """
+        raise NotImplementedError
+
+    def _build(self, rows, unwritten):
+        """Заполняет структуру строками из _read и приростами из очереди"""
+        raise NotImplementedError
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self.load()
+
+
+class AggregateCache(InMemoryHistory):
+    """Секунды по типам задач за последние WINDOW_DAYS дней"""
+
+    WINDOW_DAYS = 7
+
+    # Периоды диаграммы, которые помещаются в окно кэша:
+    # сколько дней до сегодняшнего включается в сумму
+    PERIOD_DAYS = {
+        'День': 0,
+        'Неделя': 6,
+    }
+
+    def __init__(self, repository, heartbeat_writer=None):
+        super().__init__(repository, heartbeat_writer)
+        # event_name -> {date_day: complite_sec}
+        self._days = {}
+        self._day = None
+
+    def _read(self, unwritten):
+        self._day = current_day()
+        return self.repository.get_days_rows(self._day - timedelta(days=self.WINDOW_DAYS - 1), self._day)
+
+    def _build(self, rows, unwritten):
+        start = self._day - timedelta(days=self.WINDOW_DAYS - 1)
+        self._days = {}
+        for row in rows:
+            self._days.setdefault(row['event_name'], {})[row['date_day']] = row['complite_sec'] or 0
+        for event_name, day, seconds in unwritten:
+            if start <= day <= self._day:
+                days = self._days.setdefault(event_name, {})
+                days[day.isoformat()] = days.get(day.isoformat(), 0) + seconds
+
+    def add(self, event_name, seconds, day=None):
+        """Добавляет в кэш прирост секунд за день"""
+        self._ensure_loaded()
+        day = day or self._day
+        if day > self._day - timedelta(days=self.WINDOW_DAYS):
+            days = self._days.setdefault(event_name, {})
+            days[day.isoformat()] = days.get(day.isoformat(), 0) + seconds
+
+    def today_seconds(self, event_name):
+        """Секунды по типу задачи за сегодня"""
+        self._ensure_loaded()
+        return self._days.get(event_name, {}).get(self._day.isoformat(), 0)
+
+    def week_seconds(self, event_name):
+        """Секунды по типу задачи за последние 7 дней, включая сегодня"""
+        self._ensure_loaded()
+        return sum(self._days.get(event_name, {}).values())
+
+    def period_totals(self, period):
+        """Суммы секунд по типам задач за период из PERIOD_DAYS"""
+        self._ensure_loaded()
+        first_day = (self._day - timedelta(days=self.PERIOD_DAYS[period])).isoformat()
+        totals = {}
+        for event_name, days in self._days.items():
+            seconds = sum(value for day, value in days.items() if day >= first_day)
+            if seconds:
+                totals[event_name] = seconds
+        return totals
+
+    def _ensure_loaded(self):
+        # Со сменой дня окно "последних 7 дней" сдвигается
+        if not self._loaded or self._day != current_day():
+            self.load()
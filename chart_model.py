@@ -0,0 +1,192 @@
+"""Круговая диаграмма с постоянными секторами и цветами
+
+Один сектор на тип задачи живет, пока тип присутствует в данных: при
+обновлении меняются только значения и подписи, а секторы добавляются или
+удаляются лишь при изменении набора типов. Цвета закреплены за названиями,
+поэтому не прыгают между обновлениями.
+"""
+import colorsys
+
+from PyQt6 import QtCore, QtGui
+from PyQt6.QtCharts import QPieSeries, QPieSlice
+
+from reports import UNACCOUNTED
+
+
+class SimpleColorGenerator:
+    """Простой генератор хорошо различимых цветов"""
+
+    # Золотое сечение для равномерного распределения оттенков
+    GOLDEN_RATIO_CONJUGATE = 0.618033988749895
+    # Вторая иррациональная константа для разброса насыщенности и яркости
+    PLASTIC_RATIO_CONJUGATE = 0.7548776662466927
+
+    @staticmethod
+    def get_color(i, theme='both'):
+        """
+        Возвращает i-й цвет последовательности; один и тот же i всегда дает
+        один и тот же цвет
+
+        Args:
+            i: номер цвета
+            theme: 'light', 'dark' или 'both' (для любой темы)
+        """
+        hue = (i * SimpleColorGenerator.GOLDEN_RATIO_CONJUGATE) % 1.0
+        jitter = (i * SimpleColorGenerator.PLASTIC_RATIO_CONJUGATE) % 1.0
+
+        if theme == 'light':
+            # Для светлой темы - более насыщенные цвета
+            saturation = 0.8 + 0.1 * jitter
+            value = 0.8 + 0.1 * (1 - jitter)
+        elif theme == 'dark':
+            # Для темной темы - более яркие цвета
+            saturation = 0.7 + 0.1 * jitter
+            value = 0.9 + 0.05 * (1 - jitter)
+        else:  # both
+            # Компромиссный вариант
+            saturation = 0.75 + 0.1 * jitter
+            value = 0.85 + 0.05 * (1 - jitter)
+
+        r, g, b = colorsys.hsv_to_rgb(hue, saturation, value)
+        return QtGui.QColor(int(r * 255), int(g * 255), int(b * 255))
+
+    @staticmethod
+    def get_colors(n, theme='both'):
+        """
+        Возвращает n хорошо различимых цветов
+
+        Args:
+            n: количество цветов
+            theme: 'light', 'dark' или 'both' (для любой темы)
+        """
+        return [SimpleColorGenerator.get_color(i, theme) for i in range(n)]
+
+    @staticmethod
+    def get_text_color(background_color):
+        """Возвращает черный или белый в зависимости от яркости фона"""
+        luminance = (0.299 * background_color.red() +
+                    0.587 * background_color.green() +
+                    0.114 * background_color.blue()) / 255
+        return QtGui.QColor(0, 0, 0) if luminance > 0.55 else QtGui.QColor(255, 255, 255)
+
+
+class ColorPalette:
+    """Кэш цветов: каждому названию - свой постоянный цвет"""
+
+    # Служебные секторы окрашиваются нейтрально
+    FIXED_COLORS = {
+        UNACCOUNTED: QtGui.QColor(200, 200, 200),
+    }
+
+    def __init__(self, known_names=(), theme='both'):
+        """
+        Args:
+            known_names: названия, которым цвета назначаются заранее и по порядку
+                (типы задач из config.json), чтобы цвета совпадали между запусками
+            theme: тема для SimpleColorGenerator
+        """
+        self.theme = theme
+        self._colors = {}
+        for name in known_names:
+            self.color_for(name)
+
+    def color_for(self, name):
+        """Возвращает цвет для названия, назначая новый при первом обращении"""
+        color = self.FIXED_COLORS.get(name)
+        if color is not None:
+            return color
+        color = self._colors.get(name)
+        if color is None:
+            color = SimpleColorGenerator.get_color(len(self._colors), self.theme)
+            self._colors[name] = color
+        return color
+
+
+class PieChartModel:
+    """Серия круговой диаграммы с одним постоянным сектором на тип задачи"""
+
+    def __init__(self, chart, palette):
+        self.chart = chart
+        self.palette = palette
+        self.label_font = QtGui.QFont("Arial", 10)
+
+        self.series = QPieSeries()
+        self.series.setLabelsVisible(True)
+        self.chart.addSeries(self.series)
+
+        # Настройка легенды выполняется один раз
+        self.chart.legend().setVisible(True)
+        self.chart.legend().setAlignment(QtCore.Qt.AlignmentFlag.AlignRight)
+        self.chart.legend().setFont(QtGui.QFont("Arial", 8))
+
+        # event_name -> QPieSlice
+        self._slices = {}
+
+    def update(self, period, data, total_seconds, title=None):
+        """
+        Приводит диаграмму к новым данным
+
+        Args:
+            period: название периода для заголовка
+            data: словарь {название: секунды}
+            total_seconds: сумма секунд для расчета процентов
+            title: заголовок вместо стандартного "период: N часов"
+        """
+        if not data:
+            # Нет данных - показываем пустую диаграмму
+            self._remove_missing(())
+            self.chart.setTitle(f"{period}: Нет данных")
+            return
+
+        self._remove_missing(data)
+
+        legend_changed = False
+        for name, value in data.items():
+            # Преобразуем секунды в проценты и часы для отображения
+            percentage = (value / total_seconds * 100) if total_seconds > 0 else 0
+            hours = value / 3600
+            label = f"{percentage:.1f}% {hours:.1f} ч."
+
+            slice = self._slices.get(name)
+            if slice is None:
+                slice = self._create_slice(name, label, percentage)
+                legend_changed = True
+                continue
+
+            if slice.value() != percentage:
+                slice.setValue(percentage)
+            if slice.label() != label:
+                # Маркер легенды берет подпись сектора, поэтому его надо вернуть
+                slice.setLabel(label)
+                legend_changed = True
+
+        title = title or f"{period}: {total_seconds/3600:.1f} часов"
+        if self.chart.title() != title:
+            self.chart.setTitle(title)
+
+        if legend_changed:
+            self._update_legend()
+
+    def _create_slice(self, name, label, percentage):
+        slice = QPieSlice(label, percentage)
+        slice.setColor(self.palette.color_for(name))
+
+        # Настройка отображения текста
+        slice.setLabelVisible(True)
+        slice.setLabelPosition(QPieSlice.LabelPosition.LabelInsideNormal)
+        slice.setLabelFont(self.label_font)
+
+        self.series.append(slice)
+        self._slices[name] = slice
+        return slice
+
+    def _remove_missing(self, names):
+        for name in [name for name in self._slices if name not in names]:
+            self.series.remove(self._slices.pop(name))
+
+    def _update_legend(self):
+        names = {slice: name for name, slice in self._slices.items()}
+        for marker in self.chart.legend().markers(self.series):
+            name = names.get(marker.slice())
+            if name is not None:
+                marker.setLabel(name)
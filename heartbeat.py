@@ -0,0 +1,214 @@
+"""Фоновая запись пульсов таймера в БД (write-behind)
+
+GUI-поток только кладет конец открытого интервала работы в словарь и сразу
+возвращается. Повторные пульсы одного интервала схлопываются в одно
+значение, а накопленное записывается фоновым потоком одной транзакцией
+через отдельное соединение - в режиме WAL оно не мешает чтению из GUI.
+Вместе с интервалом записывается прирост дневных сумм в tasks. После
+коммита журнал тиков (journal.py) усекается по последний учтенный тик.
+"""
+import logging
+import threading
+from datetime import datetime
+
+import sessions
+from storage import TaskRepository
+
+logger = logging.getLogger(__name__)
+
+
+class HeartbeatWriter:
+    """Очередь пульсов с фоновой пакетной записью"""
+
+    def __init__(self, db_path='main.db', flush_interval=2.0, compact=True, instrumentation=None,
+                 journal=None, repository=None):
+        """
+        Args:
+            db_path: путь к базе
+            flush_interval: сколько секунд копить пульсы перед записью
+            compact: уплотнить журнал интервалов при запуске потока
+            instrumentation: Instrumentation для замеров записи (None - без замеров)
+            journal: HeartbeatJournal, который усекается после каждого коммита
+            repository: TaskRepository GUI-потока; его data_version запоминается
+                после каждого коммита, чтобы отличать свои коммиты от внешних
+        """
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.compact = compact
+        self.instrumentation = instrumentation
+        self.journal = journal
+        self.repository = repository
+
+        # (event_name, start) -> (end, hour_week_limit, closed)
+        self._pending = {}
+        # Пакет, который сейчас записывается
+        self._in_flight = {}
+        # Номер последнего тика журнала, покрытого очередью
+        self._journal_sequence = None
+        # Уже записанный конец каждого открытого интервала; используется
+        # только фоновым потоком
+        self._written_ends = {}
+        # PRAGMA data_version соединения repository сразу после последнего
+        # своего коммита и число внешних коммитов, замеченных перед своими:
+        # по ним ExternalChangeDetector отличает свои записи от чужих
+        self.data_version = None
+        self.external_changes = 0
+        self._flush_requested = False
+        self._stopping = False
+        self._condition = threading.Condition()
+
+        # Исходная версия запоминается до запуска потока: внешний коммит сразу
+        # после создания писателя тоже должен считаться внешним
+        self._remember_data_version()
+        self._thread = threading.Thread(target=self._run, name="heartbeat-writer", daemon=True)
+        self._thread.start()
+
+    def submit_session(self, event_name, start, end, hour_week_limit=None, closed=False):
+        """
+        Ставит в очередь продление интервала работы, не блокируясь на БД
+
+        Args:
+            event_name: тип задачи
+            start, end: начало и текущий конец интервала (datetime в UTC)
+            hour_week_limit: недельный лимит для новых строк tasks
+            closed: интервал завершен и больше продлеваться не будет
+        """
+        with self._condition:
+            self._pending[(event_name, start)] = (end, hour_week_limit, closed)
+            if self.journal is not None:
+                # Тики журнала пишутся до пульса, поэтому end покрывает их все
+                self._journal_sequence = self.journal.sequence
+            self._condition.notify_all()
+
+    def queued_sessions(self):
+        """
+        Интервалы из очереди, запись которых еще не подтверждена коммитом
+
+        Returns:
+            словарь {(event_name, start): end}
+        """
+        with self._condition:
+            queued = {key: end for key, (end, _, _) in self._in_flight.items()}
+            for key, (end, _, _) in self._pending.items():
+                queued[key] = max(end, queued.get(key, end))
+        return queued
+
+    def flush(self, timeout=None):
+        """
+        Синхронно дожидается записи всех накопленных пульсов
+
+        Returns:
+            True, если очередь записана, иначе False (истек timeout)
+        """
+        with self._condition:
+            if not self._pending and not self._in_flight:
+                return True
+            self._flush_requested = True
+            self._condition.notify_all()
+            return self._condition.wait_for(
+                lambda: not self._pending and not self._in_flight or not self._thread.is_alive(),
+                timeout,
+            )
+
+    def close(self):
+        """Записывает остаток очереди и останавливает поток"""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        self._thread.join()
+
+    def _run(self):
+        repository = TaskRepository(self.db_path)
+        if self.instrumentation is not None:
+            self.instrumentation.instrument_object(repository, 'heartbeat', ('write_sessions', 'compact_sessions'))
+        try:
+            if self.compact:
+                self._compact(repository)
+
+            while True:
+                with self._condition:
+                    self._condition.wait_for(lambda: self._pending or self._stopping)
+                    # Копим пульсы, пока не истечет интервал или не попросят flush
+                    self._condition.wait_for(
+                        lambda: self._flush_requested or self._stopping,
+                        self.flush_interval,
+                    )
+                    self._flush_requested = False
+                    if not self._pending and self._stopping:
+                        return
+                    self._in_flight, self._pending = self._pending, {}
+                    batch = self._in_flight
+                    journal_sequence, self._journal_sequence = self._journal_sequence, None
+
+                if self._write(repository, batch) and journal_sequence is not None:
+                    self.journal.truncate(journal_sequence)
+                elif journal_sequence is not None:
+                    with self._condition:
+                        self._journal_sequence = max(journal_sequence, self._journal_sequence or 0)
+
+                with self._condition:
+                    self._in_flight = {}
+                    self._condition.notify_all()
+        finally:
+            repository.close()
+            with self._condition:
+                self._condition.notify_all()
+
+    def _check_external_changes(self):
+        """Перед своим коммитом: сдвиг data_version после прошлого значит внешнюю запись"""
+        if self.repository is None:
+            return
+        data_version = self.repository.data_version()
+        with self._condition:
+            if data_version != self.data_version:
+                self.external_changes += 1
+
+    def _remember_data_version(self):
+        """После своего коммита запоминает data_version соединения GUI"""
+        if self.repository is None:
+            return
+        data_version = self.repository.data_version()
+        with self._condition:
+            self.data_version = data_version
+
+    def _compact(self, repository):
+        try:
+            self._check_external_changes()
+            repository.compact_sessions()
+            self._remember_data_version()
+        except Exception:
+            logger.exception("Не удалось уплотнить журнал интервалов")
+
+    def _write(self, repository, batch):
+        """Записывает пакет пульсов; возвращает True при успешном коммите"""
+        session_rows = []
+        day_rows = []
+        for (event_name, start), (end, hour_week_limit, closed) in batch.items():
+            # В tasks добавляется только прирост с прошлой записи интервала
+            written_end = self._written_ends.get((event_name, start), start)
+            for day, seconds in sessions.split_by_day(written_end, end):
+                day_start = max(start, datetime.combine(day, datetime.min.time()))
+                day_rows.append((event_name, day.isoformat(), seconds, hour_week_limit,
+                                 sessions.format_time(day_start)))
+            session_rows.append((event_name, sessions.format_time(start), sessions.format_time(end)))
+
+        try:
+            self._check_external_changes()
+            repository.write_sessions(session_rows, day_rows)
+            self._remember_data_version()
+        except Exception:
+            logger.exception("Не удалось записать пульсы таймера, повтор при следующей записи")
+            with self._condition:
+                # Более новые значения из очереди важнее неудачного пакета
+                for key, value in batch.items():
+                    self._pending.setdefault(key, value)
+                if self._stopping:
+                    self._pending.clear()
+            return False
+
+        for (event_name, start), (end, hour_week_limit, closed) in batch.items():
+            if closed:
+                self._written_ends.pop((event_name, start), None)
+            else:
+                self._written_ends[(event_name, start)] = max(end, self._written_ends.get((event_name, start), start))
+        return True
@@ -0,0 +1,233 @@
+"""Замеры задержек обращений к БД и слотов интерфейса (по запросу)
+
+Включается переменной окружения TIME_TRACK_PROFILE: значение '1' -
+замеры с выгрузкой в profile.json при выходе, любое другое значение -
+путь к файлу выгрузки. Без нее приложение работает без оберток.
+
+Задержки копятся в гистограммах с логарифмическими корзинами (4 корзины
+на удвоение, погрешность процентилей до ~19%), поэтому память не растет
+со временем работы. Отдельно считаются SQL-запросы, выполненные за один
+тик секундомера, и интервалы между тиками: по ним видно, успевает ли
+GUI-поток обрабатывать тики в срок.
+"""
+import functools
+import inspect
+import json
+import math
+import os
+import threading
+import time
+
+# Корзин гистограммы на каждое удвоение значения
+BUCKETS_PER_DOUBLING = 4
+
+# Тик, опоздавший больше чем на эту долю секунды, считается пропущенным
+MISSED_TICK_LATENESS = 0.5
+
+
+def _positional_limit(function):
+    """Сколько позиционных аргументов принимает функция (None - без ограничения)"""
+    parameters = inspect.signature(function).parameters.values()
+    if any(parameter.kind == parameter.VAR_POSITIONAL for parameter in parameters):
+        return None
+    return sum(parameter.kind in (parameter.POSITIONAL_ONLY, parameter.POSITIONAL_OR_KEYWORD)
+               for parameter in parameters)
+
+
+class LatencyHistogram:
+    """Гистограмма значений с логарифмическими корзинами"""
+
+    def __init__(self):
+        # Номер корзины -> количество значений
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        """Добавляет значение (секунды или количество, не меньше 0)"""
+        bucket = math.ceil(math.log2(value) * BUCKETS_PER_DOUBLING) if value > 0 else None
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, percent):
+        """Верхняя граница корзины, в которую попадает процентиль percent"""
+        if not self.count:
+            return 0.0
+        rank = math.ceil(self.count * percent / 100)
+        seen = 0
+        for bucket in sorted(self.buckets, key=lambda b: -math.inf if b is None else b):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                if bucket is None:
+                    return 0.0
+                return min(2 ** (bucket / BUCKETS_PER_DOUBLING), self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0.0,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'max': self.max,
+        }
+
+
+class Instrumentation:
+    """Набор гистограмм по именованным операциям"""
+
+    def __init__(self, output_path=None):
+        """
+        Args:
+            output_path: куда выгружать замеры при выходе (None - не выгружать)
+        """
+        self.output_path = output_path
+        # 'вид.имя' -> LatencyHistogram
+        self.histograms = {}
+        self.queries = 0
+        self.missed_ticks = 0
+        self._last_tick = None
+        self._tick_deadline = None
+        self._started = time.perf_counter()
+        # Замеры пишутся и из потока записи пульсов
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_environment(cls):
+        """Возвращает Instrumentation, если задан TIME_TRACK_PROFILE, иначе None"""
+        value = os.environ.get('TIME_TRACK_PROFILE')
+        if not value:
+            return None
+        return cls('profile.json' if value == '1' else value)
+
+    def record(self, name, value):
+        """Добавляет значение в гистограмму name"""
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = LatencyHistogram()
+            histogram.add(value)
+
+    def wrap(self, function, name):
+        """Оборачивает функцию замером времени каждого вызова"""
+        # Слоту без аргументов Qt передал бы аргументы сигнала обертке,
+        # поэтому лишние отбрасываются, как это делает сам PyQt
+        limit = _positional_limit(function)
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            args = args[:limit]
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.record(name, time.perf_counter() - started)
+        return wrapper
+
+    def expect_tick(self, delay):
+        """Запоминает, что следующий тик запланирован через delay секунд"""
+        self._tick_deadline = time.perf_counter() + delay
+
+    def wrap_tick(self, function, name):
+        """
+        Оборачивает обработчик тика секундомера: кроме времени вызова
+        записываются интервал с прошлого тика, опоздание относительно
+        запланированного времени (см. expect_tick) и число SQL-запросов за тик
+        """
+        limit = _positional_limit(function)
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            args = args[:limit]
+            started = time.perf_counter()
+            if self._last_tick is not None:
+                self.record('tick.interval', started - self._last_tick)
+            self._last_tick = started
+            if self._tick_deadline is not None:
+                lateness = max(0.0, started - self._tick_deadline)
+                self.record('tick.lateness', lateness)
+                if lateness > MISSED_TICK_LATENESS:
+                    self.missed_ticks += 1
+                self._tick_deadline = None
+
+            queries = self.queries
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.record(name, time.perf_counter() - started)
+                self.record('tick.queries', self.queries - queries)
+        return wrapper
+
+    def instrument_object(self, obj, kind, names=None):
+        """
+        Заменяет методы объекта обертками с замером времени
+
+        Обертки ставятся атрибутами экземпляра, поэтому сигналы Qt нужно
+        подключать уже после вызова.
+
+        Args:
+            kind: префикс имен гистограмм ('db', 'slot')
+            names: имена методов (по умолчанию - все публичные методы класса)
+        """
+        if names is None:
+            names = [name for name in dir(type(obj))
+                     if not name.startswith('_') and callable(getattr(type(obj), name))]
+        for name in names:
+            setattr(obj, name, self.wrap(getattr(obj, name), f'{kind}.{name}'))
+
+    def instrument_connection(self, connection):
+        """Считает SQL-запросы, выполненные через соединение"""
+        connection.set_trace_callback(self._count_query)
+
+    def _count_query(self, statement):
+        self.queries += 1
+
+    def snapshot(self):
+        """Все замеры в виде словаря, пригодного для JSON"""
+        with self._lock:
+            histograms = {name: histogram.to_dict() for name, histogram in sorted(self.histograms.items())}
+        return {
+            'uptime': time.perf_counter() - self._started,
+            'queries': self.queries,
+            'missed_ticks': self.missed_ticks,
+            'histograms': histograms,
+        }
+
+    def dump(self, path=None):
+        """
+        Выгружает замеры в JSON
+
+        Returns:
+            путь к файлу или None, если путь не задан
+        """
+        path = path or self.output_path
+        if path is None:
+            return None
+        with open(path, mode='w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+        return path
+
+    def summary(self, tick_name):
+        """Короткая сводка p50/p99 для строки состояния"""
+        with self._lock:
+            tick = self.histograms.get(tick_name, LatencyHistogram())
+            queries = self.histograms.get('tick.queries', LatencyHistogram())
+            lateness = self.histograms.get('tick.lateness', LatencyHistogram())
+            db = LatencyHistogram()
+            for name, histogram in self.histograms.items():
+                if name.startswith('db.'):
+                    for bucket, count in histogram.buckets.items():
+                        db.buckets[bucket] = db.buckets.get(bucket, 0) + count
+                    db.count += histogram.count
+                    db.total += histogram.total
+                    db.max = max(db.max, histogram.max)
+
+        return (f"тик p50 {tick.percentile(50) * 1000:.2f} / p99 {tick.percentile(99) * 1000:.2f} мс"
+                f" | БД p50 {db.percentile(50) * 1000:.2f} / p99 {db.percentile(99) * 1000:.2f} мс"
+                f" | запросов за тик p99 {queries.percentile(99):.0f}"
+                f" | опоздание p99 {lateness.percentile(99) * 1000:.0f} мс"
+                f" | пропущено тиков {self.missed_ticks}")
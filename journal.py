@@ -0,0 +1,181 @@
+"""Журнал тиков секундомера для восстановления после сбоя
+
+В БД открытый интервал продлевается раз в heartbeat_seconds секунд, и при
+аварийном завершении время с последней записи терялось бы. Поэтому каждый
+тик дописывает конец интервала в небольшой файл фиксированного размера,
+отображенный в память (mmap): запись тика - копирование 512 байт без
+транзакции SQLite.
+
+Записи лежат по кругу в SLOTS ячейках, каждая с порядковым номером и
+контрольной суммой. После успешного коммита в БД номер последнего
+учтенного тика сохраняется в заголовке - это логическое усечение журнала:
+такие записи при восстановлении пропускаются. При запуске оставшиеся
+записи воспроизводятся в sessions и tasks (повторное воспроизведение
+ничего не меняет, см. transfer.import_sessions).
+
+Файл лежит рядом с базой: main.db.ticks. Пока окно свернуто, тики идут
+с частотой записи в БД, и журнал защищает только время до первого пульса.
+"""
+import logging
+import mmap
+import os
+import struct
+import threading
+import zlib
+from datetime import datetime, timedelta
+
+import sessions
+import transfer
+
+logger = logging.getLogger(__name__)
+
+EPOCH = datetime(1970, 1, 1)
+
+MAGIC = b'TTJ1'
+# Сигнатура, номер последнего учтенного в БД тика
+HEADER = struct.Struct('<4s4xQ')
+HEADER_SIZE = 64
+# Номер тика, начало и конец интервала (секунды от эпохи, UTC), длина имени
+RECORD_HEADER = struct.Struct('<QqqH')
+RECORD_SIZE = 512
+MAX_NAME_BYTES = RECORD_SIZE - RECORD_HEADER.size - 4
+CRC = struct.Struct('<I')
+
+
+def _to_seconds(moment):
+    return int((moment - EPOCH).total_seconds())
+
+
+def _from_seconds(seconds):
+    return EPOCH + timedelta(seconds=seconds)
+
+
+class HeartbeatJournal:
+    """Кольцевой журнал тиков в файле, отображенном в память"""
+
+    SUFFIX = '.ticks'
+    SLOTS = 256
+
+    def __init__(self, path, slots=SLOTS, sync=False):
+        """
+        Args:
+            path: путь к файлу журнала
+            slots: количество ячеек кольца
+            sync: сбрасывать страницу на диск после каждого тика (msync);
+                без этого журнал переживает падение приложения, но не ОС
+        """
+        self.path = path
+        self.slots = slots
+        self.sync = sync
+        self.size = HEADER_SIZE + slots * RECORD_SIZE
+
+        # Журнал усекается из потока записи пульсов
+        self._lock = threading.Lock()
+
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fresh = os.fstat(fd).st_size != self.size
+            if fresh:
+                os.ftruncate(fd, self.size)
+            self._map = mmap.mmap(fd, self.size)
+        finally:
+            os.close(fd)
+
+        magic, self.committed = HEADER.unpack_from(self._map, 0)
+        if fresh or magic != MAGIC:
+            self._reset()
+
+        # Следующий номер тика продолжает номера, оставшиеся в файле
+        self.sequence = max((record[0] for record in self._records()), default=self.committed)
+        self.sequence = max(self.sequence, self.committed)
+
+    def append(self, event_name, start, end):
+        """
+        Записывает тик открытого интервала
+
+        Args:
+            event_name: тип задачи
+            start, end: начало и текущий конец интервала (datetime в UTC)
+        """
+        name = event_name.encode('utf-8')
+        if len(name) > MAX_NAME_BYTES:
+            logger.warning("Слишком длинное название для журнала тиков: %s", event_name)
+            return
+
+        with self._lock:
+            self.sequence += 1
+            offset = HEADER_SIZE + (self.sequence % self.slots) * RECORD_SIZE
+            body = RECORD_HEADER.pack(self.sequence, _to_seconds(start), _to_seconds(end), len(name)) + name
+            self._map[offset:offset + len(body)] = body
+            self._map[offset + len(body):offset + len(body) + CRC.size] = CRC.pack(zlib.crc32(body))
+            if self.sync:
+                page = offset - offset % mmap.ALLOCATIONGRANULARITY
+                self._map.flush(page, min(mmap.ALLOCATIONGRANULARITY, self.size - page))
+
+    def truncate(self, sequence):
+        """Помечает тики по номер sequence включительно как записанные в БД"""
+        with self._lock:
+            if sequence > self.committed:
+                self.committed = sequence
+                HEADER.pack_into(self._map, 0, MAGIC, sequence)
+
+    def pending(self):
+        """
+        Еще не записанные в БД интервалы
+
+        Returns:
+            словарь {(event_name, start): end} с самым поздним концом каждого интервала
+        """
+        latest = {}
+        for sequence, event_name, start, end in self._records():
+            if sequence > self.committed:
+                key = (event_name, start)
+                latest[key] = max(end, latest.get(key, end))
+        return latest
+
+    def replay(self, repository):
+        """
+        Дописывает в БД тики, оставшиеся после аварийного завершения
+
+        Returns:
+            количество восстановленных интервалов
+        """
+        latest = self.pending()
+        if latest:
+            records = ({
+                'event_name': event_name,
+                'start_datetime': sessions.format_time(start),
+                'end_datetime': sessions.format_time(end),
+            } for (event_name, start), end in latest.items())
+            # Вызывается при запуске, пока соединение больше никем не используется
+            transfer.import_sessions(repository.connection, records)
+            logger.info("Из журнала тиков восстановлено интервалов: %s", len(latest))
+        self.truncate(self.sequence)
+        return len(latest)
+
+    def close(self):
+        with self._lock:
+            if self._map is not None:
+                self._map.flush()
+                self._map.close()
+                self._map = None
+
+    def _reset(self):
+        self._map[:] = bytes(self.size)
+        self.committed = 0
+        HEADER.pack_into(self._map, 0, MAGIC, 0)
+
+    def _records(self):
+        """Генератор целых записей (номер, тип задачи, начало, конец)"""
+        for slot in range(self.slots):
+            offset = HEADER_SIZE + slot * RECORD_SIZE
+            sequence, start, end, length = RECORD_HEADER.unpack_from(self._map, offset)
+            if not sequence or length > MAX_NAME_BYTES:
+                continue
+            body_end = offset + RECORD_HEADER.size + length
+            (crc,) = CRC.unpack_from(self._map, body_end)
+            if crc != zlib.crc32(self._map[offset:body_end]):
+                # Запись оборвана на середине
+                continue
+            event_name = self._map[offset + RECORD_HEADER.size:body_end].decode('utf-8')
+            yield sequence, event_name, _from_seconds(start), _from_seconds(end)
@@ -1,57 +1,34 @@
-from PyQt6 import QtCore, QtGui, QtWidgets
-from PyQt6.QtCharts import QChart, QChartView, QPieSeries, QPieSlice
+import os
 import sys
-import colorsys
-import random
-import sqlite3
-from datetime import datetime, timedelta
+import time
+
+# Отсчет фаз запуска ведется от начала импорта модуля
+STARTUP_CLOCK = time.perf_counter()
+STARTUP_TIMING = os.environ.get('TIME_TRACK_STARTUP_TIMING') == '1'
+
+
+def log_startup_phase(phase):
+    """Печатает в stderr время от начала запуска, если задан TIME_TRACK_STARTUP_TIMING=1"""
+    if STARTUP_TIMING:
+        print(f"[startup] {phase}: {(time.perf_counter() - STARTUP_CLOCK) * 1000:.1f} ms", file=sys.stderr)
+
+
+from PyQt6 import QtCore, QtGui, QtWidgets
 import json
+import logging
+import sqlite3
+from datetime import timedelta
 
-class SimpleColorGenerator:
-    """Простой генератор хорошо различимых цветов"""
-    
-    @staticmethod
-    def get_colors(n, theme='both'):
-        """
-        Возвращает n хорошо различимых цветов
-        
-        Args:
-            n: количество цветов
-            theme: 'light', 'dark' или 'both' (для любой темы)
-        """
-        colors = []
-        
-        # Золотое сечение для равномерного распределения
-        golden_ratio_conjugate = 0.618033988749895
-        
-        for i in range(n):
-            hue = (i * golden_ratio_conjugate) % 1.0
-            
-            if theme == 'light':
-                # Для светлой темы - более насыщенные цвета
-                saturation = 0.7 + random.uniform(0.1, 0.2)
-                value = 0.7 + random.uniform(0.1, 0.2)
-            elif theme == 'dark':
-                # Для темной темы - более яркие цвета
-                saturation = 0.6 + random.uniform(0.1, 0.2)
-                value = 0.8 + random.uniform(0.1, 0.15)
-            else:  # both
-                # Компромиссный вариант
-                saturation = 0.65 + random.uniform(0.1, 0.2)
-                value = 0.75 + random.uniform(0.1, 0.15)
-            
-            r, g, b = colorsys.hsv_to_rgb(hue, saturation, value)
-            colors.append(QtGui.QColor(int(r * 255), int(g * 255), int(b * 255)))
-        
-        return colors
-    
-    @staticmethod
-    def get_text_color(background_color):
-        """Возвращает черный или белый в зависимости от яркости фона"""
-        luminance = (0.299 * background_color.red() + 
-                    0.587 * background_color.green() + 
-                    0.114 * background_color.blue()) / 255
-        return QtGui.QColor(0, 0, 0) if luminance > 0.55 else QtGui.QColor(255, 255, 255)
+from cache import AggregateCache
+from heartbeat import HeartbeatWriter
+from instrumentation import Instrumentation
+from journal import HeartbeatJournal
+import reports
+from ranges import PrefixSumIndex, previous_range
+from sessions import format_time, now_utc, split_by_day
+from storage import TaskRepository, current_day
+
+logger = logging.getLogger(__name__)
 
 class Ui_MainWindow(object):
     def setupUi(self, MainWindow):
@@ -71,8 +48,32 @@ class Ui_MainWindow(object):
         # Комбобокс для выбора периода диаграммы (добавлен)
         self.chart_period_combo = QtWidgets.QComboBox(parent=self.chart_container)
         self.chart_period_combo.setObjectName("chart_period_combo")
-        self.chart_period_combo.addItems(["День", "Неделя", "Месяц"])
+        self.chart_period_combo.addItems(["День", "Неделя", "Месяц", "Диапазон"])
         self.chart_layout.addWidget(self.chart_period_combo)
+
+        # Границы произвольного диапазона для периода "Диапазон"
+        self.range_layout = QtWidgets.QHBoxLayout()
+        self.range_layout.setObjectName("range_layout")
+        self.range_start_label = QtWidgets.QLabel(parent=self.chart_container)
+        self.range_start_label.setObjectName("range_start_label")
+        self.range_layout.addWidget(self.range_start_label)
+
+        self.dateEdit_start = QtWidgets.QDateEdit(self.chart_container)
+        self.dateEdit_start.setDate(QtCore.QDate.currentDate().addDays(-6))
+        self.dateEdit_start.setObjectName(u"dateEdit_start")
+        self.dateEdit_start.setCalendarPopup(True)
+        self.range_layout.addWidget(self.dateEdit_start)
+
+        self.range_end_label = QtWidgets.QLabel(parent=self.chart_container)
+        self.range_end_label.setObjectName("range_end_label")
+        self.range_layout.addWidget(self.range_end_label)
+
+        self.dateEdit = QtWidgets.QDateEdit(self.chart_container)
+        self.dateEdit.setDate(QtCore.QDate.currentDate())
+        self.dateEdit.setObjectName(u"dateEdit")
+        self.dateEdit.setCalendarPopup(True)
+        self.range_layout.addWidget(self.dateEdit)
+        self.chart_layout.addLayout(self.range_layout)
         
         # Виджет для самой диаграммы (будет заполнен в MainWindow)
         self.chart_widget = QtWidgets.QWidget(parent=self.chart_container)
@@ -101,12 +102,6 @@ class Ui_MainWindow(object):
         self.progress_hour_week.setObjectName("progress_hour_week")
         self.gridLayout.addWidget(self.progress_hour_week, 4, 2, 1, 1)
         
-        self.dateEdit = QtWidgets.QDateEdit(self.centralwidget)
-        self.dateEdit.setDate(QtCore.QDate.currentDate())
-        self.dateEdit.setObjectName(u"dateEdit")
-        self.dateEdit.setCalendarPopup(True)
-        self.gridLayout.addWidget(self.dateEdit, 0, 2, 1, 1)
-
         self.time_number = QtWidgets.QLCDNumber(parent=self.centralwidget)
         self.time_number.setEnabled(True)
         self.time_number.setMode(QtWidgets.QLCDNumber.Mode.Oct)
@@ -126,6 +121,10 @@ class Ui_MainWindow(object):
         self.refresh_chart_button = QtWidgets.QPushButton(parent=self.centralwidget)
         self.refresh_chart_button.setObjectName("refresh_chart_button")
         self.gridLayout.addWidget(self.refresh_chart_button, 5, 0, 1, 1)
+
+        self.analytics_button = QtWidgets.QPushButton(parent=self.centralwidget)
+        self.analytics_button.setObjectName("analytics_button")
+        self.gridLayout.addWidget(self.analytics_button, 5, 2, 1, 1)
         
         MainWindow.setCentralWidget(self.centralwidget)
         self.menubar = QtWidgets.QMenuBar(parent=MainWindow)
@@ -146,35 +145,123 @@ class Ui_MainWindow(object):
         self.label_2.setText(_translate("MainWindow", "Часов в среднем на день выполнено:"))
         self.label.setText(_translate("MainWindow", "Часов на неделе выполнено:"))
         self.refresh_chart_button.setText(_translate("MainWindow", "Обновить диаграмму"))
+        self.analytics_button.setText(_translate("MainWindow", "Аналитика"))
+        self.range_start_label.setText(_translate("MainWindow", "с"))
+        self.range_end_label.setText(_translate("MainWindow", "по"))
 
 class MainWindow(QtWidgets.QMainWindow):
-    def __init__(self):
+    # Слоты, время которых замеряется при TIME_TRACK_PROFILE
+    # (все подключенные к сигналам и вызываемые из событий окна, кроме тика)
+    INSTRUMENTED_SLOTS = ('finish_startup', 'update_chart', 'change_current_type_event', 'on_start_pause',
+                          'on_visibility_changed', 'run_idle_maintenance', 'open_analytics',
+                          'dump_instrumentation', 'show_instrumentation_summary')
+    # Обработчик тика секундомера
+    TICK_SLOT = 'update_display'
+    # Тик ставится чуть позже границы секунды, чтобы не прийти до нее
+    TICK_MARGIN_MS = 5
+    # Как часто по умолчанию продлевать интервал работы в БД, секунд
+    DEFAULT_HEARTBEAT_SECONDS = 10
+    # Сколько секунд пауза ждет записи очереди пульсов в БД
+    FLUSH_TIMEOUT_SECONDS = 2
+    # Через сколько секунд паузы начинается обслуживание БД (архив и incremental_vacuum)
+    IDLE_MAINTENANCE_SECONDS = 60
+    # Шаги обслуживания короткие и не задерживают интерфейс: за шаг
+    # сворачивается один месяц и освобождается VACUUM_PAGES страниц
+    ARCHIVE_MONTHS = 1
+    VACUUM_PAGES = 256
+    # Пока другой процесс пишет в базу, шаг обслуживания не ждет его, а
+    # откладывается до следующего запуска таймера
+    MAINTENANCE_BUSY_TIMEOUT_MS = 0
+
+    def __init__(self, repository=None, instrumentation=None):
         super().__init__()
         self.ui = Ui_MainWindow()
         self.ui.setupUi(self)
 
-        # Настройка секундомера
+        # Замеры задержек включаются переменной окружения TIME_TRACK_PROFILE
+        self.instrumentation = instrumentation if instrumentation is not None else Instrumentation.from_environment()
+
+        # Все обращения к БД идут через одно соединение репозитория
+        self.repository = repository if repository is not None else TaskRepository()
+        # Каждый тик дописывается в журнал; тики, не дошедшие до БД из-за
+        # аварийного завершения, восстанавливаются до загрузки данных
+        self.journal = HeartbeatJournal(self.repository.db_path + HeartbeatJournal.SUFFIX)
+        self.journal.replay(self.repository)
+        # Пульсы таймера пишутся в БД фоновым потоком
+        self.heartbeat_writer = HeartbeatWriter(self.repository.db_path, instrumentation=self.instrumentation,
+                                                journal=self.journal, repository=self.repository)
+        # Суммы для прогресс-баров держим в памяти
+        self.aggregate_cache = AggregateCache(self.repository, self.heartbeat_writer)
+        # Префиксные суммы для произвольных диапазонов строятся при первом обращении
+        self.range_index = PrefixSumIndex(self.repository, self.heartbeat_writer)
+
+        # Обертки замеров ставятся до подключения сигналов
+        if self.instrumentation is not None:
+            self.init_instrumentation()
+
+        # Настройка секундомера: тик перепланируется после каждого срабатывания,
+        # см. schedule_tick
         self.timer = QtCore.QTimer(self)
+        self.timer.setSingleShot(True)
         self.timer.timeout.connect(self.update_display)
-        self.timer.setInterval(1000)
+
+        # Обслуживание БД выполняется, пока таймер на паузе, см. run_idle_maintenance
+        self.maintenance_timer = QtCore.QTimer(self)
+        self.maintenance_timer.setSingleShot(True)
+        self.maintenance_timer.setTimerType(QtCore.Qt.TimerType.CoarseTimer)
+        self.maintenance_timer.timeout.connect(self.run_idle_maintenance)
 
         self.elapsed_timer = QtCore.QElapsedTimer()
         self.offset = 0
         self.is_running = False
         self.last_update_time = 0
+        # День (UTC), за который секундомер показывает сумму
+        self.counter_day = None
+
+        # Открытый интервал работы: тип задачи, начало и уже учтенный конец (UTC)
+        self.session_event = None
+        self.session_start = None
+        self.session_end = None
 
         self.ui.time_number.display("00:00:00")
         self.ui.time_number.setDigitCount(9) 
         self.ui.time_number.setMode(QtWidgets.QLCDNumber.Mode.Dec)
         self.ui.start_button.clicked.connect(self.on_start_pause)
         self.ui.refresh_chart_button.clicked.connect(self.update_chart)
+        self.ui.analytics_button.clicked.connect(self.open_analytics)
         self.ui.chart_period_combo.currentIndexChanged.connect(self.update_chart)
-
-        # Инициализация диаграммы
-        self.init_chart()
+        self.ui.dateEdit_start.dateChanged.connect(self.update_chart)
+        self.ui.dateEdit.dateChanged.connect(self.update_chart)
 
         # Читаем конфиг и задаем значения для комбобокса
         self.config_data = self.read_config()
+        self.heartbeat_seconds = self.config_data.get('heartbeat_seconds', self.DEFAULT_HEARTBEAT_SECONDS)
+        # Старые дневные суммы сворачиваются в архив по ключу retention
+        self.retention = self.config_data.get('retention', {})
+        if self.retention.get('archive_path'):
+            self.repository.attach_archive(self.retention['archive_path'])
+        # Локальный JSON API для дашбордов включается ключом api_port
+        self.api_server = None
+        if self.config_data.get('api_port'):
+            from api import SnapshotServer
+
+            self.api_server = SnapshotServer(self.config_data['api_port'])
+            if not self.api_server.start():
+                # Порт занят: приложение работает без API
+                logger.warning("API отключен: порт %s недоступен", self.config_data['api_port'])
+                self.api_server = None
+        # Последний выведенный на табло текст
+        self.display_text = None
+
+        # Аналитика (numpy) загружается при первом открытии окна аналитики
+        self.analytics_series = None
+        self.analytics_window = None
+
+        # Диаграмма создается после первой отрисовки окна, см. finish_startup
+        self.chart = None
+        self.chart_view = None
+        self.chart_model = None
+        self.startup_finished = False
 
         for event_name, hour_week in self.config_data['type_events'].items():
             self.ui.type_combo_box.addItem(event_name)
@@ -182,14 +269,67 @@ class MainWindow(QtWidgets.QMainWindow):
         self.ui.type_combo_box.currentIndexChanged.connect(self.change_current_type_event)
         self.ui.type_combo_box.setCurrentIndex(0)
 
+        # Данные и диаграмма загружаются, когда окно уже показано
+        QtCore.QTimer.singleShot(0, self.finish_startup)
+
+    def finish_startup(self):
+        """Загружает данные и строит диаграмму после первой отрисовки окна"""
+        log_startup_phase("первая отрисовка")
+
         # Загружаем данные для начального типа события
         self.change_current_type_event()
-        
+        log_startup_phase("данные прогресс-баров")
+
+        self.init_chart()
+        log_startup_phase("импорт и создание диаграммы")
+
         # Обновляем диаграмму при запуске
         self.update_chart()
+        self.startup_finished = True
+        self.publish_snapshot()
+        self.schedule_idle_maintenance()
+        log_startup_phase("диаграмма заполнена")
+
+    def init_instrumentation(self):
+        """Оборачивает обращения к БД и слоты замерами, выводит сводку в строку состояния"""
+        self.instrumentation.instrument_object(self.repository, 'db')
+        self.instrumentation.instrument_connection(self.repository.connection)
+        self.instrumentation.instrument_object(self, 'slot', self.INSTRUMENTED_SLOTS)
+        setattr(self, self.TICK_SLOT,
+                self.instrumentation.wrap_tick(getattr(self, self.TICK_SLOT), f'slot.{self.TICK_SLOT}'))
+
+        # Последняя выведенная сводка: ее можно заменять новой
+        self.instrumentation_message = None
+        self.instrumentation_timer = QtCore.QTimer(self)
+        self.instrumentation_timer.timeout.connect(self.show_instrumentation_summary)
+        self.instrumentation_timer.start(5000)
+
+        # Выгрузка замеров по запросу
+        self.dump_shortcut = QtGui.QShortcut(QtGui.QKeySequence("Ctrl+Shift+P"), self)
+        self.dump_shortcut.activated.connect(self.dump_instrumentation)
+
+    def show_instrumentation_summary(self):
+        """Показывает p50/p99 тика и обращений к БД в строке состояния"""
+        message = self.ui.statusbar.currentMessage()
+        if message and message != self.instrumentation_message:
+            # Не перекрываем сообщение о сбое записи, архиве или выгрузке,
+            # пока оно не скрылось по таймауту
+            return
+        self.instrumentation_message = self.instrumentation.summary(f'slot.{self.TICK_SLOT}')
+        self.ui.statusbar.showMessage(self.instrumentation_message)
+
+    def dump_instrumentation(self):
+        """Выгружает замеры в JSON-файл"""
+        path = self.instrumentation.dump()
+        if path is not None:
+            self.ui.statusbar.showMessage(f"Замеры сохранены в {path}", 5000)
 
     def init_chart(self):
         """Инициализация диаграммы"""
+        # QtCharts импортируется лениво: это заметная часть времени запуска
+        from PyQt6.QtCharts import QChart, QChartView
+        from chart_model import ColorPalette, PieChartModel
+
         self.chart = QChart()
         self.chart.setTitle("Распределение времени")
         #self.chart.setAnimationOptions(QChart.AnimationOption.SeriesAnimations)
@@ -201,6 +341,10 @@ class MainWindow(QtWidgets.QMainWindow):
         layout.addWidget(self.chart_view)
         self.ui.chart_widget.setLayout(layout)
 
+        # Цвета закрепляются за типами задач в порядке из конфига
+        palette = ColorPalette(self.config_data['type_events'].keys())
+        self.chart_model = PieChartModel(self.chart, palette)
+
     def read_config(self, config_path='config.json'):
         with open(config_path, mode='r') as f:
             return json.load(f)
@@ -212,111 +356,159 @@ class MainWindow(QtWidgets.QMainWindow):
         Args:
             period: 'День', 'Неделя' или 'Месяц'
         """
-        connection = sqlite3.connect('main.db')
-        connection.row_factory = sqlite3.Row
-        cursor = connection.cursor()
-        
-        if period == 'День':
-            cursor.execute("""
-                SELECT event_name, SUM(complite_sec) as total_seconds 
-                FROM tasks 
-                WHERE date_day = date('now')
-                GROUP BY event_name
-            """)
-        elif period == 'Неделя':
-            cursor.execute("""
-                SELECT event_name, SUM(complite_sec) as total_seconds 
-                FROM tasks 
-                WHERE date_day >= date('now', '-6 days') AND date_day <= date('now')
-                GROUP BY event_name
-            """)
-        elif period == 'Месяц':
-            cursor.execute("""
-                SELECT event_name, SUM(complite_sec) as total_seconds 
-                FROM tasks 
-                WHERE date_day >= date('now', '-30 days') AND date_day <= date('now')
-                GROUP BY event_name
-            """)
-        
-        results = cursor.fetchall()
-        connection.close()
-        
-        # Преобразуем в словарь
-        data = {}
-        total_seconds = 0
-        for row in results:
-            data[row['event_name']] = row['total_seconds']
-            total_seconds += row['total_seconds']
-        
-        # Добавляем "Неучтенное время" (разница до 24 часов)
-        if period == 'День':
-            remaining_time = 24 * 3600 - total_seconds
-            if remaining_time > 0:
-                data['Неучтенное время'] = remaining_time
-                total_seconds += remaining_time
-        elif period == 'Неделя':
-            remaining_time = 7 * 24 * 3600 - total_seconds
-            if remaining_time > 0:
-                data['Неучтенное время'] = remaining_time
-                total_seconds += remaining_time
-        elif period == 'Месяц':
-            # Для месяца не добавляем неучтенное время
-            pass
-        
-        return data, total_seconds
+        # День и неделя целиком лежат в кэше, в том числе еще не записанные пульсы
+        if period in self.aggregate_cache.PERIOD_DAYS:
+            results = self.aggregate_cache.period_totals(period)
+        else:
+            results = reports.period_totals(self.repository, period)
+
+        # Для дня и недели добавляется "Неучтенное время"
+        return reports.pad_period(period, results)
+
+    def get_range_data(self, start, end):
+        """
+        Получает данные за произвольный диапазон дат
+
+        Returns:
+            словарь {тип задачи: секунды}, сумма секунд, сумма секунд
+            за предыдущий диапазон той же длины и архивные месяцы, которые
+            диапазоны захватывают не целиком (суммы тогда приблизительны)
+        """
+        self.range_index.check_external_changes()
+        data = self.range_index.range_totals(start, end)
+        previous = previous_range(start, end)
+        previous_total = sum(self.range_index.range_totals(*previous).values())
+        partial_months = sorted({*self.range_index.partial_archive_months(start, end),
+                                 *self.range_index.partial_archive_months(*previous)})
+        return data, sum(data.values()), previous_total, partial_months
 
     def update_chart(self):
         """Обновление круговой диаграммы"""
+        if self.chart_model is None:
+            # Диаграмма еще не создана, она заполнится в finish_startup
+            return
+
         period = self.ui.chart_period_combo.currentText()
-        data, total_seconds = self.get_period_data(period)
-        
-        # Удаляем старые серии
-        self.chart.removeAllSeries()
-        
-        if not data:
-            # Нет данных - показываем пустую диаграмму
-            self.chart.setTitle(f"{period}: Нет данных")
+        is_range = period == 'Диапазон'
+        self.ui.dateEdit_start.setEnabled(is_range)
+        self.ui.dateEdit.setEnabled(is_range)
+
+        if not is_range:
+            data, total_seconds = self.get_period_data(period)
+            self.chart_model.update(period, data, total_seconds)
+            return
+
+        start = self.ui.dateEdit_start.date().toPyDate()
+        end = self.ui.dateEdit.date().toPyDate()
+        if start > end:
+            start, end = end, start
+        data, total_seconds, previous_total, partial_months = self.get_range_data(start, end)
+
+        label = f"{start:%d.%m.%Y} - {end:%d.%m.%Y}"
+        difference = (total_seconds - previous_total) / 3600
+        title = f"{label}: {total_seconds/3600:.1f} часов ({difference:+.1f} ч. к предыдущему периоду)"
+        if partial_months:
+            # Внутри архивного месяца нет разбивки по дням (см. retention.py)
+            title += ", приблизительно: архивные месяцы захвачены не целиком"
+        self.chart_model.update(label, data, total_seconds, title)
+
+    def publish_snapshot(self):
+        """Публикует для API текущий тип задачи, счетчик и суммы за периоды"""
+        if self.api_server is None or not self.startup_finished:
+            # До конца запуска данные еще не загружены
+            return
+
+        # Месяц берется из префиксных сумм: запись другого процесса
+        # (импорт, retention.py) должна попасть и в него
+        self.range_index.check_external_changes()
+        event_name = self.session_event or self.ui.type_combo_box.currentText()
+        end = current_day()
+        periods = {}
+        for period, days_back in TaskRepository.PERIOD_DAYS.items():
+            start = end - timedelta(days=days_back)
+            if period in self.aggregate_cache.PERIOD_DAYS:
+                data, total_seconds = self.get_period_data(period)
+            else:
+                # Длинные периоды - из префиксных сумм в памяти, без запроса к БД
+                data, total_seconds = reports.pad_period(period, self.range_index.range_totals(start, end))
+            periods[period] = reports.build_report(period, start, end, data, total_seconds,
+                                                   partial_months=self.range_index.partial_archive_months(start, end))
+
+        self.api_server.publish({
+            'running': self.is_running,
+            'event_name': event_name,
+            'counter_seconds': self.aggregate_cache.today_seconds(event_name),
+            'session_start': format_time(self.session_start) if self.session_event is not None else None,
+            'periods': periods,
+        })
+
+    def open_analytics(self):
+        """Открывает окно аналитики; история загружается при первом открытии"""
+        if self.analytics_window is None:
+            try:
+                from analytics import DailySeries
+                from analytics_view import AnalyticsWindow
+            except ImportError:
+                QtWidgets.QMessageBox.warning(self, "Аналитика", "Для аналитики нужен пакет numpy:\npip install numpy")
+                return
+
+            self.analytics_series = DailySeries(self.repository, self.heartbeat_writer,
+                                                self.config_data['type_events'].keys())
+            self.analytics_window = AnalyticsWindow(self.analytics_series, self.config_data['type_events'], self)
+
+        self.analytics_window.show()
+        self.analytics_window.raise_()
+        self.analytics_window.activateWindow()
+
+    def refresh_analytics(self):
+        """Пересчитывает открытое окно аналитики"""
+        if self.analytics_window is not None:
+            self.analytics_window.refresh()
+
+    def schedule_idle_maintenance(self, delay=None):
+        """Планирует обслуживание БД через delay секунд паузы"""
+        if delay is None:
+            delay = self.IDLE_MAINTENANCE_SECONDS
+        self.maintenance_timer.start(int(delay * 1000))
+
+    def run_idle_maintenance(self):
+        """
+        Шаг обслуживания БД на паузе: сворачивает в архив самый старый месяц
+        сверх retention.keep_months, а когда архивировать нечего, возвращает
+        системе свободные страницы файла
+        """
+        if self.is_running:
             return
-        
-        # Создаем новую серию
-        series = QPieSeries()
-        series.setLabelsVisible(True)
-        
-        # Генерируем цвета
-        colors = SimpleColorGenerator.get_colors(len(data))
-        
-        for (label, value), color in zip(data.items(), colors):
-            # Преобразуем секунды в проценты
-            percentage = (value / total_seconds * 100) if total_seconds > 0 else 0
-            
-            # Преобразуем секунды в часы для отображения
-            hours = value / 3600
-            
-            slice = QPieSlice(f"{percentage:.1f}% {hours:.1f} ч.", percentage)
-            slice.setColor(color)
-            
-            # Настройка отображения текста
-            slice.setLabelVisible(True)
-            slice.setLabelPosition(QPieSlice.LabelPosition.LabelInsideNormal)
-            
-            # Подключаем обработчик наведения
-            slice.setLabelFont(QtGui.QFont("Arial", 10))
-            #slice.hovered.connect(lambda state, s=slice: self.on_slice_hovered(state, s))
-            
-            series.append(slice)
-        
-        # Добавляем серию на диаграмму
-        self.chart.addSeries(series)
-        self.chart.setTitle(f"{period}: {total_seconds/3600:.1f} часов")
-        
-        # Настройка легенды
-        self.chart.legend().setVisible(True)
-        self.chart.legend().setAlignment(QtCore.Qt.AlignmentFlag.AlignRight)
-        self.chart_view.chart().legend().setFont(QtGui.QFont("Arial", 8))
-        labels = list(data.keys())
-        for i, marker in enumerate(self.chart.legend().markers()):
-            if i < len(data):
-                marker.setLabel(labels[i])
+
+        keep_months = self.retention.get('keep_months')
+        try:
+            with self.repository.busy_timeout(self.MAINTENANCE_BUSY_TIMEOUT_MS):
+                if keep_months:
+                    deleted, _ = self.repository.archive_old_days(keep_months, self.ARCHIVE_MONTHS)
+                    if deleted:
+                        self.invalidate_history()
+                        self.ui.statusbar.showMessage(f"В архив свернуто дневных записей: {deleted}", 5000)
+                        # Следующий шаг - после обработки накопившихся событий окна
+                        self.schedule_idle_maintenance(1)
+                        return
+
+                remaining = self.repository.incremental_vacuum(self.VACUUM_PAGES)
+        except sqlite3.Error as error:
+            # База занята другим процессом или недоступна: повторим позже.
+            # Месяц мог успеть свернуться до ошибки переноса в архивную базу
+            logger.warning("Обслуживание БД отложено: %s", error)
+            self.invalidate_history()
+            self.schedule_idle_maintenance()
+            return
+
+        if remaining:
+            self.schedule_idle_maintenance(1)
+
+    def invalidate_history(self):
+        """Сбрасывает индексы истории после изменения старых дней (архивные месяцы выглядят одним днем)"""
+        self.range_index.invalidate()
+        if self.analytics_series is not None:
+            self.analytics_series.invalidate()
 
     def on_slice_hovered(self, state, slice):
         """Обработчик наведения на сектор"""
@@ -332,90 +524,121 @@ class MainWindow(QtWidgets.QMainWindow):
             self.ui.type_combo_box.setItemText(indx, event_name)
             self.change_current_type_event()
 
-    def update_today_data(self, event_name, complite_sec):
-        """Обновляет данные в БД с указанным количеством секунд"""
-        connection = sqlite3.connect('main.db')
-        cursor = connection.cursor()
-
-        cursor.execute("SELECT complite_sec FROM tasks WHERE event_name=? AND date_day = date('now');", (event_name,))
-        result = cursor.fetchone()
-        
-        current_seconds = result[0] if result else 0
-        
-        if complite_sec != current_seconds:
-            cursor.execute("""
-                UPDATE tasks 
-                SET complite_sec=?, last_update=?
-                WHERE event_name=? AND date_day = date('now');
-            """, (complite_sec, datetime.now().isoformat(), event_name))
-            
-            connection.commit()
-        
-        connection.close()
-
-    def get_today_data_for_type(self, event_name):
-        connection = sqlite3.connect('main.db')
-        connection.row_factory = sqlite3.Row
-        cursor = connection.cursor()
-
-        cursor.execute("SELECT * FROM tasks WHERE event_name=? AND date_day = date('now');", (event_name,))
-        results = cursor.fetchall()
+    def open_session(self, event_name):
+        """Начинает новый интервал работы"""
+        self.session_event = event_name
+        self.session_start = now_utc()
+        self.session_end = self.session_start
 
-        if len(results) == 0:
-            cursor.execute("""
-                INSERT INTO tasks (event_name, date_day, complite_sec, hour_week_limit, start_datetime, last_update)
-                VALUES (?, date('now'), 0, ?, NULL, NULL);
-            """, (event_name, self.config_data['type_events'][event_name]))
+    def extend_session(self, closed=False):
+        """
+        Продлевает открытый интервал до текущего момента и ставит его в очередь записи
 
-            connection.commit()
-            connection.close()
-            
-            return self.get_today_data_for_type(event_name)
-        
-        connection.close()
-        return results
-    
-    def get_last_week_data_for_type(self, event_name):
-        connection = sqlite3.connect('main.db')
-        connection.row_factory = sqlite3.Row
-        cursor = connection.cursor()
-
-        cursor.execute("""
-            SELECT * FROM tasks 
-            WHERE event_name=? AND date_day >= date('now', '-6 days') AND date_day <= date('now');
-        """, (event_name,))
-        results = cursor.fetchall()
-        connection.close()
-            
-        return results
+        Returns:
+            список (день, секунды) с приростом по суткам
+        """
+        if self.session_event is None:
+            return []
+
+        end = now_utc()
+        parts = split_by_day(self.session_end, end)
+        for day, seconds in parts:
+            self.aggregate_cache.add(self.session_event, seconds, day)
+            self.range_index.add(self.session_event, seconds, day)
+            if self.analytics_series is not None:
+                self.analytics_series.add(self.session_event, seconds, day)
+
+        self.heartbeat_writer.submit_session(
+            self.session_event, self.session_start, end,
+            self.config_data['type_events'].get(self.session_event), closed,
+        )
+        self.session_end = end
+        if closed:
+            self.session_event = None
+        return parts
 
     def change_current_type_event(self):
         current_type = self.ui.type_combo_box.currentText()
         if current_type and current_type in self.config_data['type_events']:
-            max_week_hour_for_type = self.config_data['type_events'][current_type]
-            today_data = self.get_today_data_for_type(current_type)
-            last_week_data = self.get_last_week_data_for_type(current_type)
-            
-            completed_seconds_today = today_data[0]["complite_sec"] if today_data else 0
-            self.ui.progress_hour_day.setValue(completed_seconds_today)
-            
-            sum_week_secs = sum(d["complite_sec"] for d in last_week_data)
-            self.ui.progress_hour_week.setValue(sum_week_secs)
-
-            daily_max_seconds = int((max_week_hour_for_type * 3600) / 7)
-            weekly_max_seconds = max_week_hour_for_type * 3600
-            
-            self.ui.progress_hour_day.setMaximum(daily_max_seconds)
-            self.ui.progress_hour_week.setMaximum(weekly_max_seconds)
+            # Смена типа на ходу закрывает интервал прежнего типа
+            if self.is_running and self.session_event != current_type:
+                self.extend_session(closed=True)
+                self.open_session(current_type)
+
+            self.aggregate_cache.check_external_changes()
+            self.show_progress(current_type)
+            self.reset_counter(current_type)
+            self.publish_snapshot()
+
+    def reset_counter(self, event_name):
+        """Выставляет секундомер на сумму за сегодня по типу задачи"""
+        self.counter_day = current_day()
+        completed_seconds_today = self.aggregate_cache.today_seconds(event_name)
+
+        self.offset = completed_seconds_today * 1000
+        self.last_update_time = completed_seconds_today
+        self.show_time(completed_seconds_today)
+        self.elapsed_timer.restart()
+
+    def show_time(self, total_seconds):
+        """Выводит время на табло, если текст изменился"""
+        hours = int(total_seconds // 3600)
+        minutes = int((total_seconds % 3600) // 60)
+        seconds = int(total_seconds % 60)
 
-            self.offset = completed_seconds_today * 1000
-            hours = int(completed_seconds_today // 3600)
-            minutes = int((completed_seconds_today % 3600) // 60)
-            seconds = int(completed_seconds_today % 60)
-            
-            text = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+        text = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+        if text != self.display_text:
+            self.display_text = text
             self.ui.time_number.display(text)
-            self.elapsed_timer.restart()
+
+    def is_display_visible(self):
+        """Окно показано и не свернуто"""
+        return self.isVisible() and not self.isMinimized()
+
+    def schedule_tick(self):
+        """
+        Планирует следующий тик секундомера
+
+        В видимом окне тик приходится сразу после границы очередной секунды
+        отсчета, поэтому табло не отстает и не пропускает секунды. В скрытом
+        или свернутом окне тик нужен только для продления интервала в БД
+        раз в heartbeat_seconds секунд.
+        """
+        if not self.is_running:
+            return
+        elapsed = self.elapsed_timer.elapsed() + self.offset
+        if self.is_display_visible():
+            delay = 1000 - elapsed % 1000 + self.TICK_MARGIN_MS
+            self.timer.setTimerType(QtCore.Qt.TimerType.PreciseTimer)
+        else:
+            delay = max(1000, (self.last_update_time + self.heartbeat_seconds) * 1000 - elapsed + self.TICK_MARGIN_MS)
+            self.timer.setTimerType(QtCore.Qt.TimerType.CoarseTimer)
+        if self.instrumentation is not None:
+            self.instrumentation.expect_tick(delay / 1000)
+        self.timer.start(int(delay))
+
+    def on_visibility_changed(self):
+        """Переключает частоту тиков; при разворачивании окна догоняет табло"""
+        if not self.is_running:
+            return
+        if self.is_display_visible():
+            self.update_display()
+            if self.ui.chart_period_combo.currentText() == 'День':
+                self.update_chart()
+        else:
+            self.schedule_tick()
+
+    def show_progress(self, event_name):
+        """Обновляет прогресс-бары по данным кэша, без обращения к БД"""
+        max_week_hour_for_type = self.config_data['type_events'][event_name]
+        daily_max_seconds = int((max_week_hour_for_type * 3600) / 7)
+        weekly_max_seconds = max_week_hour_for_type * 3600
+
+        self.ui.progress_hour_day.setMaximum(daily_max_seconds)
+        self.ui.progress_hour_week.setMaximum(weekly_max_seconds)
+
+        self.ui.progress_hour_day.setValue(self.aggregate_cache.today_seconds(event_name))
+        self.ui.progress_hour_week.setValue(self.aggregate_cache.week_seconds(event_name))
 
     def update_display(self):
         """Обновление отображения времени"""
@@ -426,22 +649,34 @@ class MainWindow(QtWidgets.QMainWindow):
         total_seconds = elapsed / 1000.0
         
         current_time = int(total_seconds)
-        if current_time >= self.last_update_time + 10:
-            current_type = self.ui.type_combo_box.currentText()
-            if current_type and current_type in self.config_data['type_events']:
-                self.update_today_data(current_type, current_time)
+        visible = self.is_display_visible()
+        if self.session_event is not None:
+            # Тик в журнал - до пульса, чтобы пульс покрывал все записанные тики
+            self.journal.append(self.session_event, self.session_start, now_utc())
+        if current_time >= self.last_update_time + self.heartbeat_seconds:
+            current_type = self.session_event
+            if current_type is not None:
+                self.aggregate_cache.check_external_changes()
+                self.extend_session()
                 self.last_update_time = current_time
-                self.change_current_type_event()
+                if current_day() != self.counter_day:
+                    # Наступили новые сутки: секундомер показывает новый день. Пульс
+                    # ровно в полночь не делится на части, поэтому сравниваются дни
+                    self.reset_counter(current_type)
+                    total_seconds = self.offset / 1000.0
+                self.show_progress(current_type)
                 # Обновляем диаграмму, если смотрим текущий день
-                #if self.ui.chart_period_combo.currentText() == 'День':
-                    #self.update_chart()
-        
-        hours = int(total_seconds // 3600)
-        minutes = int((total_seconds % 3600) // 60)
-        seconds = int(total_seconds % 60)
-        
-        text = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-        self.ui.time_number.display(text)
+                if visible and self.ui.chart_period_combo.currentText() == 'День':
+                    self.update_chart()
+                # Окно аналитики не зависит от периода диаграммы и свернутого
+                # главного окна; скрытое окно аналитики не пересчитывается
+                self.refresh_analytics()
+                self.publish_snapshot()
+
+        # Скрытое табло догоняется при разворачивании окна
+        if visible:
+            self.show_time(total_seconds)
+        self.schedule_tick()
 
     def on_start_pause(self):
         """Обработчик нажатия кнопки Старт/Пауза"""
@@ -449,32 +684,70 @@ class MainWindow(QtWidgets.QMainWindow):
             self.timer.stop()
             self.is_running = False
             self.ui.start_button.setText("Старт")
+            self.schedule_idle_maintenance()
             
-            current_type = self.ui.type_combo_box.currentText()
-            if current_type and current_type in self.config_data['type_events']:
-                elapsed = self.elapsed_timer.elapsed() + self.offset
-                completed_seconds = int(elapsed / 1000)
-                self.update_today_data(current_type, completed_seconds)
+            current_type = self.session_event
+            if current_type is not None:
+                self.extend_session(closed=True)
+                self.show_progress(current_type)
+                # Дожидаемся записи, чтобы диаграмма увидела свежие данные, но не
+                # дольше FLUSH_TIMEOUT_SECONDS: при ошибке записи очередь остается
+                # в HeartbeatWriter и записывается повторно, а окно не зависает
+                if not self.heartbeat_writer.flush(self.FLUSH_TIMEOUT_SECONDS):
+                    self.ui.statusbar.showMessage(
+                        "Не удалось сохранить время в БД, запись будет повторена", 10000)
                 # Обновляем диаграмму
                 self.update_chart()
+                self.refresh_analytics()
+                self.publish_snapshot()
         else:
+            current_type = self.ui.type_combo_box.currentText()
+            if current_type and current_type in self.config_data['type_events']:
+                self.open_session(current_type)
+                self.reset_counter(current_type)
+            self.maintenance_timer.stop()
             self.elapsed_timer.start()
-            self.timer.start()
             self.is_running = True
+            self.schedule_tick()
             self.ui.start_button.setText("Пауза")
-            self.last_update_time = 0
+            self.publish_snapshot()
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.on_visibility_changed()
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self.on_visibility_changed()
+
+    def changeEvent(self, event):
+        super().changeEvent(event)
+        if event.type() == QtCore.QEvent.Type.WindowStateChange:
+            self.on_visibility_changed()
+
+    def closeEvent(self, event):
+        """Дописывает очередь пульсов и закрывает соединение с БД"""
+        if self.is_running:
+            self.extend_session(closed=True)
+        if self.api_server is not None:
+            self.api_server.stop()
+        self.heartbeat_writer.close()
+        self.journal.close()
+        self.repository.close()
+        if self.instrumentation is not None:
+            self.instrumentation.dump()
+        super().closeEvent(event)
 
 if __name__ == "__main__":
-    # Инициализация базы данных
-    conn = sqlite3.connect('main.db')
-    
-    with open('init.sql', 'r') as f:
-        schema = f.read()
-        conn.executescript(schema)
-    
-    conn.close()
+    log_startup_phase("импорт модулей")
+
+    # Инициализация базы данных; миграции пропускаются, если схема актуальна
+    repository = TaskRepository('main.db')
+    repository.migrate()
+    log_startup_phase("открытие БД")
 
     app = QtWidgets.QApplication(sys.argv)
-    window = MainWindow()
+    window = MainWindow(repository)
     window.show()
+    log_startup_phase("окно создано")
     sys.exit(app.exec())
\ No newline at end of file
@@ -0,0 +1,183 @@
+"""Версионные миграции схемы main.db
+
+Текущая версия схемы хранится в PRAGMA user_version. Каждая миграция
+выполняется в отдельной транзакции вместе с повышением версии, поэтому
+прерванное обновление не оставляет базу в промежуточном состоянии.
+"""
+import os
+
+import rollups
+
+INIT_SQL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'init.sql')
+
+
+def _read_init_sql():
+    with open(INIT_SQL_PATH, mode='r') as f:
+        return f.read()
+
+
+# v2: уникальный ключ (event_name, date_day) и покрывающие индексы.
+# Возможные дубли за один день сливаются: complite_sec - накопительный
+# счетчик, поэтому берется максимальное значение.
+MIGRATION_V2 = """
+CREATE TABLE tasks_v2 (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    event_name           text,
+    date_day         date,
+    complite_sec       int,
+    hour_week_limit    int,
+    start_datetime      datetime,
+    last_update     datetime,
+    UNIQUE (event_name, date_day)
+);
+
+INSERT INTO tasks_v2 (event_name, date_day, complite_sec, hour_week_limit, start_datetime, last_update)
+SELECT event_name, date_day, COALESCE(MAX(complite_sec), 0), MAX(hour_week_limit),
+       MIN(start_datetime), MAX(last_update)
+FROM tasks
+GROUP BY event_name, date_day;
+
+DROP TABLE tasks;
+ALTER TABLE tasks_v2 RENAME TO tasks;
+
+-- Выборки за период: диапазон по дате, группировка по типу
+CREATE INDEX idx_tasks_day_event ON tasks (date_day, event_name, complite_sec);
+-- Выборки по одному типу задачи за диапазон дат
+CREATE INDEX idx_tasks_event_day ON tasks (event_name, date_day, complite_sec);
+"""
+
+# v3: агрегаты по ISO-неделям и месяцам, поддерживаемые триггерами.
+# Неделя обозначается датой понедельника, месяц - датой первого числа
+MIGRATION_V3 = """
+CREATE TABLE rollup_week (
+    event_name      text,
+    week_start      date,
+    total_sec       int NOT NULL DEFAULT 0,
+    PRIMARY KEY (week_start, event_name)
+) WITHOUT ROWID;
+
+CREATE TABLE rollup_month (
+    event_name      text,
+    month_start     date,
+    total_sec       int NOT NULL DEFAULT 0,
+    PRIMARY KEY (month_start, event_name)
+) WITHOUT ROWID;
+
+CREATE TRIGGER tasks_rollup_insert AFTER INSERT ON tasks
+BEGIN
+    INSERT INTO rollup_week (event_name, week_start, total_sec)
+    VALUES (NEW.event_name, date(NEW.date_day, 'weekday 0', '-6 days'), COALESCE(NEW.complite_sec, 0))
+    ON CONFLICT (week_start, event_name) DO UPDATE SET total_sec = total_sec + excluded.total_sec;
+
+    INSERT INTO rollup_month (event_name, month_start, total_sec)
+    VALUES (NEW.event_name, date(NEW.date_day, 'start of month'), COALESCE(NEW.complite_sec, 0))
+    ON CONFLICT (month_start, event_name) DO UPDATE SET total_sec = total_sec + excluded.total_sec;
+END;
+
+CREATE TRIGGER tasks_rollup_delete AFTER DELETE ON tasks
+BEGIN
+    UPDATE rollup_week SET total_sec = total_sec - COALESCE(OLD.complite_sec, 0)
+    WHERE event_name = OLD.event_name AND week_start = date(OLD.date_day, 'weekday 0', '-6 days');
+
+    UPDATE rollup_month SET total_sec = total_sec - COALESCE(OLD.complite_sec, 0)
+    WHERE event_name = OLD.event_name AND month_start = date(OLD.date_day, 'start of month');
+END;
+
+CREATE TRIGGER tasks_rollup_update AFTER UPDATE OF event_name, date_day, complite_sec ON tasks
+BEGIN
+    UPDATE rollup_week SET total_sec = total_sec - COALESCE(OLD.complite_sec, 0)
+    WHERE event_name = OLD.event_name AND week_start = date(OLD.date_day, 'weekday 0', '-6 days');
+
+    UPDATE rollup_month SET total_sec = total_sec - COALESCE(OLD.complite_sec, 0)
+    WHERE event_name = OLD.event_name AND month_start = date(OLD.date_day, 'start of month');
+
+    INSERT INTO rollup_week (event_name, week_start, total_sec)
+    VALUES (NEW.event_name, date(NEW.date_day, 'weekday 0', '-6 days'), COALESCE(NEW.complite_sec, 0))
+    ON CONFLICT (week_start, event_name) DO UPDATE SET total_sec = total_sec + excluded.total_sec;
+
+    INSERT INTO rollup_month (event_name, month_start, total_sec)
+    VALUES (NEW.event_name, date(NEW.date_day, 'start of month'), COALESCE(NEW.complite_sec, 0))
+    ON CONFLICT (month_start, event_name) DO UPDATE SET total_sec = total_sec + excluded.total_sec;
+END;
+""" + rollups.REBUILD_SQL
+
+# v4: журнал интервалов работы. Конец открытого интервала сдвигается
+# пульсами, поэтому отбор по диапазону времени идет по end_datetime
+MIGRATION_V4 = """
+CREATE TABLE sessions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    event_name      text NOT NULL,
+    start_datetime  datetime NOT NULL,
+    end_datetime    datetime NOT NULL,
+    UNIQUE (event_name, start_datetime)
+);
+
+CREATE INDEX idx_sessions_end ON sessions (end_datetime, start_datetime, event_name);
+"""
+
+# v5: архив старых дневных сумм, свернутых до месяцев (см. retention.py),
+# и представление daily_totals - дневные суммы вместе с архивом. Месяц из
+# архива выглядит в нем одним днем - первым числом месяца. batch - время
+# архивации: повторный перенос той же партии в архивную БД ничего не дублирует
+ARCHIVE_MONTH_TABLE = """
+CREATE TABLE IF NOT EXISTS {schema}archive_month (
+    event_name      text,
+    month_start     date,
+    total_sec       int NOT NULL,
+    batch           datetime NOT NULL,
+    PRIMARY KEY (month_start, event_name, batch)
+) WITHOUT ROWID;
+"""
+
+MIGRATION_V5 = ARCHIVE_MONTH_TABLE.format(schema='') + """
+CREATE VIEW daily_totals AS
+SELECT event_name, date_day, complite_sec FROM tasks
+UNION ALL
+SELECT event_name, month_start, total_sec FROM archive_month;
+"""
+
+# Список миграций: (версия, функция, возвращающая SQL-скрипт)
+MIGRATIONS = [
+    (1, _read_init_sql),
+    (2, lambda: MIGRATION_V2),
+    (3, lambda: MIGRATION_V3),
+    (4, lambda: MIGRATION_V4),
+    (5, lambda: MIGRATION_V5),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_version(connection):
+    """Возвращает текущую версию схемы базы"""
+    return connection.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(connection):
+    """
+    Обновляет схему базы до последней версии
+
+    Returns:
+        список примененных версий
+    """
+    applied = []
+    current = get_version(connection)
+    if current >= SCHEMA_VERSION:
+        # Схема актуальна: единственный запрос при обычном запуске
+        return applied
+
+    for version, load_script in MIGRATIONS:
+        if version <= current:
+            continue
+
+        script = f"BEGIN;\n{load_script()}\nPRAGMA user_version = {version};\nCOMMIT;"
+        try:
+            connection.executescript(script)
+        except Exception:
+            if connection.in_transaction:
+                connection.rollback()
+            raise
+
+        applied.append(version)
+
+    return applied
@@ -0,0 +1,154 @@
+"""Суммы за произвольные диапазоны дат через префиксные суммы
+
+Для каждого типа задачи в памяти хранится массив накопленных сумм по дням:
+cumulative[i] - секунды с первого дня истории по день i включительно.
+Сумма за любой диапазон - разность двух элементов, то есть O(1) на тип
+задачи независимо от длины диапазона.
+
+Архивный месяц (см. retention.py) хранится одним днем - первым числом,
+поэтому сумма за диапазон, граница которого попадает внутрь архивного
+месяца, приблизительна (см. partial_archive_months).
+"""
+from array import array
+from datetime import date, timedelta
+
+import retention
+from cache import InMemoryHistory
+
+
+class PrefixSumIndex(InMemoryHistory):
+    """Префиксные суммы секунд по дням для каждого типа задачи"""
+
+    def __init__(self, repository, heartbeat_writer=None):
+        super().__init__(repository, heartbeat_writer)
+        # Дата, соответствующая индексу 0
+        self.origin = None
+        # event_name -> array('q') накопленных сумм
+        self._cumulative = {}
+        # Первые числа архивных месяцев
+        self.archived_months = set()
+
+    def _read(self, unwritten):
+        first_day, last_day = self.repository.get_date_bounds()
+        self.archived_months = self.repository.get_archived_months()
+        if first_day is None:
+            return []
+        return self.repository.get_days_rows(date.fromisoformat(first_day), date.fromisoformat(last_day))
+
+    def _build(self, rows, unwritten):
+        """Строит префиксные суммы по всей истории"""
+        self._cumulative = {}
+        self.origin = None
+        days = [(row['event_name'], date.fromisoformat(row['date_day']), row['complite_sec'] or 0)
+                for row in rows]
+        days.extend(unwritten)
+        if not days:
+            return
+
+        self.origin = min(day for _, day, _ in days)
+        daily = {}
+        for event_name, day, seconds in days:
+            index = (day - self.origin).days
+            values = daily.setdefault(event_name, {})
+            values[index] = values.get(index, 0) + seconds
+
+        for event_name, values in daily.items():
+            cumulative = array('q', bytes(8 * (max(values) + 1)))
+            running = 0
+            for index in range(len(cumulative)):
+                running += values.get(index, 0)
+                cumulative[index] = running
+            self._cumulative[event_name] = cumulative
+
+    def add(self, event_name, seconds, day):
+        """
+        Добавляет прирост секунд за день
+
+        Для последнего дня истории (обычный случай пульса таймера) это O(1),
+        для более раннего дня пересчитывается хвост массива.
+        """
+        if not self._loaded or not seconds:
+            return
+        if self.origin is None or day < self.origin:
+            # День раньше начала истории: проще перестроить индекс
+            self.invalidate()
+            return
+
+        index = (day - self.origin).days
+        cumulative = self._cumulative.setdefault(event_name, array('q'))
+        if index >= len(cumulative):
+            last = cumulative[-1] if cumulative else 0
+            cumulative.extend([last] * (index + 1 - len(cumulative)))
+
+        for i in range(index, len(cumulative)):
+            cumulative[i] += seconds
+
+    def _prefix(self, cumulative, day):
+        """Накопленная сумма по день day включительно"""
+        index = (day - self.origin).days
+        if index < 0:
+            return 0
+        if index >= len(cumulative):
+            return cumulative[-1] if cumulative else 0
+        return cumulative[index]
+
+    def range_seconds(self, event_name, start, end):
+        """Секунды по типу задачи за диапазон [start, end]"""
+        self._ensure_loaded()
+        cumulative = self._cumulative.get(event_name)
+        if cumulative is None or start > end:
+            return 0
+        return self._prefix(cumulative, end) - self._prefix(cumulative, start - timedelta(days=1))
+
+    def range_totals(self, start, end):
+        """
+        Суммы секунд по типам задач за диапазон [start, end]
+
+        Returns:
+            словарь {event_name: секунды} без нулевых значений
+        """
+        self._ensure_loaded()
+        totals = {}
+        if self.origin is None or start > end:
+            return totals
+        before_start = start - timedelta(days=1)
+        for event_name, cumulative in self._cumulative.items():
+            seconds = self._prefix(cumulative, end) - self._prefix(cumulative, before_start)
+            if seconds:
+                totals[event_name] = seconds
+        return totals
+
+    def partial_archive_months(self, start, end):
+        """
+        Архивные месяцы, которые диапазон [start, end] захватывает не целиком
+
+        Returns:
+            отсортированный список первых чисел месяцев (YYYY-MM-DD); если он
+            не пуст, сумма за диапазон приблизительна
+        """
+        self._ensure_loaded()
+        return sorted(retention.partial_months(start, end) & self.archived_months)
+
+    def compare(self, first_range, second_range):
+        """
+        Сравнивает два диапазона дат
+
+        Args:
+            first_range, second_range: пары (start, end)
+
+        Returns:
+            словарь {event_name: (секунды в первом, секунды во втором, разница)}
+        """
+        first = self.range_totals(*first_range)
+        second = self.range_totals(*second_range)
+        return {
+            event_name: (first.get(event_name, 0), second.get(event_name, 0),
+                         second.get(event_name, 0) - first.get(event_name, 0))
+            for event_name in first.keys() | second.keys()
+        }
+
+
+def previous_range(start, end):
+    """Диапазон той же длины, непосредственно предшествующий [start, end]"""
+    length = (end - start).days + 1
+    return start - timedelta(days=length), start - timedelta(days=1)
@@ -0,0 +1,225 @@
+"""Отчеты по учтенному времени без графического интерфейса
+
+Расчет сумм за период (в том числе добавление "Неучтенное время" для дня и
+недели) вынесен сюда из окна приложения, чтобы его можно было использовать
+без импорта PyQt6 - например, в отчетах по cron на сервере без дисплея.
+
+Примеры:
+    python reports.py day
+    python reports.py month --json
+    python reports.py range --start 2024-01-01 --end 2024-03-31 --json
+"""
+import argparse
+import json
+import sqlite3
+import sys
+from datetime import date, timedelta
+from pathlib import Path
+
+import migrations
+import retention
+from ranges import previous_range
+from storage import TaskRepository, current_day
+
+UNACCOUNTED = 'Неучтенное время'
+
+# Длительность периода в секундах: разница до нее с учтенным временем
+# показывается как "Неучтенное время". Для месяца и диапазона не добавляется
+PERIOD_CAPACITY = {
+    'День': 24 * 3600,
+    'Неделя': 7 * 24 * 3600,
+}
+
+# Названия периодов в командной строке
+PERIOD_NAMES = {
+    'day': 'День',
+    'week': 'Неделя',
+    'month': 'Месяц',
+}
+
+
+def pad_period(period, totals):
+    """
+    Добавляет к суммам за период "Неучтенное время"
+
+    Args:
+        period: 'День', 'Неделя' или 'Месяц'
+        totals: словарь {тип задачи: секунды}
+
+    Returns:
+        словарь {название: секунды} и сумма секунд
+    """
+    data = dict(totals)
+    total_seconds = sum(data.values())
+
+    remaining_time = PERIOD_CAPACITY.get(period, 0) - total_seconds
+    if remaining_time > 0:
+        data[UNACCOUNTED] = remaining_time
+        total_seconds += remaining_time
+
+    return data, total_seconds
+
+
+def period_totals(repository, period):
+    """Суммы секунд по типам задач за период из TaskRepository.PERIOD_DAYS"""
+    return {row['event_name']: row['total_seconds'] for row in repository.get_period_rows(period)}
+
+
+def range_totals(repository, start, end):
+    """Суммы секунд по типам задач за диапазон дат включительно без нулевых значений"""
+    return {row['event_name']: row['total_seconds']
+            for row in repository.get_range_rows(start, end) if row['total_seconds']}
+
+
+def partial_archive_months(repository, *ranges):
+    """
+    Архивные месяцы, которые диапазоны дат захватывают не целиком
+
+    Returns:
+        отсортированный список первых чисел месяцев; если он не пуст, суммы
+        приблизительны (см. retention.py)
+    """
+    months = set()
+    for start, end in ranges:
+        months |= retention.partial_months(start, end)
+    return sorted(months & repository.get_archived_months()) if months else []
+
+
+def build_report(label, start, end, data, total_seconds, previous_total=None, partial_months=()):
+    """
+    Собирает отчет в виде словаря, пригодного для JSON
+
+    Args:
+        partial_months: архивные месяцы, захваченные не целиком; отчет
+            помечается как приблизительный
+
+    Returns:
+        словарь с границами периода, суммой и строками по типам задач
+        (по убыванию времени)
+    """
+    events = []
+    for name, seconds in sorted(data.items(), key=lambda item: (-item[1], item[0])):
+        events.append({
+            'event_name': name,
+            'seconds': seconds,
+            'hours': round(seconds / 3600, 2),
+            'percent': round(seconds / total_seconds * 100, 1) if total_seconds > 0 else 0,
+        })
+
+    report = {
+        'period': label,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'total_seconds': total_seconds,
+        'total_hours': round(total_seconds / 3600, 2),
+        'events': events,
+        'approximate': bool(partial_months),
+    }
+    if partial_months:
+        report['partial_archive_months'] = list(partial_months)
+    if previous_total is not None:
+        report['previous_total_seconds'] = previous_total
+        report['difference_seconds'] = total_seconds - previous_total
+    return report
+
+
+def period_report(repository, period):
+    """Отчет за 'День', 'Неделя' или 'Месяц' по сегодняшний день"""
+    end = current_day()
+    start = end - timedelta(days=TaskRepository.PERIOD_DAYS[period])
+    data, total_seconds = pad_period(period, period_totals(repository, period))
+    return build_report(period, start, end, data, total_seconds,
+                        partial_months=partial_archive_months(repository, (start, end)))
+
+
+def range_report(repository, start, end, compare=False):
+    """
+    Отчет за диапазон дат включительно
+
+    Args:
+        compare: добавить разницу с предыдущим диапазоном той же длины
+    """
+    data = range_totals(repository, start, end)
+    ranges = [(start, end)]
+    previous_total = None
+    if compare:
+        ranges.append(previous_range(start, end))
+        previous_total = sum(range_totals(repository, *ranges[-1]).values())
+    return build_report('Диапазон', start, end, data, sum(data.values()), previous_total,
+                        partial_archive_months(repository, *ranges))
+
+
+def format_report(report):
+    """Текстовое представление отчета для терминала"""
+    lines = [f"{report['period']} ({report['start']} - {report['end']}): {report['total_hours']:.1f} часов"]
+    if 'difference_seconds' in report:
+        lines[0] += f" ({report['difference_seconds'] / 3600:+.1f} ч. к предыдущему периоду)"
+    if not report['events']:
+        lines.append("  Нет данных")
+    width = max((len(event['event_name']) for event in report['events']), default=0)
+    for event in report['events']:
+        lines.append(f"  {event['event_name']:<{width}}  {event['hours']:>8.1f} ч.  {event['percent']:>5.1f}%")
+    if report.get('approximate'):
+        lines.append("Суммы приблизительные: период захватывает не целиком архивные месяцы "
+                     f"{', '.join(report['partial_archive_months'])} (точны периоды из целых месяцев)")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Отчет по учтенному времени")
+    parser.add_argument('period', choices=(*PERIOD_NAMES, 'range'))
+    parser.add_argument('--db', default='main.db', help="путь к базе")
+    parser.add_argument('--archive-db', default=retention.configured_archive_path(),
+                        help="архивная база (по умолчанию retention.archive_path из config.json)")
+    parser.add_argument('--start', type=date.fromisoformat, help="начало диапазона (YYYY-MM-DD)")
+    parser.add_argument('--end', type=date.fromisoformat, help="конец диапазона (по умолчанию сегодня)")
+    parser.add_argument('--compare', action='store_true', help="сравнить с предыдущим диапазоном той же длины")
+    parser.add_argument('--json', action='store_true', help="вывести отчет в JSON")
+    args = parser.parse_args(argv)
+
+    if args.period == 'range':
+        if args.start is None:
+            parser.error("для диапазона нужен --start")
+        end = args.end or current_day()
+        if args.start > end:
+            parser.error("начало диапазона позже конца")
+
+    # Отчет только читает базу: файл не создается, схема не обновляется
+    if not Path(args.db).is_file():
+        print(f"Ошибка: базы {args.db} нет. Запустите приложение, чтобы создать ее", file=sys.stderr)
+        return 1
+    try:
+        repository = TaskRepository(args.db, read_only=True)
+    except sqlite3.Error as error:
+        print(f"Ошибка: {args.db}: {error}", file=sys.stderr)
+        return 1
+    try:
+        version = migrations.get_version(repository.connection)
+        if version < migrations.SCHEMA_VERSION:
+            print(f"Ошибка: схема базы {args.db} устарела (версия {version}, нужна "
+                  f"{migrations.SCHEMA_VERSION}). Запустите приложение или python retention.py {args.db}, "
+                  "чтобы обновить ее", file=sys.stderr)
+            return 1
+        # Архива может еще не быть, если старые месяцы не сворачивались
+        if args.archive_db and Path(args.archive_db).is_file():
+            repository.attach_archive(args.archive_db)
+        if args.period == 'range':
+            report = range_report(repository, args.start, end, args.compare)
+        else:
+            report = period_report(repository, PERIOD_NAMES[args.period])
+    except sqlite3.Error as error:
+        print(f"Ошибка: {error}", file=sys.stderr)
+        return 1
+    finally:
+        repository.close()
+
+    if args.json:
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        sys.stdout.write('\n')
+    else:
+        print(format_report(report))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,350 @@
+"""Хранение истории: архив старых дневных сумм и incremental_vacuum
+
+В tasks по строке на тип задачи и день, и за годы работы таблица только
+растет. Дневные суммы старше keep_months полных месяцев сворачиваются в
+таблицу archive_month (строка на тип задачи и месяц), а сами строки
+удаляются из tasks. В представлении daily_totals архивный месяц выглядит
+одним днем - первым числом месяца, поэтому разбивка внутри архивных
+месяцев по дням и неделям теряется. Точны только суммы за целые месяцы и
+диапазоны, границы которых не попадают внутрь архивного месяца: диапазон,
+захватывающий архивный месяц частично, получает все время месяца или не
+получает ничего (см. partial_months), и отчеты помечают такие суммы как
+приблизительные.
+
+Архив можно вынести в отдельный файл (archive_path): он подключается
+через ATTACH как схема archive, а временное представление daily_totals
+того же соединения объединяет обе базы. Основная база остается маленькой,
+и ее страницы дольше держатся в кэше.
+
+Освободившиеся страницы возвращаются системе через PRAGMA
+incremental_vacuum небольшими порциями, пока таймер на паузе. Для этого
+в базе должен быть включен auto_vacuum=INCREMENTAL: новые базы создаются
+с ним (см. storage.TaskRepository.NEW_DATABASE_PRAGMAS), для старых его включает
+одноразовый полный VACUUM:
+
+    python retention.py main.db --enable-incremental-vacuum
+    python retention.py main.db --keep-months 24 --archive-db archive.db
+"""
+import argparse
+import json
+import sqlite3
+import sys
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+import migrations
+
+ARCHIVE_SCHEMA = 'archive'
+
+# Значение PRAGMA auto_vacuum для режима INCREMENTAL
+AUTO_VACUUM_INCREMENTAL = 2
+
+# Временное представление перекрывает main.daily_totals и добавляет
+# суммы из подключенной архивной базы
+ARCHIVE_VIEW = f"""
+    CREATE TEMP VIEW IF NOT EXISTS daily_totals AS
+    SELECT event_name, date_day, complite_sec FROM main.tasks
+    UNION ALL
+    SELECT event_name, month_start, total_sec FROM main.archive_month
+    UNION ALL
+    SELECT event_name, month_start, total_sec FROM {ARCHIVE_SCHEMA}.archive_month;
+"""
+
+ARCHIVE_DAYS = """
+    INSERT INTO archive_month (event_name, month_start, total_sec, batch)
+    SELECT event_name, date(date_day, 'start of month'), SUM(COALESCE(complite_sec, 0)), ?
+    FROM tasks
+    WHERE date_day < ?
+    GROUP BY 1, 2;
+"""
+
+# Триггер tasks_rollup_delete вычел удаленные дни из агрегатов; архивные
+# суммы возвращаются в них на первое число месяца, как в daily_totals
+RESTORE_ROLLUPS = (
+    """
+    INSERT INTO rollup_week (event_name, week_start, total_sec)
+    SELECT event_name, date(month_start, 'weekday 0', '-6 days'), total_sec
+    FROM archive_month WHERE batch = ?
+    ON CONFLICT (week_start, event_name) DO UPDATE SET total_sec = total_sec + excluded.total_sec;
+    """,
+    """
+    INSERT INTO rollup_month (event_name, month_start, total_sec)
+    SELECT event_name, month_start, total_sec
+    FROM archive_month WHERE batch = ?
+    ON CONFLICT (month_start, event_name) DO UPDATE SET total_sec = total_sec + excluded.total_sec;
+    """,
+)
+
+
+# Архивный месяц, добавленный импортом (см. import_archive), попадает в
+# агрегаты так же, как при архивации
+ADD_ROLLUPS = (
+    """
+    INSERT INTO rollup_week (event_name, week_start, total_sec)
+    VALUES (?, date(?, 'weekday 0', '-6 days'), ?)
+    ON CONFLICT (week_start, event_name) DO UPDATE SET total_sec = total_sec + excluded.total_sec;
+    """,
+    """
+    INSERT INTO rollup_month (event_name, month_start, total_sec)
+    VALUES (?, ?, ?)
+    ON CONFLICT (month_start, event_name) DO UPDATE SET total_sec = total_sec + excluded.total_sec;
+    """,
+)
+
+ARCHIVE_COLUMNS = ('event_name', 'month_start', 'total_sec', 'batch')
+
+
+def configured_archive_path(config_path='config.json'):
+    """Путь к архивной базе из ключа retention.archive_path конфига или None"""
+    try:
+        with open(config_path, mode='r') as f:
+            return json.load(f).get('retention', {}).get('archive_path')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def month_cutoff(today, keep_months):
+    """
+    Первый день, который остается в tasks: начало месяца за keep_months
+    месяцев до текущего
+    """
+    if keep_months < 1:
+        raise ValueError("keep_months должно быть не меньше 1")
+    month = today.year * 12 + today.month - 1 - keep_months
+    return date(month // 12, month % 12 + 1, 1)
+
+
+def read_only_uri(path):
+    """URI файла базы для открытия только на чтение (соединение с uri=True)"""
+    return Path(path).resolve().as_uri() + '?mode=ro'
+
+
+def attach_archive(connection, path, read_only=False):
+    """
+    Подключает архивную базу и объединяет ее с daily_totals соединения
+
+    Схема основной базы должна быть уже обновлена (migrations.migrate).
+
+    Args:
+        read_only: подключить существующий архив только на чтение; таблица
+            archive_month в нем не создается. Соединение должно быть открыто
+            с uri=True
+    """
+    if read_only:
+        connection.execute(f"ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}", (read_only_uri(path),))
+    else:
+        connection.execute(f"ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}", (path,))
+        with connection:
+            connection.execute(migrations.ARCHIVE_MONTH_TABLE.format(schema=f'{ARCHIVE_SCHEMA}.'))
+    connection.execute(ARCHIVE_VIEW)
+
+
+def is_archive_attached(connection):
+    return any(row[1] == ARCHIVE_SCHEMA for row in connection.execute("PRAGMA database_list"))
+
+
+def archive_tables(connection):
+    """Таблицы archive_month соединения: основной базы и подключенной архивной"""
+    tables = ['main.archive_month']
+    if is_archive_attached(connection):
+        tables.append(f'{ARCHIVE_SCHEMA}.archive_month')
+    return tables
+
+
+def archive_rows(connection):
+    """Генератор строк archive_month обеих баз в порядке месяцев"""
+    query = ' UNION ALL '.join(f"SELECT {', '.join(ARCHIVE_COLUMNS)} FROM {table}"
+                               for table in archive_tables(connection))
+    yield from connection.execute(f"SELECT * FROM ({query}) ORDER BY month_start, event_name, batch")
+
+
+def archived_months(connection):
+    """Множество (event_name, month_start) свернутых в архив месяцев"""
+    query = ' UNION '.join(f"SELECT event_name, month_start FROM {table}" for table in archive_tables(connection))
+    return {(event_name, month_start) for event_name, month_start in connection.execute(query)}
+
+
+def month_start(day):
+    """Первое число месяца дня в формате YYYY-MM-DD"""
+    return day[:8] + '01'
+
+
+def partial_months(start, end):
+    """
+    Месяцы, которые диапазон дат [start, end] захватывает не целиком
+
+    Returns:
+        множество первых чисел месяцев (YYYY-MM-DD): не больше двух -
+        месяцы начала и конца диапазона
+    """
+    months = set()
+    if start.day != 1:
+        months.add(start.replace(day=1).isoformat())
+    if (end + timedelta(days=1)).day != 1:
+        months.add(end.replace(day=1).isoformat())
+    return months
+
+
+def import_archive(connection, rows):
+    """
+    Импортирует месячные суммы archive_month одной транзакцией
+
+    Строка с уже сохраненным ключом (month_start, event_name, batch)
+    пропускается, поэтому повторный импорт не меняет базу. Пропускается и
+    месяц, по которому в tasks есть дневные суммы: иначе он был бы учтен
+    дважды. Новые строки пишутся в подключенную архивную базу, если она есть,
+    и добавляются в rollup_week и rollup_month.
+
+    Args:
+        rows: (event_name, month_start, total_sec, batch)
+
+    Returns:
+        (количество обработанных строк, количество пропущенных)
+    """
+    tables = archive_tables(connection)
+    exists = ' UNION ALL '.join(
+        f"SELECT 1 FROM {table} WHERE month_start = :month_start AND event_name = :event_name AND batch = :batch"
+        for table in tables)
+    count = skipped = 0
+    with connection:
+        for event_name, month, total_sec, batch in rows:
+            count += 1
+            params = {'event_name': event_name, 'month_start': month, 'batch': batch}
+            live = connection.execute(
+                "SELECT 1 FROM tasks WHERE event_name = ? AND date_day >= ? AND date_day < date(?, '+1 month') LIMIT 1",
+                (event_name, month, month),
+            ).fetchone()
+            if live is not None or connection.execute(exists, params).fetchone() is not None:
+                skipped += 1
+                continue
+            connection.execute(
+                f"INSERT INTO {tables[-1]} ({', '.join(ARCHIVE_COLUMNS)}) VALUES (?, ?, ?, ?)",
+                (event_name, month, total_sec, batch),
+            )
+            for query in ADD_ROLLUPS:
+                connection.execute(query, (event_name, month, total_sec))
+    return count, skipped
+
+
+def archive_days(connection, cutoff, batch=None):
+    """
+    Сворачивает дневные суммы до cutoff в archive_month одной транзакцией
+
+    Returns:
+        число удаленных из tasks дневных строк
+    """
+    batch = batch or datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+    cutoff = cutoff.isoformat()
+    with connection:
+        # Обычный случай - архивировать нечего: один запрос по индексу
+        if connection.execute("SELECT 1 FROM tasks WHERE date_day < ? LIMIT 1", (cutoff,)).fetchone() is None:
+            return 0
+        connection.execute(ARCHIVE_DAYS, (batch, cutoff))
+        deleted = connection.execute("DELETE FROM tasks WHERE date_day < ?", (cutoff,)).rowcount
+        for query in RESTORE_ROLLUPS:
+            connection.execute(query, (batch,))
+    return deleted
+
+
+def move_to_archive(connection):
+    """
+    Переносит архивные месяцы из основной базы в подключенную архивную
+
+    Агрегаты не меняются: суммы остаются в daily_totals соединения.
+
+    Returns:
+        число перенесенных строк
+    """
+    with connection:
+        connection.execute(f"""
+            INSERT OR IGNORE INTO {ARCHIVE_SCHEMA}.archive_month (event_name, month_start, total_sec, batch)
+            SELECT event_name, month_start, total_sec, batch FROM main.archive_month
+        """)
+        return connection.execute("DELETE FROM main.archive_month").rowcount
+
+
+def archive(connection, keep_months, today, months=None):
+    """
+    Архивирует дневные суммы старше keep_months полных месяцев и, если
+    подключена архивная база, переносит архив в нее
+
+    Args:
+        today: текущая дата (UTC)
+        months: сколько самых старых месяцев свернуть за вызов (по умолчанию
+            все): первая архивация многолетней базы идет короткими шагами
+
+    Returns:
+        (число удаленных дневных строк, число перенесенных в архивную базу строк)
+    """
+    cutoff = month_cutoff(today, keep_months)
+    if months is not None:
+        oldest = connection.execute("SELECT MIN(date_day) FROM tasks").fetchone()[0]
+        if oldest is not None:
+            oldest = date.fromisoformat(oldest)
+            month = oldest.year * 12 + oldest.month - 1 + months
+            cutoff = min(cutoff, date(month // 12, month % 12 + 1, 1))
+    deleted = archive_days(connection, cutoff)
+    moved = move_to_archive(connection) if is_archive_attached(connection) else 0
+    return deleted, moved
+
+
+def incremental_vacuum(connection, pages=None):
+    """
+    Возвращает системе до pages свободных страниц файла (все - если pages не задан)
+
+    Returns:
+        сколько свободных страниц осталось в файле
+    """
+    if connection.execute("PRAGMA main.auto_vacuum").fetchone()[0] != AUTO_VACUUM_INCREMENTAL:
+        return 0
+    argument = f"({int(pages)})" if pages else ""
+    # Прагма освобождает по странице на каждый шаг выполнения, а execute
+    # делает только первый шаг; executescript выполняет ее до конца
+    connection.executescript(f"PRAGMA main.incremental_vacuum{argument};")
+    return connection.execute("PRAGMA main.freelist_count").fetchone()[0]
+
+
+def enable_incremental_vacuum(connection):
+    """Включает auto_vacuum=INCREMENTAL в существующей базе (полный VACUUM)"""
+    connection.execute(f"PRAGMA main.auto_vacuum = {AUTO_VACUUM_INCREMENTAL}")
+    connection.execute("VACUUM main")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Архив старых дневных сумм и освобождение места в БД")
+    parser.add_argument('db_path', nargs='?', default='main.db')
+    parser.add_argument('--keep-months', type=int,
+                        help="сколько полных месяцев хранить по дням, остальное свернуть до месяцев")
+    parser.add_argument('--archive-db', default=configured_archive_path(),
+                        help="вынести архив в отдельную базу (по умолчанию retention.archive_path из config.json)")
+    parser.add_argument('--enable-incremental-vacuum', action='store_true',
+                        help="включить auto_vacuum=INCREMENTAL (однократный полный VACUUM)")
+    args = parser.parse_args(argv)
+
+    from storage import TaskRepository
+
+    repository = TaskRepository(args.db_path)
+    try:
+        repository.migrate()
+        if args.archive_db:
+            repository.attach_archive(args.archive_db)
+        if args.enable_incremental_vacuum:
+            enable_incremental_vacuum(repository.connection)
+            print("Включен auto_vacuum=INCREMENTAL", file=sys.stderr)
+        if args.keep_months is not None:
+            deleted, moved = repository.archive_old_days(args.keep_months)
+            print(f"Свернуто дневных записей: {deleted}", file=sys.stderr)
+            if args.archive_db:
+                print(f"Перенесено в {args.archive_db} месячных записей: {moved}", file=sys.stderr)
+        remaining = repository.incremental_vacuum()
+        print(f"Свободных страниц в файле: {remaining}", file=sys.stderr)
+    except (ValueError, sqlite3.Error) as error:
+        print(f"Ошибка: {error}", file=sys.stderr)
+        return 1
+    finally:
+        repository.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,152 @@
+"""Предагрегированные суммы по неделям (ISO) и месяцам
+
+Дневной агрегат - сама таблица tasks: после миграции v2 в ней ровно одна
+строка на тип задачи и день. Таблицы rollup_week и rollup_month
+поддерживаются триггерами на tasks (см. migrations.py), поэтому суммы за
+длинные периоды читаются из O(типов задач) строк, а не из всех записей.
+Отдельные дни читаются из представления daily_totals, куда входят и
+свернутые до месяцев архивные суммы (см. retention.py).
+
+Пересчет для существующей базы:
+    python rollups.py --rebuild main.db
+    python rollups.py --rebuild main.db --archive-db archive.db
+"""
+import argparse
+import sqlite3
+from datetime import timedelta
+
+
+def _rebuild_sql(source):
+    return f"""
+DELETE FROM rollup_week;
+DELETE FROM rollup_month;
+
+INSERT INTO rollup_week (event_name, week_start, total_sec)
+SELECT event_name, date(date_day, 'weekday 0', '-6 days'), SUM(COALESCE(complite_sec, 0))
+FROM {source}
+GROUP BY 1, 2;
+
+INSERT INTO rollup_month (event_name, month_start, total_sec)
+SELECT event_name, date(date_day, 'start of month'), SUM(COALESCE(complite_sec, 0))
+FROM {source}
+GROUP BY 1, 2;
+"""
+
+
+# Пересчет в миграции v3, когда архива еще нет
+REBUILD_SQL = _rebuild_sql('tasks')
+
+
+def rebuild(connection):
+    """Полностью пересчитывает таблицы агрегатов по дневным суммам вместе с архивом"""
+    connection.executescript(f"BEGIN;\n{_rebuild_sql('daily_totals')}\nCOMMIT;")
+
+
+def _next_month(day):
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def split_range(start, end):
+    """
+    Разбивает диапазон дат [start, end] на полные месяцы, полные недели
+    (с понедельника) и оставшиеся отдельные дни
+
+    Returns:
+        (days, weeks, months) - списки дат начала каждого отрезка
+    """
+    days, weeks, months = [], [], []
+    current = start
+
+    while current <= end:
+        month_end = _next_month(current) - timedelta(days=1)
+        if current.day == 1 and month_end <= end:
+            months.append(current)
+            current = month_end + timedelta(days=1)
+            continue
+
+        week_end = current + timedelta(days=6)
+        if current.weekday() == 0 and week_end <= end:
+            # Неделя не должна перекрывать начало месяца, который целиком
+            # попадает в диапазон: иначе месяц придется набирать по дням
+            next_month = _next_month(current)
+            crosses_full_month = (
+                next_month <= week_end
+                and _next_month(next_month) - timedelta(days=1) <= end
+            )
+            if not crosses_full_month:
+                weeks.append(current)
+                current = week_end + timedelta(days=1)
+                continue
+
+        days.append(current)
+        current += timedelta(days=1)
+
+    return days, weeks, months
+
+
+def _placeholders(values):
+    return ", ".join("?" * len(values))
+
+
+def range_totals(connection, start, end):
+    """
+    Возвращает суммы секунд по типам задач за диапазон [start, end]
+
+    Args:
+        start, end: datetime.date, границы включительно
+
+    Returns:
+        список строк (event_name, total_seconds)
+    """
+    days, weeks, months = split_range(start, end)
+
+    parts = []
+    params = []
+    if days:
+        parts.append(f"SELECT event_name, complite_sec AS seconds FROM daily_totals "
+                     f"WHERE date_day IN ({_placeholders(days)})")
+        params.extend(d.isoformat() for d in days)
+    if weeks:
+        parts.append(f"SELECT event_name, total_sec AS seconds FROM rollup_week "
+                     f"WHERE week_start IN ({_placeholders(weeks)})")
+        params.extend(d.isoformat() for d in weeks)
+    if months:
+        parts.append(f"SELECT event_name, total_sec AS seconds FROM rollup_month "
+                     f"WHERE month_start IN ({_placeholders(months)})")
+        params.extend(d.isoformat() for d in months)
+
+    if not parts:
+        return []
+
+    query = f"""
+        SELECT event_name, SUM(seconds) as total_seconds
+        FROM ({' UNION ALL '.join(parts)})
+        GROUP BY event_name
+    """
+    return connection.execute(query, params).fetchall()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Обслуживание таблиц агрегатов")
+    parser.add_argument("db_path", nargs="?", default="main.db")
+    parser.add_argument("--rebuild", action="store_true", help="пересчитать агрегаты по дневным суммам")
+    parser.add_argument("--archive-db", help="архивная база, вынесенная из основной "
+                                             "(по умолчанию retention.archive_path из config.json)")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        import migrations
+        import retention
+
+        if args.archive_db is None:
+            args.archive_db = retention.configured_archive_path()
+
+        connection = sqlite3.connect(args.db_path)
+        migrations.migrate(connection)
+        if args.archive_db:
+            retention.attach_archive(connection, args.archive_db)
+        rebuild(connection)
+        connection.close()
+        print(f"Агрегаты пересчитаны: {args.db_path}")
+    else:
+        parser.print_help()
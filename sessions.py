@@ -0,0 +1,154 @@
+"""Журнал интервалов работы (таблица sessions)
+
+Каждый запуск таймера - одна строка (event_name, start_datetime,
+end_datetime). Пульсы только сдвигают конец открытого интервала, строки
+не перезаписываются задним числом. Дневные суммы в tasks выводятся из
+интервалов: каждый прирост интервала разбивается по суткам и добавляется
+к нужным дням, поэтому работа через полночь учитывается в обоих днях.
+
+Время хранится в UTC в формате SQLite ('YYYY-MM-DD HH:MM:SS') - так же,
+как date('now') определяет текущий день.
+"""
+from datetime import datetime, timedelta, timezone
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+UPSERT_SESSION = """
+    INSERT INTO sessions (event_name, start_datetime, end_datetime)
+    VALUES (?, ?, ?)
+    ON CONFLICT (event_name, start_datetime) DO UPDATE
+    SET end_datetime=excluded.end_datetime
+    WHERE excluded.end_datetime > end_datetime;
+"""
+
+# Интервалы, пересекающие [start, end): отбор по индексу на end_datetime
+SELECT_OVERLAPPING = """
+    SELECT event_name, start_datetime, end_datetime FROM sessions
+    WHERE end_datetime > ? AND start_datetime < ?
+    ORDER BY start_datetime;
+"""
+
+
+def now_utc():
+    """Текущее время в UTC с точностью до секунды"""
+    return datetime.now(timezone.utc).replace(microsecond=0, tzinfo=None)
+
+
+def format_time(moment):
+    return moment.strftime(TIME_FORMAT)
+
+
+def parse_time(text):
+    return datetime.strptime(text, TIME_FORMAT)
+
+
+def split_by_day(start, end):
+    """
+    Разбивает интервал [start, end) по суткам
+
+    Returns:
+        список (date, секунды)
+    """
+    parts = []
+    current = start
+    while current < end:
+        next_midnight = datetime.combine(current.date() + timedelta(days=1), datetime.min.time())
+        part_end = min(end, next_midnight)
+        parts.append((current.date(), int((part_end - current).total_seconds())))
+        current = part_end
+    return parts
+
+
+def split_by_hour(start, end):
+    """
+    Разбивает интервал [start, end) по часам суток
+
+    Returns:
+        список (час 0-23, секунды)
+    """
+    parts = []
+    current = start
+    while current < end:
+        next_hour = current.replace(minute=0, second=0) + timedelta(hours=1)
+        part_end = min(end, next_hour)
+        parts.append((current.hour, int((part_end - current).total_seconds())))
+        current = part_end
+    return parts
+
+
+def timeline(connection, start, end, event_name=None):
+    """
+    Интервалы работы, обрезанные по границам [start, end)
+
+    Args:
+        start, end: datetime в UTC
+        event_name: только этот тип задачи (по умолчанию - все)
+
+    Returns:
+        список (event_name, начало, конец)
+    """
+    result = []
+    for row in connection.execute(SELECT_OVERLAPPING, (format_time(start), format_time(end))):
+        if event_name is not None and row[0] != event_name:
+            continue
+        result.append((row[0], max(start, parse_time(row[1])), min(end, parse_time(row[2]))))
+    return result
+
+
+def hourly_totals(connection, start, end, event_name=None):
+    """
+    Секунды работы по часам суток (UTC) за [start, end)
+
+    Returns:
+        список из 24 чисел
+    """
+    hours = [0] * 24
+    for _, interval_start, interval_end in timeline(connection, start, end, event_name):
+        for hour, seconds in split_by_hour(interval_start, interval_end):
+            hours[hour] += seconds
+    return hours
+
+
+def compact(connection, now=None, merge_after_days=30, merge_gap_seconds=300, keep_days=None):
+    """
+    Уплотняет журнал интервалов
+
+    Интервалы старше merge_after_days дней сливаются с соседними интервалами
+    того же типа задачи, если между ними не больше merge_gap_seconds: паузы
+    короче этого порога перестают различаться в почасовой статистике.
+    Интервалы старше keep_days дней удаляются (дневные суммы остаются в tasks).
+    Недавние интервалы, в том числе открытый, не затрагиваются.
+
+    Returns:
+        (число слитых интервалов, число удаленных интервалов)
+    """
+    now = now or now_utc()
+    merge_before = format_time(now - timedelta(days=merge_after_days))
+
+    merged = 0
+    with connection:
+        rows = connection.execute("""
+            SELECT id, event_name, start_datetime, end_datetime FROM sessions
+            WHERE end_datetime < ?
+            ORDER BY event_name, start_datetime
+        """, (merge_before,)).fetchall()
+
+        current = None
+        for row_id, event_name, start, end in rows:
+            if (current is not None and current[1] == event_name
+                    and (parse_time(start) - parse_time(current[3])).total_seconds() <= merge_gap_seconds):
+                new_end = max(current[3], end)
+                connection.execute("UPDATE sessions SET end_datetime=? WHERE id=?", (new_end, current[0]))
+                connection.execute("DELETE FROM sessions WHERE id=?", (row_id,))
+                current = (current[0], event_name, current[2], new_end)
+                merged += 1
+            else:
+                current = (row_id, event_name, start, end)
+
+        removed = 0
+        if keep_days is not None:
+            keep_after = format_time(now - timedelta(days=keep_days))
+            removed = connection.execute(
+                "DELETE FROM sessions WHERE end_datetime < ?", (keep_after,)).rowcount
+
+    return merged, removed
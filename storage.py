@@ -0,0 +1,241 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+import migrations
+import retention
+import rollups
+import sessions
+
+
+def current_day():
+    """Текущая дата в UTC - так же, как date('now') в SQLite"""
+    return datetime.now(timezone.utc).date()
+
+
+class TaskRepository:
+    """Доступ к таблице tasks через одно долгоживущее соединение"""
+
+    # auto_vacuum действует только для новой (пустой) базы и должен идти до
+    # перехода в WAL. В существующей базе прагма не нужна и к тому же
+    # считается записью: она сдвигает PRAGMA data_version у других соединений
+    NEW_DATABASE_PRAGMAS = (
+        "PRAGMA auto_vacuum=INCREMENTAL",
+    )
+
+    # Прагмы применяются один раз при открытии соединения
+    PRAGMAS = (
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA temp_store=MEMORY",
+        "PRAGMA cache_size=-8000",
+        "PRAGMA busy_timeout=5000",
+    )
+    # Базу, открытую только на чтение, прагмы не должны менять: режим WAL
+    # хранится в самом файле и уже включен приложением
+    READ_ONLY_PRAGMAS = (
+        "PRAGMA temp_store=MEMORY",
+        "PRAGMA cache_size=-8000",
+        "PRAGMA busy_timeout=5000",
+    )
+
+    # Периоды диаграммы: сколько дней до сегодняшнего включается в выборку
+    PERIOD_DAYS = {
+        'День': 0,
+        'Неделя': 6,
+        'Месяц': 30,
+    }
+
+    # Запросы держим константами: sqlite3 кэширует подготовленные
+    # выражения по тексту запроса, поэтому текст должен быть одинаковым
+
+    # Пульс таймера: одна команда вместо SELECT + UPDATE.
+    # Строка не перезаписывается, если значение не изменилось
+    UPSERT_DAY = """
+        INSERT INTO tasks (event_name, date_day, complite_sec, hour_week_limit, start_datetime, last_update)
+        VALUES (?, ?, ?, ?, NULL, ?)
+        ON CONFLICT (event_name, date_day) DO UPDATE
+        SET complite_sec=excluded.complite_sec, last_update=excluded.last_update
+        WHERE complite_sec != excluded.complite_sec;
+    """
+    # Прирост дневной суммы по интервалу работы. start_datetime хранит
+    # начало первой работы за день и после вставки не меняется
+    ADD_DAY_SECONDS = """
+        INSERT INTO tasks (event_name, date_day, complite_sec, hour_week_limit, start_datetime, last_update)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (event_name, date_day) DO UPDATE
+        SET complite_sec=complite_sec + excluded.complite_sec, last_update=excluded.last_update,
+            start_datetime=COALESCE(start_datetime, excluded.start_datetime);
+    """
+    SELECT_DAYS = """
+        SELECT event_name, date_day, complite_sec FROM daily_totals
+        WHERE date_day >= ? AND date_day <= ?;
+    """
+
+    def __init__(self, db_path='main.db', read_only=False):
+        """
+        Args:
+            db_path: путь к файлу базы
+            read_only: открыть существующую базу только на чтение (для
+                отчетов); файл не создается, схема не обновляется
+        """
+        self.db_path = db_path
+        self.read_only = read_only
+        # Соединение может использоваться из фоновых потоков,
+        # поэтому доступ к нему сериализуется блокировкой
+        self._lock = threading.RLock()
+        if read_only:
+            self.connection = sqlite3.connect(retention.read_only_uri(db_path), uri=True,
+                                              check_same_thread=False, cached_statements=64)
+            self.connection.row_factory = sqlite3.Row
+            for pragma in self.READ_ONLY_PRAGMAS:
+                self.connection.execute(pragma)
+            return
+        self.connection = sqlite3.connect(db_path, check_same_thread=False, cached_statements=64)
+        self.connection.row_factory = sqlite3.Row
+        if self.connection.execute("PRAGMA page_count").fetchone()[0] == 0:
+            for pragma in self.NEW_DATABASE_PRAGMAS:
+                self.connection.execute(pragma)
+        for pragma in self.PRAGMAS:
+            self.connection.execute(pragma)
+
+    def close(self):
+        """Закрывает соединение"""
+        with self._lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+
+    def migrate(self):
+        """Обновляет схему базы до последней версии"""
+        with self._lock:
+            return migrations.migrate(self.connection)
+
+    def attach_archive(self, archive_path):
+        """Подключает архивную базу, см. retention.attach_archive"""
+        with self._lock:
+            retention.attach_archive(self.connection, archive_path, self.read_only)
+
+    def archive_old_days(self, keep_months, months=None):
+        """Сворачивает старые дневные суммы в архив, см. retention.archive"""
+        with self._lock:
+            return retention.archive(self.connection, keep_months, current_day(), months)
+
+    def get_archived_months(self):
+        """Возвращает множество первых чисел архивных месяцев (YYYY-MM-DD)"""
+        with self._lock:
+            return {month for _, month in retention.archived_months(self.connection)}
+
+    def incremental_vacuum(self, pages=None):
+        """Возвращает системе свободные страницы файла, см. retention.incremental_vacuum"""
+        with self._lock:
+            return retention.incremental_vacuum(self.connection, pages)
+
+    def get_period_rows(self, period):
+        """
+        Возвращает суммы секунд по типам задач за период
+
+        Args:
+            period: 'День', 'Неделя' или 'Месяц'
+        """
+        days_back = self.PERIOD_DAYS.get(period)
+        if days_back is None:
+            return []
+        end = current_day()
+        return self.get_range_rows(end - timedelta(days=days_back), end)
+
+    def get_range_rows(self, start, end):
+        """Возвращает суммы секунд по типам задач за диапазон дат включительно"""
+        with self._lock:
+            return rollups.range_totals(self.connection, start, end)
+
+    def get_days_rows(self, start, end):
+        """Возвращает дневные записи всех типов задач за диапазон дат включительно"""
+        with self._lock:
+            return self.connection.execute(self.SELECT_DAYS, (start.isoformat(), end.isoformat())).fetchall()
+
+    def get_session_end(self, event_name, start):
+        """Возвращает записанный конец интервала работы (строка времени UTC) или None"""
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT end_datetime FROM sessions WHERE event_name = ? AND start_datetime = ?",
+                (event_name, sessions.format_time(start)),
+            ).fetchone()
+        return row[0] if row is not None else None
+
+    @contextmanager
+    def busy_timeout(self, milliseconds):
+        """
+        Временно меняет PRAGMA busy_timeout соединения
+
+        Фоновое обслуживание из GUI-потока не должно ждать чужую запись:
+        с нулевым таймаутом занятая база сразу дает sqlite3.OperationalError.
+        """
+        with self._lock:
+            previous = self.connection.execute("PRAGMA busy_timeout").fetchone()[0]
+            self.connection.execute(f"PRAGMA busy_timeout={int(milliseconds)}")
+            try:
+                yield
+            finally:
+                self.connection.execute(f"PRAGMA busy_timeout={previous}")
+
+    @contextmanager
+    def read_transaction(self):
+        """Все чтения внутри блока видят одно и то же состояние базы (снимок WAL)"""
+        with self._lock:
+            self.connection.execute("BEGIN")
+            try:
+                yield
+            finally:
+                self.connection.execute("COMMIT")
+
+    def get_date_bounds(self):
+        """Возвращает первую и последнюю даты дневных сумм (с архивом) или (None, None)"""
+        with self._lock:
+            row = self.connection.execute("SELECT MIN(date_day), MAX(date_day) FROM daily_totals").fetchone()
+        return row[0], row[1]
+
+    def data_version(self):
+        """Значение PRAGMA data_version: меняется после коммитов других соединений"""
+        with self._lock:
+            return self.connection.execute("PRAGMA data_version").fetchone()[0]
+
+    def write_sessions(self, session_rows, day_rows):
+        """
+        Записывает интервалы работы и приросты дневных сумм одной транзакцией
+
+        Args:
+            session_rows: последовательность (event_name, start_datetime, end_datetime)
+            day_rows: последовательность (event_name, date_day, seconds, hour_week_limit, start_datetime)
+        """
+        last_update = datetime.now().isoformat()
+        with self._lock:
+            with self.connection:
+                self.connection.executemany(sessions.UPSERT_SESSION, session_rows)
+                self.connection.executemany(
+                    self.ADD_DAY_SECONDS,
+                    ((event_name, date_day, seconds, hour_week_limit, start_datetime, last_update)
+                     for event_name, date_day, seconds, hour_week_limit, start_datetime in day_rows),
+                )
+
+    def compact_sessions(self, **kwargs):
+        """Уплотняет журнал интервалов, см. sessions.compact"""
+        with self._lock:
+            return sessions.compact(self.connection, **kwargs)
+
+    def update_days(self, rows):
+        """
+        Записывает счетчики секунд одной транзакцией
+
+        Args:
+            rows: последовательность (event_name, date_day, complite_sec, hour_week_limit)
+        """
+        last_update = datetime.now().isoformat()
+        with self._lock:
+            with self.connection:
+                self.connection.executemany(
+                    self.UPSERT_DAY,
+                    ((event_name, date_day, complite_sec, hour_week_limit, last_update)
+                     for event_name, date_day, complite_sec, hour_week_limit in rows),
+                )
@@ -0,0 +1,387 @@
+"""Сводка по команде: суммы из баз main.db всех сотрудников
+
+Каталог просматривается рекурсивно: каждый файл *.db - база одного
+сотрудника (имя - имя файла, а для main.db - имя его каталога). Архивная
+база (retention.archive_path из config.json или --archive-name) лежит в
+каталоге сотрудника рядом с main.db и учитывается вместе с ней. Базы
+открываются только на чтение и обрабатываются параллельно пулом процессов:
+каждый процесс получает пачку файлов, подключает их все через ATTACH к
+одному соединению и считает суммы по всей пачке одним запросом UNION ALL;
+частичные суммы пачек затем сливаются.
+
+Загрузка считается относительно недельных лимитов из config.json (для
+типов задач, которых нет в конфиге, - по hour_week_limit из базы), лимит
+пересчитывается на длину периода.
+
+Примеры:
+    python team.py team_dbs/
+    python team.py team_dbs/ --start 2024-01-01 --end 2024-03-31 --json
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from pathlib import Path
+
+import retention
+from storage import current_day
+
+# SQLite по умолчанию позволяет подключить не больше 10 баз через ATTACH:
+# столько файлов (основных и архивных) подключается к одному соединению
+BATCH_SIZE = 10
+
+# Части запроса по пачке: {index} - номер сотрудника в пачке
+SELECT_TOTALS = """
+    SELECT {index}, event_name, SUM(seconds), MAX(hour_week_limit)
+    FROM ({sources})
+    GROUP BY event_name
+"""
+
+SELECT_DAYS = """
+    SELECT event_name, COALESCE(complite_sec, 0) AS seconds, hour_week_limit
+    FROM {schema}.tasks
+    WHERE date_day >= :start AND date_day <= :end
+"""
+
+# Свернутые в archive_month старые дни (см. retention.py): архивный месяц
+# учитывается, если его первое число попадает в период
+SELECT_ARCHIVE = """
+    SELECT event_name, total_sec, NULL
+    FROM {schema}.archive_month
+    WHERE month_start >= :start AND month_start <= :end
+"""
+
+# Архивный месяц, который период захватывает не целиком: сумма сотрудника
+# приблизительная (:first_month и :last_month - месяцы из retention.partial_months)
+SELECT_CUT_MONTH = """
+    SELECT 1 FROM {schema}.archive_month WHERE month_start IN (:first_month, :last_month)
+"""
+
+
+def find_databases(directory, archive_name=None):
+    """
+    Находит базы сотрудников в каталоге
+
+    Args:
+        archive_name: имя файла архивной базы; такие файлы не считаются
+            сотрудниками, а подключаются вместе с main.db из того же каталога
+
+    Returns:
+        список (имя сотрудника, путь, путь к архивной базе или None),
+        отсортированный по имени
+    """
+    root = Path(directory)
+    found = {}
+    for path in sorted(root.rglob('*.db')):
+        if path.name == archive_name:
+            continue
+        archive = None
+        if path.name == 'main.db' and path.parent != root:
+            user = str(path.parent.relative_to(root))
+            if archive_name and (path.parent / archive_name).is_file():
+                archive = str(path.parent / archive_name)
+        else:
+            user = str(path.relative_to(root).with_suffix(''))
+        found.setdefault(user, (str(path), archive))
+    return [(user, path, archive) for user, (path, archive) in sorted(found.items())]
+
+
+def _attach(connection, schema, path, required):
+    """
+    Подключает базу и возвращает множество ее таблиц
+
+    sqlite_master читается сразу, поэтому файл, который не является базой
+    или не содержит нужной таблицы, отсеивается здесь, а не ломает запрос
+    по пачке.
+    """
+    connection.execute("ATTACH DATABASE ? AS " + schema, (retention.read_only_uri(path),))
+    try:
+        tables = {row[0] for row in connection.execute(
+            f"SELECT name FROM {schema}.sqlite_master WHERE type = 'table'")}
+        if required not in tables:
+            raise sqlite3.OperationalError(f"no such table: {required}")
+    except sqlite3.Error:
+        connection.execute("DETACH DATABASE " + schema)
+        raise
+    return tables
+
+
+def _attach_user(connection, index, path, archive):
+    """
+    Подключает базы сотрудника и возвращает части запроса для нее
+
+    Returns:
+        (запрос сумм, запрос проверки неполных архивных месяцев или None)
+    """
+    schema = f'user_{index}'
+    schemas = []
+    if 'archive_month' in _attach(connection, schema, path, 'tasks'):
+        schemas.append(schema)
+    if archive is not None:
+        try:
+            _attach(connection, f'archive_{index}', archive, 'archive_month')
+        except sqlite3.Error:
+            connection.execute("DETACH DATABASE " + schema)
+            raise
+        schemas.append(f'archive_{index}')
+
+    sources = [SELECT_DAYS.format(schema=schema)] + [SELECT_ARCHIVE.format(schema=name) for name in schemas]
+    totals = SELECT_TOTALS.format(index=index, sources=' UNION ALL '.join(sources))
+    cut = ' UNION ALL '.join(SELECT_CUT_MONTH.format(schema=name) for name in schemas) or None
+    return totals, cut
+
+
+def _cut_params(start, end):
+    """Параметры SELECT_CUT_MONTH для периода в формате YYYY-MM-DD"""
+    months = sorted(retention.partial_months(date.fromisoformat(start), date.fromisoformat(end)))
+    return {'first_month': months[0] if months else None, 'last_month': months[-1] if months else None}
+
+
+def scan_batch(batch, start, end):
+    """
+    Считает суммы по типам задач для пачки баз (выполняется в процессе пула)
+
+    Args:
+        batch: список (имя сотрудника, путь, архив) из find_databases, не
+            больше BATCH_SIZE файлов вместе с архивными
+        start, end: границы периода в формате YYYY-MM-DD включительно
+
+    Returns:
+        список (имя сотрудника, {тип задачи: (секунды, hour_week_limit)},
+        ошибка или None, сумма приблизительная)
+    """
+    params = {'start': start, 'end': end}
+    totals = {index: {} for index in range(len(batch))}
+    errors = {}
+    approximate = set()
+    connection = sqlite3.connect(':memory:', uri=True)
+    try:
+        parts = {}
+        for index, (user, path, archive) in enumerate(batch):
+            try:
+                parts[index], cut = _attach_user(connection, index, path, archive)
+                if cut is not None and connection.execute(cut, _cut_params(start, end)).fetchone():
+                    approximate.add(index)
+            except sqlite3.Error as error:
+                errors[index] = f"{path}: {error}"
+
+        if parts:
+            try:
+                rows = connection.execute(' UNION ALL '.join(parts.values()), params).fetchall()
+            except sqlite3.Error:
+                # Ошибку чтения (например, поврежденная страница) нужно отнести
+                # к конкретной базе: пачка пересчитывается по одной базе
+                rows = []
+                for index, part in parts.items():
+                    try:
+                        rows.extend(connection.execute(part, params).fetchall())
+                    except sqlite3.Error as error:
+                        errors[index] = f"{batch[index][1]}: {error}"
+            for index, event_name, seconds, limit in rows:
+                totals[index][event_name] = (seconds, limit)
+    finally:
+        connection.close()
+
+    return [(user, {} if index in errors else totals[index], errors.get(index), index in approximate)
+            for index, (user, path, archive) in enumerate(batch)]
+
+
+def _batches(items, size):
+    """Пачки сотрудников, у которых вместе не больше size файлов"""
+    batches = []
+    batch, files = [], 0
+    for item in items:
+        weight = 1 if item[2] is None else 2
+        if batch and files + weight > size:
+            batches.append(batch)
+            batch, files = [], 0
+        batch.append(item)
+        files += weight
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def scan_databases(databases, start, end, workers=None):
+    """
+    Обходит базы параллельно и возвращает результаты scan_batch для всех пачек
+
+    Args:
+        databases: список (имя сотрудника, путь, архив) из find_databases
+        workers: число процессов (1 - без пула, в текущем процессе)
+    """
+    batches = _batches(databases, BATCH_SIZE)
+    start, end = start.isoformat(), end.isoformat()
+
+    if workers == 1 or len(batches) <= 1:
+        return [result for batch in batches for result in scan_batch(batch, start, end)]
+
+    workers = min(workers or os.cpu_count() or 1, len(batches))
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for batch_results in executor.map(scan_batch, batches, [start] * len(batches), [end] * len(batches)):
+            results.extend(batch_results)
+    return results
+
+
+def _utilisation(seconds, limit_seconds):
+    if not limit_seconds:
+        return None
+    return round(seconds / limit_seconds * 100, 1)
+
+
+def merge_results(results, limits, days):
+    """
+    Сливает частичные суммы в сводку по сотрудникам и типам задач
+
+    Args:
+        results: результаты scan_databases
+        limits: недельные лимиты в часах из config.json {тип задачи: часы}
+        days: длина периода в днях для пересчета недельных лимитов
+
+    Returns:
+        словарь, пригодный для JSON
+    """
+    weeks = days / 7
+    users = []
+    categories = {}
+    errors = []
+    approximate = []
+
+    for user, totals, error, cut in results:
+        if error is not None:
+            errors.append(error)
+            continue
+        if cut:
+            approximate.append(user)
+
+        user_seconds = 0
+        user_limit = 0
+        events = {}
+        for event_name, (seconds, stored_limit) in totals.items():
+            hours_limit = limits.get(event_name, stored_limit)
+            limit_seconds = int(hours_limit * 3600 * weeks) if hours_limit else 0
+            events[event_name] = {
+                'seconds': seconds,
+                'limit_seconds': limit_seconds,
+                'utilisation': _utilisation(seconds, limit_seconds),
+            }
+            user_seconds += seconds
+
+            category = categories.setdefault(event_name, {'seconds': 0, 'limit_seconds': 0, 'users': 0})
+            category['seconds'] += seconds
+            category['users'] += 1
+
+        # Нормы из конфига действуют для каждого сотрудника, даже если он
+        # не работал по типу задачи в этом периоде
+        for event_name, hours_limit in limits.items():
+            user_limit += int(hours_limit * 3600 * weeks)
+        for event_name, event in events.items():
+            if event_name not in limits:
+                user_limit += event['limit_seconds']
+
+        users.append({
+            'user': user,
+            'seconds': user_seconds,
+            'limit_seconds': user_limit,
+            'utilisation': _utilisation(user_seconds, user_limit),
+            'events': events,
+        })
+
+    user_count = len(users)
+    for event_name, category in categories.items():
+        if event_name in limits:
+            category['limit_seconds'] = int(limits[event_name] * 3600 * weeks) * user_count
+        else:
+            category['limit_seconds'] = sum(user['events'].get(event_name, {}).get('limit_seconds', 0)
+                                            for user in users)
+    for event_name, hours_limit in limits.items():
+        if event_name not in categories:
+            categories[event_name] = {'seconds': 0, 'users': 0,
+                                      'limit_seconds': int(hours_limit * 3600 * weeks) * user_count}
+    for category in categories.values():
+        category['utilisation'] = _utilisation(category['seconds'], category['limit_seconds'])
+
+    return {
+        'users': users,
+        'categories': dict(sorted(categories.items(), key=lambda item: -item[1]['seconds'])),
+        'errors': errors,
+        'approximate_users': approximate,
+    }
+
+
+def format_summary(summary):
+    """Текстовое представление сводки для терминала"""
+    def percent(value):
+        return f"{value:>6.1f}%" if value is not None else "      -"
+
+    lines = [f"Период: {summary['start']} - {summary['end']}, сотрудников: {len(summary['users'])}", "",
+             "По типам задач:"]
+    width = max((len(name) for name in summary['categories']), default=0)
+    for name, category in summary['categories'].items():
+        lines.append(f"  {name:<{width}}  {category['seconds'] / 3600:>9.1f} ч. "
+                     f"из {category['limit_seconds'] / 3600:>9.1f}  {percent(category['utilisation'])}")
+
+    lines += ["", "По сотрудникам:"]
+    width = max((len(user['user']) for user in summary['users']), default=0)
+    for user in summary['users']:
+        lines.append(f"  {user['user']:<{width}}  {user['seconds'] / 3600:>9.1f} ч. "
+                     f"из {user['limit_seconds'] / 3600:>9.1f}  {percent(user['utilisation'])}")
+
+    if summary['approximate_users']:
+        lines += ["", "Период захватывает архивные месяцы не целиком, суммы приблизительные "
+                      "(точны периоды из целых месяцев):"]
+        lines += [f"  {user}" for user in summary['approximate_users']]
+    if summary['errors']:
+        lines += ["", "Не удалось прочитать:"]
+        lines += [f"  {error}" for error in summary['errors']]
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Сводка учтенного времени по команде")
+    parser.add_argument('directory', help="каталог с базами сотрудников")
+    parser.add_argument('--config', default='config.json', help="конфиг с недельными лимитами")
+    parser.add_argument('--archive-name',
+                        help="имя файла архивной базы в каталоге сотрудника "
+                             "(по умолчанию из retention.archive_path конфига)")
+    parser.add_argument('--start', type=date.fromisoformat, help="начало периода (по умолчанию 6 дней назад)")
+    parser.add_argument('--end', type=date.fromisoformat, help="конец периода (по умолчанию сегодня)")
+    parser.add_argument('--workers', type=int, help="число процессов (по умолчанию по числу ядер)")
+    parser.add_argument('--json', action='store_true', help="вывести сводку в JSON")
+    args = parser.parse_args(argv)
+
+    end = args.end or current_day()
+    start = args.start or end - timedelta(days=6)
+    if start > end:
+        parser.error("начало периода позже конца")
+
+    with open(args.config, mode='r') as f:
+        limits = json.load(f)['type_events']
+
+    archive_name = args.archive_name
+    if archive_name is None:
+        archive_path = retention.configured_archive_path(args.config)
+        archive_name = Path(archive_path).name if archive_path else None
+    databases = find_databases(args.directory, archive_name)
+    if not databases:
+        print(f"В каталоге {args.directory} нет баз *.db", file=sys.stderr)
+        return 1
+
+    results = scan_databases(databases, start, end, args.workers)
+    summary = merge_results(results, limits, (end - start).days + 1)
+    summary = {'start': start.isoformat(), 'end': end.isoformat(), **summary}
+
+    if args.json:
+        json.dump(summary, sys.stdout, ensure_ascii=False, indent=2)
+        sys.stdout.write('\n')
+    else:
+        print(format_summary(summary))
+    return 0 if not summary['errors'] else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
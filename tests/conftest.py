@@ -0,0 +1,78 @@
+"""Общие фикстуры тестов
+
+Модули приложения лежат в корне репозитория, поэтому корень добавляется в
+sys.path.
+"""
+import os
+import random
+import sys
+from datetime import date, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import TaskRepository  # noqa: E402
+
+# Границы истории фикстуры history
+FIRST_DAY = date(2023, 11, 20)
+LAST_DAY = date(2025, 2, 10)
+EVENTS = ('Работа', 'Учеба', 'Отдых')
+
+
+@pytest.fixture
+def repository(tmp_path):
+    """TaskRepository с актуальной схемой во временном каталоге"""
+    repository = TaskRepository(str(tmp_path / 'main.db'))
+    repository.migrate()
+    yield repository
+    repository.close()
+
+
+@pytest.fixture
+def history(repository):
+    """
+    Случайные дневные суммы за FIRST_DAY - LAST_DAY, записанные в базу
+
+    Returns:
+        словарь {(тип задачи, день): секунды}
+    """
+    generator = random.Random(0)
+    values = {}
+    day = FIRST_DAY
+    while day <= LAST_DAY:
+        for event_name in EVENTS:
+            if generator.random() < 0.6:
+                values[(event_name, day)] = generator.randrange(1, 36000)
+        day += timedelta(days=1)
+    with repository.connection:
+        repository.connection.executemany(
+            "INSERT INTO tasks (event_name, date_day, complite_sec) VALUES (?, ?, ?)",
+            [(event_name, day.isoformat(), seconds) for (event_name, day), seconds in values.items()])
+    return values
+
+
+@pytest.fixture
+def brute_force():
+    """Функция (history, start, end) -> {тип задачи: секунды} перебором всех дней"""
+    def totals(values, start, end):
+        result = {}
+        for (event_name, day), seconds in values.items():
+            if start <= day <= end:
+                result[event_name] = result.get(event_name, 0) + seconds
+        return result
+    return totals
+
+
+def random_ranges(count, seed=1):
+    """Случайные диапазоны вокруг истории и диапазоны на границах месяцев и недель"""
+    generator = random.Random(seed)
+    span = (LAST_DAY - FIRST_DAY).days
+    ranges = []
+    for _ in range(count):
+        start = FIRST_DAY + timedelta(days=generator.randrange(-10, span))
+        ranges.append((start, start + timedelta(days=generator.randrange(0, 200))))
+    ranges += [(date(2024, 1, 1), date(2024, 1, 31)), (date(2024, 1, 29), date(2024, 3, 3)),
+               (date(2024, 2, 1), date(2024, 2, 29)), (date(2022, 1, 1), date(2022, 12, 31)),
+               (LAST_DAY, LAST_DAY + timedelta(days=30))]
+    return ranges
@@ -0,0 +1,99 @@
+"""Аналитика на NumPy: добавление пульсов на месте против перезагрузки"""
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+import analytics
+from analytics import DailySeries
+from conftest import EVENTS, FIRST_DAY, LAST_DAY
+
+TODAY = LAST_DAY + timedelta(days=3)
+
+
+@pytest.fixture(autouse=True)
+def today(monkeypatch):
+    monkeypatch.setattr(analytics, 'current_day', lambda: TODAY)
+
+
+def _add(repository, series, event_name, seconds, day):
+    series.add(event_name, seconds, day)
+    with repository.connection:
+        repository.connection.execute(repository.ADD_DAY_SECONDS, (event_name, day.isoformat(), seconds,
+                                                                    None, None, None))
+
+
+def _assert_same(series, reloaded):
+    reloaded.cumulative()
+    order = [series.event_names.index(name) for name in reloaded.event_names]
+    assert series.origin == reloaded.origin
+    np.testing.assert_array_equal(series.values[order], reloaded.values)
+    np.testing.assert_array_equal(series.cumulative()[order], reloaded.cumulative())
+    np.testing.assert_allclose(series.rolling_mean(7)[order], reloaded.rolling_mean(7))
+    np.testing.assert_allclose(series.weekday_heatmap(12)[order], reloaded.weekday_heatmap(12))
+    for mine, theirs in zip(series.streaks(), reloaded.streaks()):
+        np.testing.assert_array_equal(mine[order], theirs)
+
+
+def test_load_matches_history(repository, history):
+    series = DailySeries(repository, event_names=['Без данных'])
+
+    series.cumulative()
+
+    assert series.origin == FIRST_DAY
+    assert series.event_names[0] == 'Без данных'
+    for (event_name, day), seconds in list(history.items())[::50]:
+        assert series.values[series.event_names.index(event_name), (day - FIRST_DAY).days] == seconds
+    assert series.values.sum() == sum(history.values())
+
+
+def test_add_matches_reload(repository, history):
+    series = DailySeries(repository, event_names=EVENTS)
+    series.cumulative()
+
+    _add(repository, series, 'Работа', 600, TODAY)
+    _add(repository, series, 'Учеба', 300, LAST_DAY - timedelta(days=40))
+    # Новый тип задачи добавляет строку матрицы
+    _add(repository, series, 'Новое', 120, TODAY - timedelta(days=1))
+    series.rolling_mean(7)
+    _add(repository, series, 'Работа', 60, TODAY)
+
+    assert series.loads == 1
+    _assert_same(series, DailySeries(repository, event_names=EVENTS))
+
+
+def test_add_before_origin_reloads(repository, history):
+    series = DailySeries(repository)
+    series.cumulative()
+
+    _add(repository, series, 'Работа', 60, FIRST_DAY - timedelta(days=5))
+    series.cumulative()
+
+    assert series.loads == 2
+    assert series.origin == FIRST_DAY - timedelta(days=5)
+
+
+def test_streaks():
+    series = DailySeries.__new__(DailySeries)
+    series.origin = TODAY - timedelta(days=6)
+    series.values = np.array([[1, 1, 0, 1, 1, 1, 0],
+                              [0, 0, 0, 0, 0, 1, 1]], dtype=np.int64)
+    series._loaded = True
+
+    current, longest = series.streaks()
+
+    np.testing.assert_array_equal(current, [3, 2])
+    np.testing.assert_array_equal(longest, [3, 2])
+
+
+def test_archived_months_are_left_out(monkeypatch, repository, history):
+    monkeypatch.setattr('storage.current_day', lambda: TODAY)
+    repository.archive_old_days(keep_months=1)
+    _add(repository, DailySeries(repository), 'Работа', 60, TODAY)
+
+    series = DailySeries(repository)
+    series.cumulative()
+
+    # Архив - по декабрь 2024 года, история начинается с января
+    assert series.origin == date(2025, 1, 1)
+    assert series.values.sum() == sum(seconds for (_, day), seconds in history.items() if day >= series.origin) + 60
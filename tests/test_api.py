@@ -0,0 +1,92 @@
+"""Локальный JSON API: ETag, 304 и long-poll"""
+import json
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+from api import SnapshotServer
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def server():
+    server = SnapshotServer(_free_port())
+    assert server.start()
+    server.publish({'running': False})
+    yield server
+    server.stop()
+
+
+def _get(server, etag=None, wait=None, path='/state'):
+    url = f'http://127.0.0.1:{server.port}{path}' + (f'?wait={wait}' if wait is not None else '')
+    request = urllib.request.Request(url, headers={'If-None-Match': etag} if etag else {})
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status, response.headers['ETag'], json.loads(response.read())
+    except urllib.error.HTTPError as error:
+        return error.code, error.headers['ETag'], None
+
+
+def test_etag_and_not_modified(server):
+    status, etag, body = _get(server)
+    assert (status, etag, body['running'], body['version']) == (200, '"1"', False, 1)
+
+    assert _get(server, etag)[:2] == (304, etag)
+
+
+def test_same_payload_keeps_version(server):
+    assert server.publish({'running': False}) is False
+    assert _get(server)[1] == '"1"'
+
+
+def test_long_poll_wakes_on_publish(server):
+    _, etag, _ = _get(server)
+    timer = threading.Timer(0.2, server.publish, args=({'running': True},))
+    timer.start()
+    started = time.monotonic()
+
+    status, new_etag, body = _get(server, etag, wait=5)
+
+    timer.join()
+    assert (status, new_etag, body['running']) == (200, '"2"', True)
+    assert time.monotonic() - started < 5
+
+
+def test_long_poll_times_out_with_not_modified(server):
+    _, etag, _ = _get(server)
+    started = time.monotonic()
+
+    assert _get(server, etag, wait=0.3)[:2] == (304, etag)
+    assert time.monotonic() - started >= 0.3
+
+
+def test_unknown_path(server):
+    assert _get(server, path='/missing')[0] == 404
+
+
+def test_publish_without_running_server():
+    with socket.socket() as busy:
+        busy.bind(('127.0.0.1', 0))
+        busy.listen()
+        server = SnapshotServer(busy.getsockname()[1])
+        # Порт занят: сервер не запускается, но публикация не падает
+        assert not server.start()
+        assert server.publish({'running': True})
+        assert server._etag == '"1"' and json.loads(server._body)['running']
+        server.stop()
+
+
+def test_publish_after_stop(server):
+    server.stop()
+
+    assert server.publish({'running': True})
+    assert server._etag == f'"{server.version}"'
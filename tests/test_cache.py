@@ -0,0 +1,121 @@
+"""Кэш сумм для прогресс-баров и определение внешних изменений базы"""
+import sqlite3
+from datetime import date, datetime, timedelta
+
+import pytest
+
+import cache
+from cache import AggregateCache, ExternalChangeDetector
+from heartbeat import HeartbeatWriter
+
+START = datetime(2024, 5, 6, 9, 0, 0)
+
+
+@pytest.fixture
+def writer(repository):
+    writer = HeartbeatWriter(repository.db_path, flush_interval=0.01, compact=False, repository=repository)
+    yield writer
+    writer.close()
+
+
+def _external_write(repository, day='2024-05-06'):
+    connection = sqlite3.connect(repository.db_path)
+    with connection:
+        connection.execute(repository.ADD_DAY_SECONDS, ('Чужое', day, 5, None, None, None))
+    connection.close()
+
+
+def test_own_commits_are_not_external(repository, writer):
+    detector = ExternalChangeDetector(repository, writer)
+    detector.reset()
+
+    for minutes in (1, 2, 3):
+        writer.submit_session('Работа', START, START + timedelta(minutes=minutes))
+        assert writer.flush(2)
+        assert not detector.changed()
+
+
+def test_external_commit_is_detected(repository, writer):
+    detector = ExternalChangeDetector(repository, writer)
+    writer.submit_session('Работа', START, START + timedelta(minutes=1))
+    assert writer.flush(2)
+    detector.reset()
+
+    _external_write(repository)
+
+    assert detector.changed()
+    detector.reset()
+    assert not detector.changed()
+
+
+def test_external_commit_before_own_commit_is_detected(repository, writer):
+    detector = ExternalChangeDetector(repository, writer)
+    detector.reset()
+
+    # После своего коммита data_version совпадает с запомненной писателем,
+    # но чужой коммит перед ним все равно замечен
+    _external_write(repository)
+    writer.submit_session('Работа', START, START + timedelta(minutes=1))
+    assert writer.flush(2)
+
+    assert repository.data_version() == writer.data_version
+    assert detector.changed()
+
+
+def test_without_writer_every_commit_is_external(repository):
+    detector = ExternalChangeDetector(repository)
+    detector.reset()
+    assert not detector.changed()
+
+    _external_write(repository)
+
+    assert detector.changed()
+
+
+def test_cache_reloads_on_day_change(monkeypatch, repository):
+    today = date(2024, 5, 10)
+    monkeypatch.setattr(cache, 'current_day', lambda: today)
+    with repository.connection:
+        for offset in range(8):
+            day = (today - timedelta(days=offset)).isoformat()
+            repository.connection.execute(repository.ADD_DAY_SECONDS, ('Работа', day, 100, None, None, None))
+    aggregate = AggregateCache(repository)
+
+    assert aggregate.today_seconds('Работа') == 100
+    assert aggregate.week_seconds('Работа') == 700
+    aggregate.add('Работа', 50)
+    assert aggregate.period_totals('День') == {'Работа': 150}
+    assert aggregate.loads == 1
+
+    # Новые сутки: окно сдвигается, за новый день еще ничего нет
+    today = date(2024, 5, 11)
+    assert aggregate.today_seconds('Работа') == 0
+    assert aggregate.week_seconds('Работа') == 600
+    assert aggregate.loads == 2
+
+
+def test_cache_includes_queued_pulses(monkeypatch, repository):
+    monkeypatch.setattr(cache, 'current_day', lambda: START.date())
+    # Пульсы копятся в очереди и не записываются до close()
+    writer = HeartbeatWriter(repository.db_path, flush_interval=60, compact=False, repository=repository)
+    try:
+        writer.submit_session('Работа', START, START + timedelta(minutes=10))
+        aggregate = AggregateCache(repository, writer)
+
+        assert aggregate.today_seconds('Работа') == 600
+    finally:
+        writer.close()
+
+    aggregate.invalidate()
+    assert aggregate.today_seconds('Работа') == 600
+
+
+def test_check_external_changes_invalidates(repository):
+    aggregate = AggregateCache(repository)
+    aggregate.period_totals('Неделя')
+
+    _external_write(repository, date.today().isoformat())
+    aggregate.check_external_changes()
+    aggregate.period_totals('Неделя')
+
+    assert aggregate.loads == 2
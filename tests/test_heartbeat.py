@@ -0,0 +1,118 @@
+"""Фоновая запись пульсов: прирост дневных сумм, повтор после ошибки и усечение журнала"""
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+from heartbeat import HeartbeatWriter
+from journal import HeartbeatJournal
+from storage import TaskRepository
+
+START = datetime(2024, 5, 6, 23, 50, 0)
+
+
+def _day_totals(repository):
+    return dict(((event_name, day), seconds) for event_name, day, seconds in repository.connection.execute(
+        "SELECT event_name, date_day, complite_sec FROM tasks"))
+
+
+def _sessions(repository):
+    return repository.connection.execute(
+        "SELECT event_name, start_datetime, end_datetime FROM sessions").fetchall()
+
+
+@pytest.fixture
+def writer(repository):
+    writer = HeartbeatWriter(repository.db_path, flush_interval=0.01, compact=False)
+    yield writer
+    writer.close()
+
+
+def test_pulses_add_only_new_time(repository, writer):
+    for minutes in (5, 10, 20):
+        writer.submit_session('Работа', START, START + timedelta(minutes=minutes), hour_week_limit=40)
+        assert writer.flush(2)
+
+    assert _day_totals(repository) == {('Работа', '2024-05-06'): 600, ('Работа', '2024-05-07'): 600}
+    assert [tuple(row) for row in _sessions(repository)] == [
+        ('Работа', '2024-05-06 23:50:00', '2024-05-07 00:10:00')]
+    assert repository.connection.execute("SELECT MAX(hour_week_limit) FROM tasks").fetchone()[0] == 40
+
+
+def test_repeated_pulses_collapse(repository):
+    # Пока очередь не записана, пульсы одного интервала схлопываются
+    writer = HeartbeatWriter(repository.db_path, flush_interval=60, compact=False)
+    try:
+        for minutes in range(1, 6):
+            writer.submit_session('Работа', START, START + timedelta(minutes=minutes))
+        assert writer.queued_sessions() == {('Работа', START): START + timedelta(minutes=5)}
+    finally:
+        writer.close()
+
+    assert _day_totals(repository) == {('Работа', '2024-05-06'): 300}
+
+
+def test_closed_session_starts_fresh(repository, writer):
+    writer.submit_session('Работа', START, START + timedelta(minutes=1), closed=True)
+    later = START + timedelta(minutes=2)
+    writer.submit_session('Работа', later, later + timedelta(minutes=1), closed=True)
+    assert writer.flush(2)
+
+    assert _day_totals(repository) == {('Работа', '2024-05-06'): 120}
+    assert len(_sessions(repository)) == 2
+
+
+def test_failed_write_is_retried(monkeypatch, repository, writer):
+    calls = []
+    write_sessions = TaskRepository.write_sessions
+
+    def failing_once(self, session_rows, day_rows):
+        calls.append(len(day_rows))
+        if len(calls) == 1:
+            raise sqlite3.OperationalError("database is locked")
+        return write_sessions(self, session_rows, day_rows)
+
+    monkeypatch.setattr(TaskRepository, 'write_sessions', failing_once)
+
+    writer.submit_session('Работа', START, START + timedelta(minutes=1))
+    assert writer.flush(2)
+
+    assert len(calls) == 2
+    assert _day_totals(repository) == {('Работа', '2024-05-06'): 60}
+
+
+def test_journal_is_truncated_after_commit(monkeypatch, tmp_path, repository):
+    journal = HeartbeatJournal(str(tmp_path / 'main.db.ticks'), slots=16)
+    writer = HeartbeatWriter(repository.db_path, flush_interval=0.01, compact=False, journal=journal)
+    write_sessions = TaskRepository.write_sessions
+    failures = []
+
+    def failing(self, session_rows, day_rows):
+        if failures:
+            raise sqlite3.OperationalError(failures[0])
+        return write_sessions(self, session_rows, day_rows)
+
+    try:
+        journal.append('Работа', START, START + timedelta(seconds=1))
+        writer.submit_session('Работа', START, START + timedelta(seconds=1))
+        assert writer.flush(2)
+        assert journal.committed == 1
+        assert journal.pending() == {}
+
+        # Пока запись не удается, тики остаются в журнале
+        monkeypatch.setattr(TaskRepository, 'write_sessions', failing)
+        failures.append("disk I/O error")
+        journal.append('Работа', START, START + timedelta(seconds=2))
+        writer.submit_session('Работа', START, START + timedelta(seconds=2))
+        assert not writer.flush(0.2)
+        assert journal.committed == 1
+        assert journal.pending() == {('Работа', START): START + timedelta(seconds=2)}
+
+        failures.clear()
+        assert writer.flush(2)
+        assert journal.committed == 2
+    finally:
+        writer.close()
+        journal.close()
+
+    assert _day_totals(repository) == {('Работа', '2024-05-06'): 2}
@@ -0,0 +1,96 @@
+"""Журнал тиков: двоичный формат, восстановление и повторное воспроизведение"""
+import shutil
+from datetime import datetime, timedelta
+
+import journal
+from journal import HeartbeatJournal
+
+START = datetime(2024, 5, 6, 23, 0, 0)
+
+
+def _day_totals(repository):
+    return dict(((event_name, day), seconds) for event_name, day, seconds in repository.connection.execute(
+        "SELECT event_name, date_day, complite_sec FROM tasks"))
+
+
+def _write_ticks(path, count, event_name='Работа', start=START):
+    ticks = HeartbeatJournal(path, slots=16)
+    for second in range(1, count + 1):
+        ticks.append(event_name, start, start + timedelta(seconds=second))
+    return ticks
+
+
+def test_pending_survives_reopen(tmp_path):
+    path = str(tmp_path / 'main.db.ticks')
+    _write_ticks(path, 40).close()
+
+    ticks = HeartbeatJournal(path, slots=16)
+
+    assert ticks.pending() == {('Работа', START): START + timedelta(seconds=40)}
+    assert ticks.sequence == 40
+    ticks.close()
+
+
+def test_record_layout(tmp_path):
+    path = str(tmp_path / 'main.db.ticks')
+    _write_ticks(path, 1).close()
+
+    with open(path, 'rb') as f:
+        data = f.read()
+    assert len(data) == journal.HEADER_SIZE + 16 * journal.RECORD_SIZE
+    assert journal.HEADER.unpack_from(data, 0) == (journal.MAGIC, 0)
+    offset = journal.HEADER_SIZE + 1 * journal.RECORD_SIZE
+    sequence, start, end, length = journal.RECORD_HEADER.unpack_from(data, offset)
+    assert (sequence, end - start, length) == (1, 1, len('Работа'.encode('utf-8')))
+
+
+def test_torn_record_is_ignored(tmp_path):
+    path = str(tmp_path / 'main.db.ticks')
+    _write_ticks(path, 3).close()
+    # Последняя запись оборвана: контрольная сумма не сходится
+    offset = journal.HEADER_SIZE + 3 * journal.RECORD_SIZE + journal.RECORD_HEADER.size
+    with open(path, 'r+b') as f:
+        f.seek(offset)
+        f.write(b'X')
+
+    ticks = HeartbeatJournal(path, slots=16)
+
+    assert ticks.pending() == {('Работа', START): START + timedelta(seconds=2)}
+    ticks.close()
+
+
+def test_truncate_hides_committed_ticks(tmp_path):
+    path = str(tmp_path / 'main.db.ticks')
+    ticks = _write_ticks(path, 5)
+    ticks.truncate(5)
+    ticks.close()
+
+    ticks = HeartbeatJournal(path, slots=16)
+
+    assert ticks.pending() == {}
+    ticks.append('Работа', START, START + timedelta(seconds=6))
+    assert ticks.sequence == 6
+    ticks.close()
+
+
+def test_replay_splits_by_day_and_is_idempotent(tmp_path, repository):
+    path = str(tmp_path / 'main.db.ticks')
+    _write_ticks(path, 5400).close()
+    shutil.copy(path, str(tmp_path / 'copy.ticks'))
+
+    ticks = HeartbeatJournal(path, slots=16)
+    assert ticks.replay(repository) == 1
+    ticks.close()
+    expected = {('Работа', '2024-05-06'): 3600, ('Работа', '2024-05-07'): 1800}
+    assert _day_totals(repository) == expected
+
+    # Журнал усечен: повторный запуск ничего не воспроизводит
+    ticks = HeartbeatJournal(path, slots=16)
+    assert ticks.replay(repository) == 0
+    ticks.close()
+
+    # Те же тики из копии журнала (например, сбой до усечения) не учитываются дважды
+    ticks = HeartbeatJournal(str(tmp_path / 'copy.ticks'), slots=16)
+    assert ticks.replay(repository) == 1
+    ticks.close()
+    assert _day_totals(repository) == expected
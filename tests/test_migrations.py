@@ -0,0 +1,74 @@
+"""Миграции схемы: обновление старой базы с дублями дней"""
+import sqlite3
+
+import pytest
+
+import migrations
+
+
+def _old_database(path):
+    """База версии 0: таблица из init.sql без уникального ключа"""
+    connection = sqlite3.connect(path)
+    connection.executescript(migrations._read_init_sql())
+    connection.executemany(
+        "INSERT INTO tasks (event_name, date_day, complite_sec, hour_week_limit, start_datetime, last_update) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        [
+            ('Работа', '2024-01-01', 100, 40, '2024-01-01 09:00:00', '2024-01-01 09:02:00'),
+            ('Работа', '2024-01-01', 300, None, '2024-01-01 08:00:00', '2024-01-01 09:05:00'),
+            ('Работа', '2024-01-01', None, None, None, None),
+            ('Работа', '2024-01-02', 50, 40, None, None),
+            ('Учеба', '2024-01-01', 70, 10, None, None),
+            ('Учеба', '2024-01-01', 70, 10, None, None),
+        ],
+    )
+    connection.commit()
+    return connection
+
+
+def test_v2_merges_duplicate_days_by_max(tmp_path):
+    connection = _old_database(str(tmp_path / 'old.db'))
+
+    applied = migrations.migrate(connection)
+
+    assert applied == [version for version, _ in migrations.MIGRATIONS]
+    assert migrations.get_version(connection) == migrations.SCHEMA_VERSION
+    rows = connection.execute(
+        "SELECT event_name, date_day, complite_sec, hour_week_limit, start_datetime, last_update "
+        "FROM tasks ORDER BY event_name, date_day").fetchall()
+    assert rows == [
+        ('Работа', '2024-01-01', 300, 40, '2024-01-01 08:00:00', '2024-01-01 09:05:00'),
+        ('Работа', '2024-01-02', 50, 40, None, None),
+        ('Учеба', '2024-01-01', 70, 10, None, None),
+    ]
+    connection.close()
+
+
+def test_v2_adds_unique_day_key(tmp_path):
+    connection = _old_database(str(tmp_path / 'old.db'))
+    migrations.migrate(connection)
+
+    with pytest.raises(sqlite3.IntegrityError):
+        connection.execute("INSERT INTO tasks (event_name, date_day, complite_sec) VALUES ('Работа', '2024-01-01', 1)")
+    connection.close()
+
+
+def test_rollups_match_merged_days(tmp_path):
+    connection = _old_database(str(tmp_path / 'old.db'))
+    migrations.migrate(connection)
+
+    months = dict(((event_name, month), total) for event_name, month, total in connection.execute(
+        "SELECT event_name, month_start, total_sec FROM rollup_month"))
+    assert months == {('Работа', '2024-01-01'): 350, ('Учеба', '2024-01-01'): 70}
+    weeks = connection.execute("SELECT SUM(total_sec) FROM rollup_week").fetchone()[0]
+    assert weeks == 420
+    connection.close()
+
+
+def test_migrate_is_noop_on_current_schema(tmp_path):
+    connection = _old_database(str(tmp_path / 'old.db'))
+    migrations.migrate(connection)
+
+    assert migrations.migrate(connection) == []
+    assert connection.execute("SELECT COUNT(*) FROM tasks").fetchone()[0] == 3
+    connection.close()
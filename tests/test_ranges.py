@@ -0,0 +1,62 @@
+"""Префиксные суммы за произвольные диапазоны против перебора"""
+from datetime import date, timedelta
+
+from conftest import LAST_DAY, FIRST_DAY, random_ranges
+from ranges import PrefixSumIndex, previous_range
+
+
+def test_prefix_index_matches_brute_force(repository, history, brute_force):
+    index = PrefixSumIndex(repository)
+    for start, end in random_ranges(100):
+        assert index.range_totals(start, end) == brute_force(history, start, end), (start, end)
+    assert index.loads == 1
+
+
+def test_add_matches_reload(repository, history, brute_force):
+    index = PrefixSumIndex(repository)
+    index.range_totals(FIRST_DAY, LAST_DAY)
+
+    for event_name, day, seconds in [('Работа', LAST_DAY, 60), ('Учеба', LAST_DAY + timedelta(days=3), 120),
+                                     ('Новое', date(2024, 6, 1), 30)]:
+        index.add(event_name, seconds, day)
+        repository.connection.execute(repository.ADD_DAY_SECONDS, (event_name, day.isoformat(), seconds,
+                                                                    None, None, None))
+        history[(event_name, day)] = history.get((event_name, day), 0) + seconds
+    repository.connection.commit()
+
+    reloaded = PrefixSumIndex(repository)
+    for start, end in random_ranges(50, seed=2):
+        expected = brute_force(history, start, end)
+        assert index.range_totals(start, end) == expected, (start, end)
+        assert reloaded.range_totals(start, end) == expected, (start, end)
+    assert index.loads == 1
+
+
+def test_add_before_history_rebuilds(repository, history):
+    index = PrefixSumIndex(repository)
+    index.range_totals(FIRST_DAY, LAST_DAY)
+
+    index.add('Работа', 10, FIRST_DAY - timedelta(days=1))
+    repository.connection.execute(repository.ADD_DAY_SECONDS, ('Работа', (FIRST_DAY - timedelta(days=1)).isoformat(),
+                                                                10, None, None, None))
+    repository.connection.commit()
+
+    assert index.range_seconds('Работа', FIRST_DAY - timedelta(days=1), FIRST_DAY - timedelta(days=1)) == 10
+    assert index.loads == 2
+
+
+def test_previous_range_has_same_length():
+    assert previous_range(date(2024, 3, 1), date(2024, 3, 10)) == (date(2024, 2, 20), date(2024, 2, 29))
+
+
+def test_compare_reports_difference(repository, history):
+    index = PrefixSumIndex(repository)
+    first = (date(2024, 1, 1), date(2024, 1, 31))
+    second = (date(2024, 2, 1), date(2024, 2, 29))
+
+    comparison = index.compare(first, second)
+
+    for event_name, (before, after, difference) in comparison.items():
+        assert before == index.range_seconds(event_name, *first)
+        assert after == index.range_seconds(event_name, *second)
+        assert difference == after - before
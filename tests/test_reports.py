@@ -0,0 +1,129 @@
+"""Отчеты командной строки: вывод, архивные месяцы и открытие базы только на чтение"""
+import json
+import sqlite3
+from datetime import date
+
+import reports
+from storage import TaskRepository
+
+
+def _run(capsys, *argv):
+    code = reports.main(list(argv))
+    captured = capsys.readouterr()
+    return code, captured.out, captured.err
+
+
+def _fill(repository):
+    with repository.connection:
+        repository.connection.executemany(
+            "INSERT INTO tasks (event_name, date_day, complite_sec) VALUES (?, ?, ?)",
+            [('Работа', '2024-01-10', 7200), ('Работа', '2024-02-15', 3600),
+             ('Учеба', '2024-02-16', 1800), ('Отдых', '2024-04-01', 900)])
+
+
+def test_range_report_text_and_json(capsys, repository):
+    _fill(repository)
+
+    code, out, _ = _run(capsys, 'range', '--db', repository.db_path, '--archive-db', '',
+                        '--start', '2024-02-01', '--end', '2024-02-29')
+    assert code == 0
+    lines = out.splitlines()
+    assert lines[0] == "Диапазон (2024-02-01 - 2024-02-29): 1.5 часов"
+    assert lines[1].split() == ['Работа', '1.0', 'ч.', '66.7%']
+    assert lines[2].split() == ['Учеба', '0.5', 'ч.', '33.3%']
+    assert len(lines) == 3
+
+    code, out, _ = _run(capsys, 'range', '--db', repository.db_path, '--archive-db', '',
+                        '--start', '2024-02-01', '--end', '2024-02-29', '--compare', '--json')
+    assert code == 0
+    report = json.loads(out)
+    assert report['total_seconds'] == 5400
+    assert report['previous_total_seconds'] == 7200
+    assert report['difference_seconds'] == -1800
+    assert not report['approximate']
+    assert [event['event_name'] for event in report['events']] == ['Работа', 'Учеба']
+
+
+def test_empty_day_is_unaccounted(capsys, repository):
+    code, out, _ = _run(capsys, 'day', '--db', repository.db_path, '--archive-db', '', '--json')
+
+    assert code == 0
+    report = json.loads(out)
+    assert report['total_seconds'] == 24 * 3600
+    assert report['events'] == [{'event_name': reports.UNACCOUNTED, 'seconds': 24 * 3600,
+                                 'hours': 24.0, 'percent': 100.0}]
+
+
+def test_partial_archive_month_is_approximate(capsys, tmp_path, repository):
+    _fill(repository)
+    archive_path = str(tmp_path / 'archive.db')
+    repository.attach_archive(archive_path)
+    repository.archive_old_days(keep_months=1)
+    repository.close()
+
+    code, out, _ = _run(capsys, 'range', '--db', repository.db_path, '--archive-db', archive_path,
+                        '--start', '2024-01-01', '--end', '2024-02-29', '--json')
+    report = json.loads(out)
+    assert code == 0 and report['total_seconds'] == 12600 and not report['approximate']
+
+    code, out, _ = _run(capsys, 'range', '--db', repository.db_path, '--archive-db', archive_path,
+                        '--start', '2024-02-10', '--end', '2024-02-29')
+    assert code == 0
+    assert "Суммы приблизительные" in out and '2024-02-01' in out
+
+    # Архивной базы еще нет: отчет строится без нее и не создает файл
+    code, _, _ = _run(capsys, 'range', '--db', repository.db_path, '--archive-db', str(tmp_path / 'none.db'),
+                      '--start', '2024-01-01', '--end', '2024-02-29')
+    assert code == 0 and not (tmp_path / 'none.db').exists()
+
+
+def test_report_does_not_write(capsys, repository):
+    _fill(repository)
+    repository.close()
+    path = repository.db_path
+    with open(path, 'rb') as file:
+        before = file.read()
+
+    code, _, _ = _run(capsys, 'month', '--db', path, '--archive-db', '')
+
+    assert code == 0
+    with open(path, 'rb') as file:
+        assert file.read() == before
+    # Соединение отчета не может писать в базу
+    read_only = TaskRepository(path, read_only=True)
+    try:
+        try:
+            read_only.connection.execute("DELETE FROM tasks")
+        except sqlite3.OperationalError as error:
+            assert 'readonly' in str(error)
+        else:
+            raise AssertionError("запись в базу, открытую только на чтение")
+    finally:
+        read_only.close()
+
+
+def test_missing_database(capsys, tmp_path):
+    path = tmp_path / 'main.db'
+
+    code, out, err = _run(capsys, 'day', '--db', str(path), '--archive-db', '')
+
+    assert code == 1 and out == ''
+    assert 'Запустите приложение' in err
+    assert not path.exists()
+
+
+def test_outdated_schema(capsys, tmp_path):
+    path = str(tmp_path / 'main.db')
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE tasks (event_name TEXT, date_day DATE, complite_sec INTEGER)")
+    connection.execute("PRAGMA user_version = 1")
+    connection.commit()
+    connection.close()
+
+    code, out, err = _run(capsys, 'range', '--db', path, '--archive-db', '', '--start', str(date(2024, 1, 1)))
+
+    assert code == 1 and out == ''
+    assert 'устарела' in err and 'retention.py' in err
+    connection = sqlite3.connect(path)
+    assert connection.execute("PRAGMA user_version").fetchone()[0] == 1
+    connection.close()
@@ -0,0 +1,134 @@
+"""Архив старых дневных сумм: точность сумм, импорт архива и incremental_vacuum"""
+import sqlite3
+import time
+from datetime import date
+
+import pytest
+
+import retention
+import rollups
+import transfer
+from ranges import PrefixSumIndex
+from storage import TaskRepository
+
+
+def _month_totals(connection):
+    return dict(((event_name, month), seconds) for event_name, month, seconds in connection.execute(
+        "SELECT event_name, month_start, total_sec FROM rollup_month WHERE total_sec != 0"))
+
+
+def test_month_cutoff():
+    assert retention.month_cutoff(date(2024, 3, 15), 1) == date(2024, 2, 1)
+    assert retention.month_cutoff(date(2024, 1, 31), 13) == date(2022, 12, 1)
+    with pytest.raises(ValueError):
+        retention.month_cutoff(date(2024, 3, 15), 0)
+
+
+def test_partial_months():
+    assert retention.partial_months(date(2024, 2, 1), date(2024, 2, 29)) == set()
+    assert retention.partial_months(date(2024, 2, 10), date(2024, 3, 31)) == {'2024-02-01'}
+    assert retention.partial_months(date(2024, 2, 10), date(2024, 2, 11)) == {'2024-02-01'}
+    assert retention.partial_months(date(2024, 1, 1), date(2024, 3, 3)) == {'2024-03-01'}
+
+
+def test_month_aligned_ranges_stay_exact(repository, history, brute_force):
+    start, end = date(2024, 1, 1), date(2024, 6, 30)
+    expected = brute_force(history, start, end)
+    months = _month_totals(repository.connection)
+
+    deleted, moved = repository.archive_old_days(keep_months=1)
+
+    assert deleted == len(history) and moved == 0
+    assert repository.connection.execute("SELECT COUNT(*) FROM tasks").fetchone()[0] == 0
+    assert _month_totals(repository.connection) == months
+    index = PrefixSumIndex(repository)
+    assert index.range_totals(start, end) == expected
+    assert index.partial_archive_months(start, end) == []
+    assert dict(rollups.range_totals(repository.connection, start, end)) == expected
+    # Граница внутри архивного месяца: сумма помечается как приблизительная
+    assert index.partial_archive_months(date(2024, 2, 10), end) == ['2024-02-01']
+
+
+def test_archive_database(tmp_path, repository, history, brute_force):
+    repository.attach_archive(str(tmp_path / 'archive.db'))
+    _, moved = repository.archive_old_days(keep_months=1)
+    assert moved > 0
+    assert repository.connection.execute("SELECT COUNT(*) FROM main.archive_month").fetchone()[0] == 0
+
+    # Новое соединение видит архив только после подключения архивной базы
+    other = TaskRepository(repository.db_path)
+    try:
+        assert PrefixSumIndex(other).range_totals(date(2024, 1, 1), date(2024, 1, 31)) == {}
+        other.attach_archive(str(tmp_path / 'archive.db'))
+        assert (PrefixSumIndex(other).range_totals(date(2024, 1, 1), date(2024, 1, 31))
+                == brute_force(history, date(2024, 1, 1), date(2024, 1, 31)))
+    finally:
+        other.close()
+
+
+def test_archived_months_are_not_counted_twice(repository, history):
+    records = [{'event_name': 'Работа', 'date_day': '2024-03-05', 'complite_sec': '600'}]
+    repository.archive_old_days(keep_months=1)
+    archived = list(transfer.export_rows(repository.connection, 'archive'))
+    months = _month_totals(repository.connection)
+
+    assert transfer.import_tasks(repository.connection, records) == (1, 1)
+    assert transfer.import_sessions(repository.connection, [
+        {'event_name': 'Работа', 'start_datetime': '2024-03-05T09:00:00', 'end_datetime': '2024-03-05T10:00:00'},
+    ]) == (1, 1)
+    assert retention.import_archive(repository.connection, iter(archived)) == (len(archived), len(archived))
+
+    assert repository.connection.execute("SELECT COUNT(*) FROM tasks").fetchone()[0] == 0
+    assert _month_totals(repository.connection) == months
+
+
+def test_archive_import_is_idempotent(tmp_path, repository, history):
+    months = _month_totals(repository.connection)
+    repository.archive_old_days(keep_months=1)
+    archived = list(transfer.export_rows(repository.connection, 'archive'))
+
+    target = TaskRepository(str(tmp_path / 'other.db'))
+    target.migrate()
+    try:
+        assert retention.import_archive(target.connection, iter(archived)) == (len(archived), 0)
+        assert retention.import_archive(target.connection, iter(archived)) == (len(archived), len(archived))
+        assert _month_totals(target.connection) == months
+    finally:
+        target.close()
+
+
+def test_incremental_vacuum_frees_pages(repository, history):
+    assert repository.connection.execute("PRAGMA auto_vacuum").fetchone()[0] == retention.AUTO_VACUUM_INCREMENTAL
+    repository.archive_old_days(keep_months=1)
+    assert repository.connection.execute("PRAGMA freelist_count").fetchone()[0] > 0
+
+    assert repository.incremental_vacuum() == 0
+
+
+def test_opening_existing_database_is_not_a_write(repository):
+    # Иначе каждое новое соединение выглядело бы внешним коммитом (cache.ExternalChangeDetector)
+    version = repository.data_version()
+
+    TaskRepository(repository.db_path).close()
+
+    assert repository.data_version() == version
+    assert repository.connection.execute("PRAGMA auto_vacuum").fetchone()[0] == retention.AUTO_VACUUM_INCREMENTAL
+
+
+def test_maintenance_does_not_wait_for_busy_database(repository, history):
+    other = sqlite3.connect(repository.db_path)
+    other.execute("BEGIN IMMEDIATE")
+    try:
+        started = time.perf_counter()
+        with pytest.raises(sqlite3.OperationalError):
+            with repository.busy_timeout(0):
+                repository.archive_old_days(keep_months=1, months=1)
+        assert time.perf_counter() - started < 1
+    finally:
+        other.rollback()
+        other.close()
+
+    # Таймаут восстановлен, неудачный шаг ничего не изменил
+    assert repository.connection.execute("PRAGMA busy_timeout").fetchone()[0] == 5000
+    assert repository.connection.execute("SELECT COUNT(*) FROM tasks").fetchone()[0] == len(history)
+    assert repository.archive_old_days(keep_months=1, months=1)[0] > 0
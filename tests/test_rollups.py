@@ -0,0 +1,64 @@
+"""Агрегаты по неделям и месяцам: разбивка диапазона и суммы против перебора"""
+from datetime import timedelta
+
+import pytest
+
+import rollups
+from conftest import random_ranges
+
+
+def _days(start, end):
+    return [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+
+
+@pytest.mark.parametrize('start, end', random_ranges(200))
+def test_split_range_covers_each_day_once(start, end):
+    days, weeks, months = rollups.split_range(start, end)
+
+    covered = list(days)
+    for week in weeks:
+        assert week.weekday() == 0
+        covered += _days(week, week + timedelta(days=6))
+    for month in months:
+        assert month.day == 1
+        covered += _days(month, rollups._next_month(month) - timedelta(days=1))
+    assert sorted(covered) == _days(start, end)
+
+
+def test_range_totals_match_brute_force(repository, history, brute_force):
+    for start, end in random_ranges(100):
+        totals = {event_name: seconds for event_name, seconds in rollups.range_totals(repository.connection, start, end)
+                  if seconds}
+        assert totals == brute_force(history, start, end), (start, end)
+
+
+def test_rollups_follow_updates_and_deletes(repository, history, brute_force):
+    changed = sorted(history)[::7]
+    with repository.connection:
+        for event_name, day in changed[::2]:
+            repository.connection.execute("UPDATE tasks SET complite_sec = complite_sec + 100 "
+                                          "WHERE event_name = ? AND date_day = ?", (event_name, day.isoformat()))
+            history[(event_name, day)] += 100
+        for event_name, day in changed[1::2]:
+            repository.connection.execute("DELETE FROM tasks WHERE event_name = ? AND date_day = ?",
+                                          (event_name, day.isoformat()))
+            del history[(event_name, day)]
+
+    for start, end in random_ranges(50, seed=3):
+        totals = {event_name: seconds for event_name, seconds in rollups.range_totals(repository.connection, start, end)
+                  if seconds}
+        assert totals == brute_force(history, start, end), (start, end)
+
+
+def test_rebuild_restores_rollups(repository, history):
+    expected = repository.connection.execute(
+        "SELECT event_name, month_start, total_sec FROM rollup_month ORDER BY 1, 2").fetchall()
+    with repository.connection:
+        repository.connection.execute("DELETE FROM rollup_month")
+        repository.connection.execute("DELETE FROM rollup_week")
+
+    rollups.rebuild(repository.connection)
+
+    assert repository.connection.execute(
+        "SELECT event_name, month_start, total_sec FROM rollup_month ORDER BY 1, 2").fetchall() == expected
+    assert repository.connection.execute("SELECT SUM(total_sec) FROM rollup_week").fetchone()[0] == sum(history.values())
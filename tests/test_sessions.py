@@ -0,0 +1,107 @@
+"""Журнал интервалов: разбивка по суткам и часам, почасовая статистика и уплотнение"""
+from datetime import date, datetime, timedelta
+
+import sessions
+
+NOW = datetime(2024, 6, 1, 12, 0, 0)
+
+
+def _insert(repository, *intervals):
+    with repository.connection:
+        repository.connection.executemany(sessions.UPSERT_SESSION, [
+            (event_name, sessions.format_time(start), sessions.format_time(end))
+            for event_name, start, end in intervals])
+
+
+def _stored(repository):
+    return [(event_name, sessions.parse_time(start), sessions.parse_time(end))
+            for event_name, start, end in repository.connection.execute(
+                "SELECT event_name, start_datetime, end_datetime FROM sessions ORDER BY event_name, start_datetime")]
+
+
+def test_split_by_day_and_hour():
+    start = datetime(2024, 5, 6, 22, 30, 0)
+    end = datetime(2024, 5, 7, 1, 15, 0)
+
+    assert sessions.split_by_day(start, end) == [(date(2024, 5, 6), 5400), (date(2024, 5, 7), 4500)]
+    assert sessions.split_by_hour(start, end) == [(22, 1800), (23, 3600), (0, 3600), (1, 900)]
+    assert sessions.split_by_day(end, end) == []
+
+
+def test_upsert_only_extends(repository):
+    start = datetime(2024, 5, 6, 9, 0, 0)
+    _insert(repository, ('Работа', start, start + timedelta(minutes=10)))
+    _insert(repository, ('Работа', start, start + timedelta(minutes=5)))
+
+    assert _stored(repository) == [('Работа', start, start + timedelta(minutes=10))]
+
+
+def test_hourly_totals_clip_to_range(repository):
+    _insert(repository,
+            ('Работа', datetime(2024, 5, 6, 8, 30), datetime(2024, 5, 6, 10, 15)),
+            ('Учеба', datetime(2024, 5, 6, 9, 0), datetime(2024, 5, 6, 9, 30)))
+
+    hours = sessions.hourly_totals(repository.connection, datetime(2024, 5, 6, 9), datetime(2024, 5, 6, 10, 10))
+
+    assert hours[9] == 3600 + 1800
+    assert hours[10] == 600
+    assert sum(hours) == 3600 + 1800 + 600
+    assert sum(sessions.hourly_totals(repository.connection, datetime(2024, 5, 6), datetime(2024, 5, 7),
+                                      event_name='Учеба')) == 1800
+
+
+def test_compact_merges_only_old_short_gaps(repository):
+    old = NOW - timedelta(days=40)
+    recent = NOW - timedelta(days=1)
+    _insert(repository,
+            ('Работа', old, old + timedelta(minutes=30)),
+            # Пауза 2 минуты - сливается
+            ('Работа', old + timedelta(minutes=32), old + timedelta(minutes=60)),
+            # Вложенный интервал - сливается, конец не уменьшается
+            ('Работа', old + timedelta(minutes=40), old + timedelta(minutes=50)),
+            # Пауза 10 минут - остается отдельным
+            ('Работа', old + timedelta(minutes=70), old + timedelta(minutes=80)),
+            # Другой тип задачи не сливается с соседним
+            ('Учеба', old + timedelta(minutes=30), old + timedelta(minutes=40)),
+            # Недавние интервалы не трогаются
+            ('Работа', recent, recent + timedelta(minutes=10)),
+            ('Работа', recent + timedelta(minutes=11), recent + timedelta(minutes=20)))
+
+    merged, removed = sessions.compact(repository.connection, now=NOW)
+
+    assert (merged, removed) == (2, 0)
+    assert _stored(repository) == [
+        ('Работа', old, old + timedelta(minutes=60)),
+        ('Работа', old + timedelta(minutes=70), old + timedelta(minutes=80)),
+        ('Работа', recent, recent + timedelta(minutes=10)),
+        ('Работа', recent + timedelta(minutes=11), recent + timedelta(minutes=20)),
+        ('Учеба', old + timedelta(minutes=30), old + timedelta(minutes=40)),
+    ]
+
+
+def test_compact_keeps_hourly_totals_and_day_sums(repository):
+    old = NOW - timedelta(days=40)
+    _insert(repository, *[('Работа', old + timedelta(minutes=10 * i), old + timedelta(minutes=10 * i + 9))
+                          for i in range(12)])
+    window = (old - timedelta(hours=1), old + timedelta(hours=3))
+    before = sessions.hourly_totals(repository.connection, *window)
+
+    sessions.compact(repository.connection, now=NOW, merge_gap_seconds=60)
+
+    assert len(_stored(repository)) == 1
+    # Короткие паузы перестают различаться: прирост не больше суммы пауз
+    after = sessions.hourly_totals(repository.connection, *window)
+    assert 0 <= sum(after) - sum(before) <= 11 * 60
+
+
+def test_compact_removes_expired(repository):
+    _insert(repository,
+            ('Работа', NOW - timedelta(days=100), NOW - timedelta(days=100) + timedelta(minutes=5)),
+            ('Работа', NOW - timedelta(days=2), NOW - timedelta(days=2) + timedelta(minutes=5)))
+    with repository.connection:
+        repository.connection.execute(repository.ADD_DAY_SECONDS, ('Работа', '2024-02-22', 300, None, None, None))
+
+    assert sessions.compact(repository.connection, now=NOW, keep_days=90) == (0, 1)
+    assert len(_stored(repository)) == 1
+    # Дневные суммы остаются в tasks
+    assert repository.connection.execute("SELECT SUM(complite_sec) FROM tasks").fetchone()[0] == 300
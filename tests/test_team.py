@@ -0,0 +1,132 @@
+"""Сводка по команде: поиск баз, подсчет по пачкам, архивные базы и ошибки отдельных файлов"""
+import sqlite3
+
+import team
+from storage import TaskRepository
+
+START, END = '2024-01-01', '2024-02-29'
+
+
+def _user_db(path, rows):
+    """База сотрудника с дневными суммами (тип задачи, день, секунды)"""
+    repository = TaskRepository(str(path))
+    repository.migrate()
+    with repository.connection:
+        repository.connection.executemany(
+            "INSERT INTO tasks (event_name, date_day, complite_sec, hour_week_limit) VALUES (?, ?, ?, 10)", rows)
+    repository.close()
+    return str(path)
+
+
+def _corrupted_db(path):
+    """База, в которой читается sqlite_master, но не страницы таблицы tasks"""
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE tasks (event_name TEXT, date_day DATE, complite_sec INTEGER, "
+                       "hour_week_limit INTEGER)")
+    connection.executemany("INSERT INTO tasks VALUES (?, ?, ?, NULL)",
+                           [('Работа' * 20, f'2024-01-{day % 28 + 1:02d}', day) for day in range(3000)])
+    connection.commit()
+    connection.close()
+    with open(path, 'r+b') as file:
+        file.seek(4096 * 3)
+        file.write(b'\xff' * 4096 * 5)
+    return str(path)
+
+
+def test_find_databases(tmp_path):
+    (tmp_path / 'alice').mkdir()
+    alice = _user_db(tmp_path / 'alice' / 'main.db', [])
+    (tmp_path / 'alice' / 'archive.db').write_bytes(b'')
+    bob = _user_db(tmp_path / 'bob.db', [])
+    (tmp_path / 'notes.txt').write_text('не база')
+
+    assert team.find_databases(tmp_path, 'archive.db') == [
+        ('alice', alice, str(tmp_path / 'alice' / 'archive.db')), ('bob', bob, None)]
+    # Без имени архива файл архива считается отдельным сотрудником
+    assert [user for user, _, _ in team.find_databases(tmp_path)] == ['alice', 'alice/archive', 'bob']
+
+
+def test_batches_count_archive_files():
+    items = [('a', 'a.db', None), ('b', 'b.db', 'b_archive.db'), ('c', 'c.db', None), ('d', 'd.db', 'd_archive.db')]
+
+    assert team._batches(items, 3) == [items[:2], items[2:]]
+    assert team._batches(items, 2) == [items[:1], items[1:2], items[2:3], items[3:]]
+    assert team._batches(items, 10) == [items]
+
+
+def test_scan_batch_isolates_bad_files(tmp_path):
+    alice = _user_db(tmp_path / 'alice.db', [('Работа', '2024-01-10', 3600), ('Работа', '2024-02-01', 1800),
+                                             ('Учеба', '2024-03-01', 900)])
+    bob = _user_db(tmp_path / 'bob.db', [('Учеба', '2024-01-15', 600)])
+    (tmp_path / 'text.db').write_text('не база')
+    empty = sqlite3.connect(tmp_path / 'empty.db')
+    empty.execute("CREATE TABLE other (id INTEGER)")
+    empty.close()
+    broken = _corrupted_db(tmp_path / 'broken.db')
+    batch = [('alice', alice, None), ('broken', broken, None), ('empty', str(tmp_path / 'empty.db'), None),
+             ('text', str(tmp_path / 'text.db'), None), ('bob', bob, None)]
+
+    results = {user: (totals, error, approximate) for user, totals, error, approximate
+               in team.scan_batch(batch, START, END)}
+
+    # Ошибка чтения одной базы пересчитывает пачку по одной базе
+    assert results['alice'] == ({'Работа': (5400, 10)}, None, False)
+    assert results['bob'] == ({'Учеба': (600, 10)}, None, False)
+    assert 'malformed' in results['broken'][1]
+    assert 'no such table: tasks' in results['empty'][1]
+    assert results['text'][1] is not None
+    assert all(results[user][0] == {} for user in ('broken', 'empty', 'text'))
+
+
+def test_scan_batch_reads_archive(tmp_path):
+    repository = TaskRepository(str(tmp_path / 'main.db'))
+    repository.migrate()
+    repository.attach_archive(str(tmp_path / 'archive.db'))
+    with repository.connection:
+        repository.connection.executemany(
+            "INSERT INTO tasks (event_name, date_day, complite_sec) VALUES (?, ?, ?)",
+            [('Работа', '2024-01-10', 3600), ('Работа', '2024-02-20', 1800)])
+    repository.archive_old_days(keep_months=1)
+    repository.close()
+    batch = [('alice', str(tmp_path / 'main.db'), str(tmp_path / 'archive.db'))]
+
+    [(_, totals, error, approximate)] = team.scan_batch(batch, START, END)
+    assert (totals, error, approximate) == ({'Работа': (5400, None)}, None, False)
+
+    # Период режет архивный месяц: сумма приблизительная
+    [(_, totals, error, approximate)] = team.scan_batch(batch, '2024-01-01', '2024-02-10')
+    assert error is None and approximate
+
+    # Без архива свернутые месяцы не видны
+    [(_, totals, _, _)] = team.scan_batch([('alice', str(tmp_path / 'main.db'), None)], START, END)
+    assert totals == {}
+
+
+def test_scan_databases_pool_matches_single_process(tmp_path):
+    databases = [(f'user{index}', _user_db(tmp_path / f'user{index}.db', [('Работа', '2024-01-10', index * 60)]),
+                  None) for index in range(team.BATCH_SIZE + 3)]
+
+    single = team.scan_databases(databases, *map(team.date.fromisoformat, (START, END)), workers=1)
+    pooled = team.scan_databases(databases, *map(team.date.fromisoformat, (START, END)), workers=2)
+
+    assert single == pooled
+    assert [totals for _, totals, _, _ in single] == [{'Работа': (index * 60, 10)} for index in range(len(databases))]
+
+
+def test_merge_results():
+    results = [('alice', {'Работа': (7200, 10), 'Личное': (3600, 5)}, None, False),
+               ('bob', {'Работа': (3600, 10)}, None, True),
+               ('broken', {}, 'broken.db: malformed', False)]
+
+    summary = team.merge_results(results, {'Работа': 20, 'Учеба': 7}, days=7)
+
+    assert summary['errors'] == ['broken.db: malformed']
+    assert summary['approximate_users'] == ['bob']
+    alice, bob = summary['users']
+    # Лимит: нормы конфига плюс hour_week_limit из базы для типов вне конфига
+    assert alice['limit_seconds'] == (20 + 7 + 5) * 3600
+    assert alice['events']['Работа']['utilisation'] == 10.0
+    assert bob['limit_seconds'] == (20 + 7) * 3600
+    assert summary['categories']['Работа'] == {'seconds': 10800, 'limit_seconds': 2 * 20 * 3600,
+                                               'users': 2, 'utilisation': 7.5}
+    assert summary['categories']['Учеба']['seconds'] == 0
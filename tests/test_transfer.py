@@ -0,0 +1,93 @@
+"""Импорт и экспорт: повторный импорт не меняет базу"""
+import io
+from datetime import datetime
+
+import sessions
+import transfer
+
+
+def _sessions(*intervals):
+    return [{'event_name': event_name, 'start_datetime': start, 'end_datetime': end}
+            for event_name, start, end in intervals]
+
+
+def _day_totals(repository):
+    return dict(((event_name, day), seconds) for event_name, day, seconds in repository.connection.execute(
+        "SELECT event_name, date_day, complite_sec FROM tasks"))
+
+
+INTERVALS = _sessions(
+    ('Работа', '2024-03-01T09:00:00', '2024-03-01T10:00:00'),
+    ('Работа', '2024-03-01T10:03:00', '2024-03-01T10:33:00'),
+    # Пересекается с первым интервалом: время учитывается один раз
+    ('Работа', '2024-03-01T09:30:00', '2024-03-01T10:01:00'),
+    ('Работа', '2024-03-01T23:30:00', '2024-03-02T00:15:00'),
+    ('Учеба', '2024-03-01T09:00:00', '2024-03-01T09:20:00'),
+)
+
+EXPECTED = {
+    ('Работа', '2024-03-01'): 3660 + 1800 + 1800,
+    ('Работа', '2024-03-02'): 900,
+    ('Учеба', '2024-03-01'): 1200,
+}
+
+
+def test_import_sessions_counts_overlaps_once(repository):
+    count, skipped = transfer.import_sessions(repository.connection, INTERVALS)
+
+    assert (count, skipped) == (5, 0)
+    assert _day_totals(repository) == EXPECTED
+
+
+def test_reimport_sessions_is_idempotent(repository):
+    transfer.import_sessions(repository.connection, INTERVALS)
+    transfer.import_sessions(repository.connection, INTERVALS)
+    transfer.import_sessions(repository.connection, reversed(INTERVALS))
+
+    assert _day_totals(repository) == EXPECTED
+
+
+def test_reimport_after_compaction_is_idempotent(repository):
+    transfer.import_sessions(repository.connection, INTERVALS)
+    merged, _ = sessions.compact(repository.connection, now=datetime(2024, 6, 1))
+    assert merged > 0
+
+    transfer.import_sessions(repository.connection, INTERVALS)
+
+    assert _day_totals(repository) == EXPECTED
+
+
+def test_import_sessions_adds_only_new_time(repository):
+    transfer.import_sessions(repository.connection, INTERVALS[:1])
+
+    transfer.import_sessions(repository.connection, _sessions(
+        ('Работа', '2024-03-01T09:00:00', '2024-03-01T11:00:00')))
+
+    assert _day_totals(repository) == {('Работа', '2024-03-01'): 7200}
+
+
+def test_import_tasks_merge(repository):
+    records = [{'event_name': 'Работа', 'date_day': '2024-03-01', 'complite_sec': '600'}]
+    transfer.import_tasks(repository.connection, records)
+    transfer.import_tasks(repository.connection, records)
+    assert _day_totals(repository) == {('Работа', '2024-03-01'): 600}
+
+    transfer.import_tasks(repository.connection, [{**records[0], 'complite_sec': '300'}], merge='max')
+    assert _day_totals(repository) == {('Работа', '2024-03-01'): 600}
+
+    transfer.import_tasks(repository.connection, [{**records[0], 'complite_sec': '300'}])
+    assert _day_totals(repository) == {('Работа', '2024-03-01'): 300}
+
+
+def test_csv_round_trip(repository):
+    transfer.import_sessions(repository.connection, INTERVALS)
+    stream = io.StringIO()
+    transfer.write_records(stream, 'csv', transfer.TASK_COLUMNS, transfer.export_rows(repository.connection, 'tasks'))
+
+    stream.seek(0)
+    with repository.connection:
+        repository.connection.execute("DELETE FROM tasks")
+    count, _ = transfer.import_tasks(repository.connection, transfer.read_records(stream, 'csv'))
+
+    assert count == len(EXPECTED)
+    assert _day_totals(repository) == EXPECTED
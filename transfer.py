@@ -0,0 +1,397 @@
+"""Потоковый импорт и экспорт учтенного времени (CSV/JSONL)
+
+Строки читаются и пишутся генераторами, поэтому объем памяти не зависит от
+размера файла, а запись в БД идет через executemany одной транзакцией.
+Повторный импорт того же файла не меняет базу:
+
+- tasks сливаются по ключу (event_name, date_day): значение из файла
+  заменяет сохраненное (--merge replace) или берется большее (--merge max);
+- sessions сливаются по ключу (event_name, start_datetime) с большим концом
+  интервала, а в tasks добавляется только время, не покрытое уже
+  сохраненными интервалами того же типа задачи (в том числе слитыми при
+  уплотнении журнала, см. sessions.compact);
+- archive (свернутые до месяцев старые дни, см. retention.py) сливается по
+  ключу (month_start, event_name, batch).
+
+Дневные суммы за месяцы, уже свернутые в архив, при импорте tasks и
+sessions пропускаются: иначе время этих месяцев было бы учтено дважды.
+Экспорт tasks не включает архив, он выгружается отдельно (--table archive).
+
+Примеры:
+    python transfer.py export tasks.csv
+    python transfer.py export sessions.jsonl --table sessions
+    python transfer.py export archive.csv --table archive
+    python transfer.py import other_tracker.jsonl --merge max
+"""
+import argparse
+import bisect
+import csv
+import json
+import sys
+from datetime import date, datetime, timezone
+from itertools import islice
+
+import retention
+import sessions
+from storage import TaskRepository
+
+TASK_COLUMNS = ('event_name', 'date_day', 'complite_sec', 'hour_week_limit', 'start_datetime', 'last_update')
+SESSION_COLUMNS = ('event_name', 'start_datetime', 'end_datetime')
+
+COLUMNS = {
+    'tasks': TASK_COLUMNS,
+    'sessions': SESSION_COLUMNS,
+    'archive': retention.ARCHIVE_COLUMNS,
+}
+
+MERGE_TASKS = {
+    'replace': """
+        INSERT INTO tasks (event_name, date_day, complite_sec, hour_week_limit, start_datetime, last_update)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (event_name, date_day) DO UPDATE
+        SET complite_sec=excluded.complite_sec,
+            hour_week_limit=COALESCE(excluded.hour_week_limit, hour_week_limit),
+            start_datetime=COALESCE(excluded.start_datetime, start_datetime),
+            last_update=COALESCE(excluded.last_update, last_update)
+        WHERE complite_sec IS NOT excluded.complite_sec;
+    """,
+    'max': """
+        INSERT INTO tasks (event_name, date_day, complite_sec, hour_week_limit, start_datetime, last_update)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (event_name, date_day) DO UPDATE
+        SET complite_sec=excluded.complite_sec,
+            hour_week_limit=COALESCE(excluded.hour_week_limit, hour_week_limit),
+            start_datetime=COALESCE(excluded.start_datetime, start_datetime),
+            last_update=COALESCE(excluded.last_update, last_update)
+        WHERE excluded.complite_sec > COALESCE(complite_sec, 0);
+    """,
+}
+
+# Интервалы импортируются пачками: для каждой пачки нужно знать уже
+# сохраненные интервалы, чтобы добавить в tasks только новое время
+SESSION_CHUNK_SIZE = 5000
+
+
+# --- Чтение и запись файлов -------------------------------------------------
+
+def detect_format(path, file_format=None):
+    """Определяет формат по явному значению или по расширению файла"""
+    if file_format:
+        return file_format
+    if path.endswith('.csv'):
+        return 'csv'
+    if path.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    raise ValueError(f"Не удалось определить формат файла {path!r}, укажите --format")
+
+
+def read_records(stream, file_format):
+    """Генератор словарей из CSV или JSONL"""
+    if file_format == 'csv':
+        yield from csv.DictReader(stream)
+    else:
+        for line in stream:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def write_records(stream, file_format, columns, rows):
+    """
+    Записывает строки в CSV или JSONL
+
+    Returns:
+        количество записанных строк
+    """
+    count = 0
+    if file_format == 'csv':
+        writer = csv.writer(stream)
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    else:
+        for row in rows:
+            stream.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False))
+            stream.write('\n')
+            count += 1
+    return count
+
+
+# --- Преобразование записей -------------------------------------------------
+
+def _optional(record, key, convert=str):
+    value = record.get(key)
+    if value is None or value == '':
+        return None
+    return convert(value)
+
+
+def task_rows(records):
+    """Генератор параметров для MERGE_TASKS из записей файла"""
+    for line, record in enumerate(records, start=1):
+        try:
+            event_name = record['event_name']
+            date_day = date.fromisoformat(record['date_day']).isoformat()
+            complite_sec = int(record['complite_sec'])
+            if not event_name or complite_sec < 0:
+                raise ValueError("пустой тип задачи или отрицательное время")
+            yield (
+                event_name,
+                date_day,
+                complite_sec,
+                _optional(record, 'hour_week_limit', int),
+                _optional(record, 'start_datetime'),
+                _optional(record, 'last_update'),
+            )
+        except (KeyError, TypeError, ValueError) as error:
+            raise ValueError(f"Запись {line}: {error}") from error
+
+
+def archive_rows(records):
+    """Генератор (event_name, month_start, total_sec, batch) из записей файла"""
+    for line, record in enumerate(records, start=1):
+        try:
+            event_name = record['event_name']
+            month_start = date.fromisoformat(record['month_start'])
+            total_sec = int(record['total_sec'])
+            batch = record['batch']
+            if not event_name or not batch or total_sec < 0 or month_start.day != 1:
+                raise ValueError("пустой тип задачи или пачка, отрицательное время или не первое число месяца")
+            yield event_name, month_start.isoformat(), total_sec, batch
+        except (KeyError, TypeError, ValueError) as error:
+            raise ValueError(f"Запись {line}: {error}") from error
+
+
+def _to_utc(moment):
+    """Время интервалов хранится в UTC без часового пояса и с точностью до секунды"""
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment.replace(microsecond=0)
+
+
+def session_rows(records):
+    """Генератор (event_name, start, end) с datetime из записей файла"""
+    for line, record in enumerate(records, start=1):
+        try:
+            event_name = record['event_name']
+            start = _to_utc(datetime.fromisoformat(record['start_datetime']))
+            end = _to_utc(datetime.fromisoformat(record['end_datetime']))
+            if not event_name or end < start:
+                raise ValueError("пустой тип задачи или конец раньше начала")
+            yield event_name, start, end
+        except (KeyError, TypeError, ValueError) as error:
+            raise ValueError(f"Запись {line}: {error}") from error
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# --- Импорт и экспорт -------------------------------------------------------
+
+def import_tasks(connection, records, merge='replace'):
+    """
+    Импортирует дневные суммы одной транзакцией
+
+    Returns:
+        (количество обработанных записей, количество пропущенных дней
+        архивных месяцев)
+    """
+    archived = retention.archived_months(connection)
+    counter = [0, 0]
+
+    def counted(rows):
+        for row in rows:
+            counter[0] += 1
+            if (row[0], retention.month_start(row[1])) in archived:
+                counter[1] += 1
+                continue
+            yield row
+
+    with connection:
+        connection.executemany(MERGE_TASKS[merge], counted(task_rows(records)))
+    return tuple(counter)
+
+
+def _uncovered(start, end, covered):
+    """
+    Части [start, end), не покрытые интервалами covered
+
+    Args:
+        covered: список (начало, конец), отсортированный по началу
+    """
+    parts = []
+    current = start
+    for covered_start, covered_end in covered:
+        if covered_start >= end:
+            break
+        if covered_end <= current:
+            continue
+        if covered_start > current:
+            parts.append((current, covered_start))
+        current = covered_end
+        if current >= end:
+            break
+    if current < end:
+        parts.append((current, end))
+    return parts
+
+
+def import_sessions(connection, records):
+    """
+    Импортирует интервалы работы одной транзакцией и добавляет в tasks
+    время, которого в базе еще не было
+
+    Новым считается время, не покрытое сохраненными интервалами того же
+    типа задачи, а не только отсутствующий ключ (event_name, start_datetime):
+    после уплотнения журнала начала слитых интервалов исчезают, но их время
+    остается покрытым.
+
+    Returns:
+        (количество обработанных записей, количество пропущенных дней
+        архивных месяцев)
+    """
+    count = skipped = 0
+    archived = retention.archived_months(connection)
+    last_update = datetime.now().isoformat()
+
+    with connection:
+        for chunk in _chunks(session_rows(records), SESSION_CHUNK_SIZE):
+            # Схлопываем повторы внутри пачки по ключу интервала
+            latest = {}
+            for event_name, start, end in chunk:
+                key = (event_name, sessions.format_time(start))
+                if key not in latest or latest[key][1] < end:
+                    latest[key] = (start, end)
+
+            covered = _stored_intervals(connection, latest.values())
+
+            day_rows = []
+            for (event_name, start_text), (start, end) in sorted(latest.items(), key=lambda item: item[1]):
+                event_covered = covered.setdefault(event_name, [])
+                for part_start, part_end in _uncovered(start, end, event_covered):
+                    for day, seconds in sessions.split_by_day(part_start, part_end):
+                        if (event_name, retention.month_start(day.isoformat())) in archived:
+                            skipped += 1
+                            continue
+                        day_start = max(part_start, datetime.combine(day, datetime.min.time()))
+                        day_rows.append((event_name, day.isoformat(), seconds, None,
+                                         sessions.format_time(day_start), last_update))
+                # Интервалы из файла, пересекающиеся между собой, тоже учитываются один раз
+                bisect.insort(event_covered, (start, end))
+
+            connection.executemany(sessions.UPSERT_SESSION, (
+                (event_name, start_text, sessions.format_time(end))
+                for (event_name, start_text), (start, end) in latest.items()
+            ))
+            connection.executemany(TaskRepository.ADD_DAY_SECONDS, day_rows)
+            count += len(chunk)
+
+    return count, skipped
+
+
+def _stored_intervals(connection, intervals):
+    """
+    Сохраненные интервалы, пересекающие охват пачки
+
+    Returns:
+        {event_name: [(начало, конец), ...]} с интервалами, отсортированными по началу
+    """
+    intervals = list(intervals)
+    if not intervals:
+        return {}
+    span_start = min(start for start, _ in intervals)
+    span_end = max(end for _, end in intervals)
+    stored = {}
+    for event_name, start, end in connection.execute(
+            sessions.SELECT_OVERLAPPING, (sessions.format_time(span_start), sessions.format_time(span_end))):
+        stored.setdefault(event_name, []).append((sessions.parse_time(start), sessions.parse_time(end)))
+    return stored
+
+
+def export_rows(connection, table):
+    """Генератор строк таблицы в порядке времени"""
+    if table == 'archive':
+        yield from retention.archive_rows(connection)
+        return
+    if table == 'tasks':
+        query = f"SELECT {', '.join(TASK_COLUMNS)} FROM tasks ORDER BY date_day, event_name"
+    else:
+        query = f"SELECT {', '.join(SESSION_COLUMNS)} FROM sessions ORDER BY start_datetime, event_name"
+    yield from connection.execute(query)
+
+
+def _open(path, mode):
+    if path == '-':
+        return sys.stdout if 'w' in mode else sys.stdin
+    return open(path, mode=mode, newline='', encoding='utf-8')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Импорт и экспорт учтенного времени")
+    parser.add_argument('command', choices=('import', 'export'))
+    parser.add_argument('path', help="файл CSV/JSONL или '-' для stdin/stdout")
+    parser.add_argument('--db', default='main.db', help="путь к базе")
+    parser.add_argument('--archive-db', default=retention.configured_archive_path(),
+                        help="архивная база (по умолчанию retention.archive_path из config.json)")
+    parser.add_argument('--table', choices=tuple(COLUMNS), default='tasks')
+    parser.add_argument('--format', choices=('csv', 'jsonl'), help="формат файла (по умолчанию по расширению)")
+    parser.add_argument('--merge', choices=tuple(MERGE_TASKS), default='replace',
+                        help="слияние дневных сумм tasks с уже сохраненными")
+    args = parser.parse_args(argv)
+
+    try:
+        file_format = detect_format(args.path, args.format)
+    except ValueError as error:
+        parser.error(str(error))
+    repository = TaskRepository(args.db)
+    try:
+        repository.migrate()
+        if args.archive_db:
+            repository.attach_archive(args.archive_db)
+        if args.command == 'export':
+            stream = _open(args.path, 'w')
+            try:
+                count = write_records(stream, file_format, COLUMNS[args.table],
+                                      export_rows(repository.connection, args.table))
+            finally:
+                if stream is not sys.stdout:
+                    stream.close()
+            print(f"Экспортировано записей: {count}", file=sys.stderr)
+            if args.table == 'tasks':
+                archived = len(retention.archived_months(repository.connection))
+                if archived:
+                    print(f"Месяцев в архиве: {archived}, они выгружаются через --table archive", file=sys.stderr)
+        else:
+            stream = _open(args.path, 'r')
+            try:
+                records = read_records(stream, file_format)
+                if args.table == 'tasks':
+                    count, skipped = import_tasks(repository.connection, records, args.merge)
+                elif args.table == 'sessions':
+                    count, skipped = import_sessions(repository.connection, records)
+                else:
+                    count, skipped = retention.import_archive(repository.connection, archive_rows(records))
+            except ValueError as error:
+                # Транзакция откатывается целиком, база не меняется
+                print(f"Импорт отменен. {error}", file=sys.stderr)
+                return 1
+            finally:
+                if stream is not sys.stdin:
+                    stream.close()
+            print(f"Импортировано записей: {count}", file=sys.stderr)
+            if skipped:
+                print(f"Пропущено как уже учтенное: {skipped}", file=sys.stderr)
+    finally:
+        repository.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())